@@ -0,0 +1,387 @@
+# Copyright (C) 2016-2018 Lanx Capital Investimentos LTDA.
+#
+# This file is part of Time Series I/O (tsio).
+#
+# Time Series I/O (tsio) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# Time Series I/O (tsio) is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Time Series I/O (tsio). If not, see <https://www.gnu.org/licenses/>.
+"""
+Benchmark suite of the tsio I/O operations.
+
+Synthetic collections are generated for every combination of series count, history length and component depth, and
+the DBIO operations (write, write_attributes, read, read_values, select) and GenIO reads (with a synthetic external
+interface) are timed on them. Results are written as JSON, and two result files can be compared to find regressions.
+
+Usage::
+
+    # Against a local mongod (the benchmark database is dropped at the end).
+    python benchmarks/tsio_benchmark.py --host mongodb://localhost:27017 --output results.json
+
+    # In process, against mongomock (must be installed).
+    python benchmarks/tsio_benchmark.py --stand-in --series 100 1000 --length 250 --depth 1 3 --output results.json
+
+    # In process, on the in-memory storage backend (no MongoDB).
+    python benchmarks/tsio_benchmark.py --memory --output memory.json
+
+    # Compare two result files: exits with status 1 if a throughput dropped by more than the threshold.
+    python benchmarks/tsio_benchmark.py --compare baseline.json results.json --threshold 0.1
+
+    # Stored sizes and encoding times of the value codecs (no database), checking their round trips.
+    python benchmarks/tsio_benchmark.py --codecs --length 250 2500 --output codecs.json
+
+Each operation is run on batches of `--batch-size` root time series (with their components): one call per batch, so
+latencies are per call, and throughputs count all the time series (roots and components) processed. Peak memory is
+the largest peak of Python allocations (as traced by ``tracemalloc``) of a call, measured in a separate, untimed pass.
+
+With `--codecs`, the values of a time series of each `--length` are stored as a plain dict and with each value codec
+instead: the BSON size of the stored values (and its ratio to the plain dict) and the encoding and decoding latencies
+are reported, and the decoded values must be equal to the original ones.
+"""
+import argparse
+import datetime
+import itertools
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import bson
+import numpy as np
+import pandas as pd
+import pymongo
+from pymongo.errors import PyMongoError
+from tsio import DBIO, TimeSeries, TimeSeriesCollection, MemoryBackend
+from tsio.constants import COMPONENTS, TS_VALUES
+from tsio.io.codecs import COLUMNAR, COMPRESSED
+from tsio.io.db import values_to_dict, decode_ts_values
+from tsio.io.gen import GenIO
+from tsio.io.client import register_client
+
+DB_NAME = 'tsio_benchmark'
+ROOT_PREFIX = 'BENCH'
+EXTERNAL_SUFFIX = '_EXTERNAL'
+GROUPS = 10  # Number of distinct values of the GROUP attribute, queried by select.
+OPERATIONS = ['write', 'write_attributes', 'read', 'read_values', 'select', 'genio_read']
+RESULT_KEY = ('operation', 'series', 'length', 'depth')
+CODECS = [None, COLUMNAR, COMPRESSED]  # Value codecs measured by --codecs (None is the plain dict).
+
+
+class SyntheticInterface:
+    """ External reading interface serving generated values for the time series named ``*_EXTERNAL``.
+    """
+    def __init__(self, length, seed):
+        self.values = pd.Series(np.random.RandomState(seed).standard_normal(length).cumsum(),
+                                index=pd.bdate_range(end='2019-12-31', periods=length))
+
+    @staticmethod
+    def is_member(ts):
+        return ts.ts_name.endswith(EXTERNAL_SUFFIX)
+
+    def read_attributes(self, ts_collection, attributes=None):
+        for ts in ts_collection:
+            ts.update_attributes({'SOURCE': 'SYNTHETIC'})
+
+    def read_values(self, ts_collection):
+        for ts in ts_collection:
+            ts.update_values(self.values.copy())
+
+    def read(self, ts_collection):
+        self.read_attributes(ts_collection)
+        self.read_values(ts_collection)
+
+
+def generate(series, length, depth, seed):
+    """ Generate the root time series of a synthetic collection.
+
+    Each root has a chain of ``depth - 1`` components (``UNDERLYING``), and the name of an external component
+    (``EXTERNAL``, read by GenIO from :py:class:`SyntheticInterface`). Values are random walks on business days.
+
+    Returns
+    -------
+    list(:py:class:`TimeSeries`)
+    """
+    random_state = np.random.RandomState(seed)
+    dates = pd.bdate_range(end='2019-12-31', periods=length)
+    roots = list()
+    for i in range(series):
+        chain = list()
+        for level in range(depth):
+            ts = TimeSeries('{}{:06d}'.format(ROOT_PREFIX, i) + ('_L{}'.format(level) if level else ''))
+            ts.set_attributes({'GROUP': 'G{}'.format(i % GROUPS), 'LEVEL': level, 'CURRENCY': 'BRL'})
+            ts.update_values(pd.Series(random_state.standard_normal(length).cumsum(), index=dates))
+            chain.append(ts)
+        for ts, component in zip(chain, chain[1:]):
+            ts.set_attribute(COMPONENTS, {'UNDERLYING': component})
+        root_components = chain[0].get_attribute(COMPONENTS, dict())
+        root_components['EXTERNAL'] = chain[0].ts_name + EXTERNAL_SUFFIX
+        chain[0].set_attribute(COMPONENTS, root_components)
+        roots.append(chain[0])
+    return roots
+
+
+def percentile_summary(latencies):
+    latencies = np.asarray(latencies) * 1000
+    return {'mean': float(latencies.mean()), 'p50': float(np.percentile(latencies, 50)),
+            'p90': float(np.percentile(latencies, 90)), 'p99': float(np.percentile(latencies, 99)),
+            'max': float(latencies.max())}
+
+
+def measure(function, calls, repeat):
+    """ Time and trace the calls of a function.
+
+    Parameters
+    ----------
+    function: callable
+    calls: list(tuple)
+        Arguments of each call.
+    repeat: int
+        Number of timed passes over `calls`.
+
+    Returns
+    -------
+    list(float), list, int
+        Latencies (seconds), results of the last timed pass, and the peak of traced memory (bytes) of a call.
+    """
+    function(*calls[0])  # Warm up (connections, indexes, caches of the interpreter).
+    latencies = list()
+    for _ in range(repeat):
+        results = list()
+        for arguments in calls:
+            begin = time.perf_counter()
+            results.append(function(*arguments))
+            latencies.append(time.perf_counter() - begin)
+    tracemalloc.start()
+    peak = 0
+    for arguments in calls:
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        function(*arguments)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+    tracemalloc.stop()
+    return latencies, results, peak
+
+
+def run_scenario(args, series, length, depth):
+    """ Run all the operations on a synthetic collection.
+
+    Returns
+    -------
+    list(dict)
+    """
+    collection_name = 'bench_{}_{}_{}'.format(series, length, depth)
+    dbio_options = dict(bucket_period=args.bucket_period, value_codec=args.value_codec, last_use=args.last_use)
+    if args.memory:
+        dbio_options['backend'] = MemoryBackend()
+    dbio = DBIO(args.host, DB_NAME, collection_name, **dbio_options)
+    genio = GenIO(args.host, DB_NAME, collection_name, external_interfaces=[SyntheticInterface(length, args.seed)],
+                  **dbio_options)
+    if not args.memory:
+        dbio.db.drop()
+        dbio.buckets.drop()
+    roots = generate(series, length, depth, args.seed)
+    batches = [roots[begin:begin + args.batch_size] for begin in range(0, series, args.batch_size)]
+    name_batches = [[ts.ts_name for ts in batch] for batch in batches]
+    stored_per_root = depth + 1  # The chain, and the (empty) document of the external component.
+
+    def read(dbio_instance, method):
+        def function(names):
+            ts_collection = TimeSeriesCollection(names)
+            getattr(dbio_instance, method)(ts_collection)
+            return ts_collection
+        return function
+
+    operations = {
+        'write': (lambda batch: dbio.write(batch), [(batch,) for batch in batches], stored_per_root, True),
+        'write_attributes': (lambda batch: dbio.write_attributes(batch), [(batch,) for batch in batches],
+                             stored_per_root, False),
+        'read': (read(dbio, 'read'), [(names,) for names in name_batches], stored_per_root, True),
+        'read_values': (read(dbio, 'read_values'), [(names,) for names in name_batches], stored_per_root, True),
+        'select': (lambda group: dbio.select(group=group), [('G{}'.format(i),) for i in range(GROUPS)], None, False),
+        'genio_read': (read(genio, 'read'), [(names,) for names in name_batches], stored_per_root, True),
+    }
+    results = list()
+    for operation in args.operations:
+        function, calls, series_per_root, with_values = operations[operation]
+        latencies, outputs, peak = measure(function, calls, args.repeat)
+        if series_per_root is None:
+            processed = sum(len(output) for output in outputs)
+        else:
+            processed = sum(len(arguments[0]) for arguments in calls) * series_per_root
+        seconds = sum(latencies) / args.repeat
+        results.append({
+            'operation': operation, 'series': series, 'length': length, 'depth': depth, 'calls': len(calls),
+            'seconds': seconds, 'series_per_second': processed / seconds,
+            'values_per_second': processed * length / seconds if with_values else None,
+            'latency_ms': percentile_summary(latencies), 'peak_memory_bytes': peak})
+        print('{operation:>16} series={series} length={length} depth={depth}: {series_per_second:,.0f} series/s, '
+              'p50={p50:.2f} ms, p99={p99:.2f} ms, peak={peak_memory_bytes:,} B'.format(
+               p50=results[-1]['latency_ms']['p50'], p99=results[-1]['latency_ms']['p99'], **results[-1]),
+              file=sys.stderr)
+    if not args.keep and not args.memory:
+        dbio.db.drop()
+        dbio.buckets.drop()
+    return results
+
+
+def run_codecs(args, length):
+    """ Store the values of a time series as a plain dict and with each value codec.
+
+    Values are a random walk of cents on business days, which the 'compressed' codec is meant for.
+
+    Returns
+    -------
+    list(dict)
+
+    Raises
+    ------
+    AssertionError
+        If the values decoded by a codec differ from the original ones.
+    """
+    random_state = np.random.RandomState(args.seed)
+    values = pd.Series(np.round(random_state.standard_normal(length).cumsum(), 2),
+                       index=pd.bdate_range(end='2019-12-31', periods=length))
+    results = list()
+    for codec in CODECS:
+        def encode():
+            return bson.encode({TS_VALUES: values_to_dict(values, codec)})
+
+        def decode(data):
+            return decode_ts_values(bson.decode(data)[TS_VALUES])
+
+        encode_latencies, encoded, _ = measure(encode, [()], args.repeat)
+        decode_latencies, decoded, _ = measure(decode, [(encoded[0],)], args.repeat)
+        pd.testing.assert_series_equal(decoded[0], values, check_names=False, check_freq=False,
+                                       check_index_type=False)
+        results.append({'codec': codec or 'plain', 'length': length, 'bytes': len(encoded[0]),
+                        'encode_ms': percentile_summary(encode_latencies),
+                        'decode_ms': percentile_summary(decode_latencies)})
+        results[-1]['ratio'] = results[-1]['bytes'] / results[0]['bytes']
+        print('{codec:>16} length={length}: {bytes:,} B ({ratio:.1%} of plain), encode p50={encode:.3f} ms, '
+              'decode p50={decode:.3f} ms'.format(encode=results[-1]['encode_ms']['p50'],
+                                                  decode=results[-1]['decode_ms']['p50'], **results[-1]),
+              file=sys.stderr)
+    return results
+
+
+def environment(args, client):
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                  check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    try:
+        server = 'memory' if args.memory else 'mongomock' if args.stand_in else \
+            client.server_info()['version'] if client is not None else None
+    except PyMongoError:
+        server = None
+    return {'label': args.label, 'revision': revision, 'date': datetime.datetime.utcnow().isoformat(),
+            'python': platform.python_version(), 'platform': platform.platform(), 'numpy': np.__version__,
+            'pandas': pd.__version__, 'pymongo': pymongo.version, 'server': server,
+            'parameters': {'repeat': args.repeat, 'batch_size': args.batch_size, 'seed': args.seed,
+                           'bucket_period': args.bucket_period, 'value_codec': args.value_codec,
+                           'last_use': args.last_use}}
+
+
+def compare(baseline_path, results_path, threshold):
+    """ Print the throughput and median latency ratios of two result files.
+
+    Returns
+    -------
+    int
+        Exit status: 1 if a throughput dropped by more than `threshold` (a fraction), 0 otherwise.
+    """
+    with open(baseline_path) as baseline_file, open(results_path) as results_file:
+        baseline = {tuple(row[key] for key in RESULT_KEY): row for row in json.load(baseline_file)['results']}
+        results = json.load(results_file)['results']
+    status = 0
+    print('{:>16} {:>8} {:>8} {:>6} {:>12} {:>12}'.format(*RESULT_KEY, 'throughput', 'p50 latency'))
+    for row in results:
+        key = tuple(row[key] for key in RESULT_KEY)
+        if key not in baseline:
+            continue
+        throughput = row['series_per_second'] / baseline[key]['series_per_second']
+        latency = row['latency_ms']['p50'] / baseline[key]['latency_ms']['p50']
+        regression = throughput < 1 - threshold
+        status = max(status, int(regression))
+        print('{:>16} {:>8} {:>8} {:>6} {:>11.2f}x {:>11.2f}x{}'.format(*key, throughput, latency,
+                                                                       '  REGRESSION' if regression else ''))
+    return status
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--host', default='mongodb://localhost:27017', help='Address of the MongoDB daemon.')
+    parser.add_argument('--stand-in', action='store_true', help='Run in process, against mongomock.')
+    parser.add_argument('--memory', action='store_true', help='Run on the in-memory storage backend (MemoryBackend).')
+    parser.add_argument('--series', type=int, nargs='+', default=[100, 1000], help='Root time series counts.')
+    parser.add_argument('--length', type=int, nargs='+', default=[250, 2500], help='History lengths (values).')
+    parser.add_argument('--depth', type=int, nargs='+', default=[1, 3], help='Component depths.')
+    parser.add_argument('--operations', nargs='+', default=OPERATIONS, choices=OPERATIONS)
+    parser.add_argument('--batch-size', type=int, default=50, help='Root time series per call.')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed passes per operation.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--bucket-period', default=None, help="DBIO bucket_period (e.g.: 'Y').")
+    parser.add_argument('--value-codec', default=None, help="DBIO value_codec (e.g.: 'compressed').")
+    parser.add_argument('--last-use', default='sync', choices=['sync', 'buffered', 'off'], help='DBIO last_use.')
+    parser.add_argument('--label', default=None, help='Label of the run (e.g.: the tsio version).')
+    parser.add_argument('--keep', action='store_true', help='Keep the benchmark collections.')
+    parser.add_argument('--output', default=None, help='JSON output file. Default is the standard output.')
+    parser.add_argument('--codecs', action='store_true', help='Measure the value codecs instead (no database).')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'RESULTS'), help='Compare two result files.')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Throughput drop (fraction) reported as a regression by --compare.')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return compare(*args.compare, args.threshold)
+    if args.codecs:
+        codec_results = [result for length in args.length for result in run_codecs(args, length)]
+        return write_output(args, json.dumps({'environment': environment(args, None), 'codecs': codec_results},
+                                             indent=2))
+    if args.memory:
+        client = None
+    elif args.stand_in:
+        try:
+            import mongomock
+        except ImportError:
+            parser.error('--stand-in requires mongomock (pip install mongomock).')
+        client = mongomock.MongoClient()
+        register_client(args.host, client)
+    else:
+        client = pymongo.MongoClient(args.host)
+    results = list()
+    for series, length, depth in itertools.product(args.series, args.length, args.depth):
+        results.extend(run_scenario(args, series, length, depth))
+    if not args.keep and client is not None:
+        client.drop_database(DB_NAME)
+    return write_output(args, json.dumps({'environment': environment(args, client), 'results': results}, indent=2))
+
+
+def write_output(args, output):
+    """ Write the JSON output to `--output`, or to the standard output.
+
+    Returns
+    -------
+    int
+        Exit status.
+    """
+    if args.output is None:
+        print(output)
+    else:
+        with open(args.output, 'w') as output_file:
+            output_file.write(output + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,100 @@
+# Copyright (C) 2016-2018 Lanx Capital Investimentos LTDA.
+#
+# This file is part of Time Series I/O (tsio).
+#
+# Time Series I/O (tsio) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# Time Series I/O (tsio) is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Time Series I/O (tsio). If not, see <https://www.gnu.org/licenses/>.
+"""
+Fixtures shared by the tests.
+
+Tests that need MongoDB run against the server at the address in the ``TSIO_TEST_MONGODB`` environment variable, or
+in process against mongomock (they are skipped if it isn't installed).
+"""
+import os
+import bson
+import pytest
+from bson.raw_bson import RawBSONDocument
+from tsio import DBIO
+from tsio.io.client import register_client
+
+MONGODB_HOST = os.environ.get('TSIO_TEST_MONGODB')  # Address of the MongoDB server of the tests. Default is mongomock.
+MONGODB_DB_NAME = 'tsio_test'
+
+
+class RawBSONCollection:
+    """ View of a mongomock collection that finds raw BSON documents, like ``with_options(codec_options=RAW_BSON)``.
+    """
+    def __init__(self, collection):
+        self.collection = collection
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    def find(self, *args, **kwargs):
+        kwargs.pop('batch_size', None)
+        return (RawBSONDocument(bson.encode(document)) for document in self.collection.find(*args, **kwargs))
+
+
+def patch_raw_bson(monkeypatch, mongomock):
+    """ Let mongomock collections find and insert raw BSON documents, as snapshots do.
+    """
+    with_options = mongomock.collection.Collection.with_options
+    bulk_write = mongomock.collection.Collection.bulk_write
+
+    def raw_with_options(collection, codec_options=None, **kwargs):
+        if codec_options is not None and codec_options.document_class is RawBSONDocument:
+            return RawBSONCollection(with_options(collection, **kwargs))
+        return with_options(collection, codec_options=codec_options, **kwargs)
+
+    def decoding_bulk_write(collection, requests, *args, **kwargs):
+        for request in requests:
+            if isinstance(getattr(request, '_doc', None), RawBSONDocument):
+                request._doc = bson.decode(request._doc.raw)
+        return bulk_write(collection, requests, *args, **kwargs)
+
+    monkeypatch.setattr(mongomock.collection.Collection, 'with_options', raw_with_options)
+    monkeypatch.setattr(mongomock.collection.Collection, 'bulk_write', decoding_bulk_write)
+
+
+@pytest.fixture
+def mongo_dbio(request, monkeypatch):
+    """ Factory of :py:class:`DBIO` instances on MongoDB collections, empty at the first use of each name.
+
+    The factory receives the collection name and the other :py:class:`DBIO` parameters. Its ``stand_in`` attribute
+    tells whether the tests run against mongomock, which lacks some features (e.g.: ``$setWindowFields``). Raw BSON
+    reads and inserts are patched into mongomock.
+    Collections are dropped afterwards.
+    """
+    if MONGODB_HOST:
+        host_address = MONGODB_HOST
+    else:
+        mongomock = pytest.importorskip('mongomock')
+        host_address = 'mongomock://' + request.node.name
+        register_client(host_address, mongomock.MongoClient())
+        patch_raw_bson(monkeypatch, mongomock)
+    instances = list()
+
+    def make_dbio(collection_name='test', **kwargs):
+        kwargs.setdefault('last_use', 'off')
+        dbio = DBIO(host_address, MONGODB_DB_NAME, collection_name, **kwargs)
+        if all(instance.collection_name != collection_name for instance in instances):
+            dbio.db.drop()
+            dbio.buckets.drop()
+        instances.append(dbio)
+        return dbio
+
+    make_dbio.stand_in = not MONGODB_HOST
+    yield make_dbio
+    for dbio in instances:
+        dbio.db.drop()
+        dbio.buckets.drop()
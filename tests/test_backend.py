@@ -0,0 +1,259 @@
+# Copyright (C) 2016-2018 Lanx Capital Investimentos LTDA.
+#
+# This file is part of Time Series I/O (tsio).
+#
+# Time Series I/O (tsio) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# Time Series I/O (tsio) is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Time Series I/O (tsio). If not, see <https://www.gnu.org/licenses/>.
+"""
+Tests of DBIO storage: on the in-memory backend, and on MongoDB (see ``conftest.py``) for the storage layouts of
+values (plain, encoded by a value codec, and in buckets).
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from tsio import DBIO, GenIO, MemoryBackend, TimeSeries, TimeSeriesCollection
+from tsio.constants import COMPONENTS, COMPONENT_NAMES, TS_NAME, TS_VALUES, BUCKET_PERIOD
+from tsio.io.codecs import CODEC
+from tsio.io.snapshot import DOCUMENTS
+
+LAYOUTS = [dict(), {'value_codec': 'columnar'}, {'value_codec': 'compressed'}, {'bucket_period': 'M'},
+           {'bucket_period': 'M', 'value_codec': 'columnar'}, {'bucket_period': 'Y', 'value_codec': 'compressed'}]
+
+
+def layout_id(layout):
+    return '-'.join(str(value) for value in layout.values()) or 'plain'
+
+
+def make_series(ts_name, values, start='2016-01-01', **attributes):
+    ts = TimeSeries(ts_name)
+    ts.set_attributes(attributes)
+    ts.update_values(pd.Series(values, index=pd.date_range(start, periods=len(values)), dtype=float))
+    return ts
+
+
+@pytest.fixture
+def dbio():
+    dbio = DBIO(None, None, 'test', backend=MemoryBackend(), last_use='off')
+    series = [make_series('S{}'.format(i), np.arange(5) + i, group='a' if i < 3 else 'b',
+                          tags=['x', 'y{}'.format(i % 2)]) for i in range(6)]
+    component = make_series('S0_C', [1, 2], start='2016-02-01')
+    component.set_attribute(COMPONENTS, {'X': make_series('S0_CC', [3])})
+    series[0].set_attribute(COMPONENTS, {'C': component})
+    dbio.write(series)
+    return dbio
+
+
+def read(dbio, ts_name, **kwargs):
+    ts_collection = TimeSeriesCollection([ts_name])
+    dbio.read(ts_collection, **kwargs)
+    return ts_collection.get(ts_name)
+
+
+def stored_layout(dbio, ts_name):
+    """ Get the bucket period and the value codecs (None for plain values) a time series is stored with in MongoDB.
+    """
+    document = dbio.db.find_one({TS_NAME: ts_name})
+    if BUCKET_PERIOD in document:
+        blocks = [bucket[TS_VALUES] for bucket in dbio.buckets.find({TS_NAME: ts_name})]
+    else:
+        blocks = [document[TS_VALUES]]
+    return document.get(BUCKET_PERIOD), {block.get(CODEC) for block in blocks}
+
+
+def test_read_values(dbio):
+    assert read(dbio, 'S1').ts_values.tolist() == [1, 2, 3, 4, 5]
+    assert read(dbio, 'S1', start='2016-01-02', end='2016-01-04').ts_values.tolist() == [2, 3, 4]
+    ts_collection = TimeSeriesCollection(['S1'])
+    dbio.read_values(ts_collection, last_n=2)
+    assert ts_collection.get('S1').ts_values.tolist() == [4, 5]
+
+
+@pytest.mark.parametrize('component_resolution', ['levels', 'graph'])
+def test_read_components(dbio, component_resolution):
+    dbio.component_resolution = component_resolution
+    component = read(dbio, 'S0').get_attribute(COMPONENTS)['C']
+    assert component.ts_values.tolist() == [1, 2]
+    assert component.get_attribute(COMPONENTS)['X'].ts_values.tolist() == [3]
+
+
+def test_write_modes(dbio):
+    dbio.append(make_series('S1', [9, 10], start='2016-01-05'))
+    assert read(dbio, 'S1').ts_values.tolist() == [1, 2, 3, 4, 9, 10]
+    dbio.write_values(make_series('S2', [7], start='2017-01-01'))
+    s2 = read(dbio, 'S2')
+    assert s2.ts_values.tolist() == [7]
+    assert s2.get_attribute('GROUP') == 'a'
+
+
+def test_select(dbio):
+    assert sorted(dbio.select(group='a').ts_names()) == ['S0', 'S1', 'S2']
+    assert sorted(dbio.select(tags='y1').ts_names()) == ['S1', 'S3', 'S5']
+    assert sorted(dbio.select(group='b', available=['2016-01-05']).ts_names()) == ['S3', 'S4', 'S5']
+    assert dbio.select(available=['2016-02-02']).ts_names() == ['S0_C']
+
+
+def test_attributes(dbio):
+    stamps = ['LAST_ATTRIBUTE_UPDATE', 'LAST_VALUE_UPDATE']
+    assert dbio.attribute_names() == [COMPONENTS, 'GROUP'] + stamps + ['TAGS']
+    assert dbio.attribute_names(['S1']) == ['GROUP'] + stamps + ['TAGS']
+    assert dbio.read_all_attribute_values(['GROUP', 'TAGS']) == ['a', 'b', 'x', 'y0', 'y1']
+
+
+def test_distinct():
+    backend = MemoryBackend()
+    backend.write({'A': {'K': [1, 2]}, 'B': {'K': 2}, 'C': {'K': {'nested': 1}}, 'D': {'K': {'nested': 1}}, 'E': {}})
+    assert backend.distinct('K') == [1, 2, {'nested': 1}]
+    assert backend.distinct('K', {'TS_NAME': 'B'}) == [2]
+
+
+def test_rebuild_component_names(dbio):
+    backend = dbio.backend
+    backend.documents['S0'].pop(COMPONENT_NAMES)
+    assert dbio.rebuild_component_names() == 2
+    assert backend.documents['S0'][COMPONENT_NAMES] == ['S0_C']
+
+
+def test_exists_and_remove(dbio):
+    assert sorted(dbio.exists(['S1', 'ZZ', 'S0_CC'])) == ['S0_CC', 'S1']
+    dbio.remove(['S5'], confirm=False)
+    assert dbio.missing(['S5']) == ['S5']
+
+
+def test_shared_backend(dbio):
+    genio = GenIO(None, None, 'test', backend=dbio.backend)
+    ts_collection = TimeSeriesCollection(['S3'])
+    genio.read(ts_collection)
+    assert ts_collection.get('S3').ts_values.tolist() == [3, 4, 5, 6, 7]
+
+
+def test_snapshots_not_supported(dbio, tmp_path):
+    with pytest.raises(NotImplementedError):
+        dbio.export_snapshot(str(tmp_path / 'snapshot.bson'))
+
+
+def test_index_advisor(dbio):
+    advisor_dbio = DBIO(None, None, 'test', backend=dbio.backend, last_use='off',
+                        index_advisor={'auto_create': True, 'min_uses': 1})
+    assert sorted(advisor_dbio.select(group='a').ts_names()) == ['S0', 'S1', 'S2']
+    report = advisor_dbio.index_advisor.report()
+    assert list(report['usage'].values()) == [1]
+    assert report['collection_scans'] == []
+
+
+@pytest.mark.parametrize('layout', LAYOUTS, ids=layout_id)
+def test_merge(mongo_dbio, layout):
+    dbio = mongo_dbio(**layout)
+    dbio.write(make_series('A', np.arange(10), start='2016-01-25'))
+    # Overlapping the stored values, and past the end of their month.
+    dbio.append(make_series('A', 100 + np.arange(10), start='2016-02-01'))
+    # In a new month.
+    dbio.write_values(make_series('A', [200], start='2016-03-15'), mode='merge')
+    expected = list(range(7)) + list(range(100, 110)) + [200]
+    values = read(dbio, 'A').ts_values
+    assert values.tolist() == expected
+    assert values.index[-1] == pd.Timestamp('2016-03-15')
+    assert stored_layout(dbio, 'A') == (layout.get('bucket_period'), {layout.get('value_codec')})
+
+
+@pytest.mark.parametrize('layout', LAYOUTS, ids=layout_id)
+def test_merge_new_series(mongo_dbio, layout):
+    dbio = mongo_dbio(**layout)
+    dbio.append(make_series('A', [1, 2]))
+    assert read(dbio, 'A').ts_values.tolist() == [1, 2]
+    assert stored_layout(dbio, 'A') == (layout.get('bucket_period'), {layout.get('value_codec')})
+
+
+@pytest.mark.parametrize('stored, writer', [
+    (dict(), {'bucket_period': 'M', 'value_codec': 'compressed'}),
+    ({'value_codec': 'columnar'}, {'value_codec': 'compressed'}),
+    ({'value_codec': 'compressed'}, dict()),
+    ({'bucket_period': 'M', 'value_codec': 'columnar'}, dict()),
+    ({'bucket_period': 'Y'}, {'bucket_period': 'M', 'value_codec': 'columnar'}),
+], ids=lambda layout: layout_id(layout))
+def test_merge_keeps_stored_layout(mongo_dbio, stored, writer):
+    mongo_dbio(**stored).write(make_series('A', np.arange(10), start='2016-01-25'))
+    dbio = mongo_dbio(**writer)
+    dbio.append(make_series('A', 100 + np.arange(10), start='2016-02-01'))
+    assert read(dbio, 'A').ts_values.tolist() == list(range(7)) + list(range(100, 110))
+    assert stored_layout(dbio, 'A') == (stored.get('bucket_period'), {stored.get('value_codec')})
+
+
+BUCKETED_LAYOUTS = [layout for layout in LAYOUTS if 'bucket_period' in layout]
+
+
+@pytest.mark.parametrize('layout', BUCKETED_LAYOUTS, ids=layout_id)
+@pytest.mark.parametrize('kwargs, dates', [
+    (dict(), ('2015-12-20', '2016-03-10')),
+    ({'start': '2016-01-30', 'end': '2016-02-02'}, ('2016-01-30', '2016-02-02')),
+    ({'start': '2015-12-31'}, ('2015-12-31', '2016-03-10')),
+    ({'end': '2016-01-01'}, ('2015-12-20', '2016-01-01')),
+    ({'start': '2017-01-01'}, None),
+    ({'last_n': 3}, ('2016-03-08', '2016-03-10')),
+    ({'last_n': 20}, ('2016-02-20', '2016-03-10')),
+    ({'end': '2016-02-01', 'last_n': 3}, ('2016-01-30', '2016-02-01')),
+    ({'start': '2016-01-15', 'end': '2016-02-15', 'last_n': 40}, ('2016-01-15', '2016-02-15')),
+], ids=lambda value: '-'.join('{}={}'.format(*item) for item in value.items()) if isinstance(value, dict) else None)
+def test_bucket_reads(mongo_dbio, layout, kwargs, dates):
+    if 'last_n' in kwargs and mongo_dbio.stand_in:
+        pytest.skip('last_n on buckets requires $setWindowFields, which mongomock lacks.')
+    dbio = mongo_dbio(**layout)
+    values = pd.Series(np.arange(82), index=pd.date_range('2015-12-20', '2016-03-10'), dtype=float)
+    ts = TimeSeries('A')
+    ts.ts_values = values
+    dbio.write(ts)
+    expected = values[dates[0]:dates[1]] if dates else values.iloc[:0]
+    pd.testing.assert_series_equal(read(dbio, 'A', **kwargs).ts_values, expected, check_names=False,
+                                   check_freq=False, check_index_type=False)
+
+
+@pytest.mark.parametrize('layout', BUCKETED_LAYOUTS, ids=layout_id)
+def test_bucket_documents(mongo_dbio, layout):
+    dbio = mongo_dbio(**layout)
+    dbio.write(make_series('A', np.arange(82), start='2015-12-20', group='a'))
+    starts = sorted(bucket['BUCKET_START'] for bucket in dbio.buckets.find({TS_NAME: 'A'}))
+    expected = ['2015-12-01', '2016-01-01', '2016-02-01', '2016-03-01'] if layout['bucket_period'] == 'M' \
+        else ['2015-01-01', '2016-01-01']
+    assert starts == [pd.Timestamp(start) for start in expected]
+    assert TS_VALUES not in dbio.db.find_one({TS_NAME: 'A'})
+    assert dbio.select(group='a').ts_names() == ['A']
+    # Replacing the values deletes the buckets of the periods left without values.
+    dbio.write_values(make_series('A', [1, 2], start='2016-02-10'))
+    assert [bucket['BUCKET_START'] for bucket in dbio.buckets.find({TS_NAME: 'A'})] == \
+        [pd.Timestamp('2016-02-01' if layout['bucket_period'] == 'M' else '2016-01-01')]
+    assert read(dbio, 'A').ts_values.tolist() == [1, 2]
+    dbio.remove(['A'], confirm=False)
+    assert dbio.buckets.count_documents({}) == 0
+
+
+@pytest.mark.parametrize('layout', [dict(), {'bucket_period': 'M', 'value_codec': 'compressed'}], ids=layout_id)
+@pytest.mark.parametrize('suffix', ['', '.gz'])
+def test_snapshot_round_trip(mongo_dbio, tmp_path, layout, suffix):
+    source = mongo_dbio('source', max_batch_size=2, **layout)
+    source.write([make_series(name, np.arange(40) + i, start='2016-01-15', group=name) for i, name in enumerate('ABC')])
+    path = str(tmp_path / ('snapshot' + suffix))
+    counts = source.export_snapshot(path)
+    assert counts[DOCUMENTS] == 3
+    target = mongo_dbio('target', max_batch_size=2, **layout)
+    assert target.import_snapshot(path)['nInserted'] == sum(counts.values())
+    for i, name in enumerate('ABC'):
+        pd.testing.assert_series_equal(read(target, name).ts_values, read(source, name).ts_values)
+        assert read(target, name).get_attribute('group') == name
+    # Time series already in the collection are left as they are, values (and buckets) included.
+    existing = mongo_dbio('existing', max_batch_size=2, raise_on_write_error=False, **layout)
+    existing.write(make_series('A', [1, 2], start='2016-02-10', group='existing'))
+    with pytest.warns(UserWarning):
+        result = existing.import_snapshot(path)
+    assert [error[TS_NAME] for error in result['writeErrors']] == ['A']
+    assert read(existing, 'A').ts_values.tolist() == [1, 2]
+    assert read(existing, 'A').get_attribute('group') == 'existing'
+    assert read(existing, 'B').ts_values.tolist() == list(range(1, 41))
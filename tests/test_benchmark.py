@@ -0,0 +1,80 @@
+# Copyright (C) 2016-2018 Lanx Capital Investimentos LTDA.
+#
+# This file is part of Time Series I/O (tsio).
+#
+# Time Series I/O (tsio) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# Time Series I/O (tsio) is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Time Series I/O (tsio). If not, see <https://www.gnu.org/licenses/>.
+"""
+Tests of the benchmark suite (``benchmarks/tsio_benchmark.py``), run in process on small collections.
+"""
+import importlib.util
+import json
+import os
+import pytest
+
+BENCHMARK_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks',
+                              'tsio_benchmark.py')
+spec = importlib.util.spec_from_file_location('tsio_benchmark', BENCHMARK_PATH)
+tsio_benchmark = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(tsio_benchmark)
+
+SMALL_RUN = ['--series', '5', '--length', '20', '--depth', '1', '2', '--batch-size', '2', '--repeat', '1']
+
+
+def run(tmp_path, *argv):
+    path = str(tmp_path / 'results.json')
+    assert tsio_benchmark.main(list(argv) + ['--output', path]) == 0
+    with open(path) as results_file:
+        return json.load(results_file)
+
+
+def test_memory(tmp_path):
+    output = run(tmp_path, '--memory', *SMALL_RUN)
+    assert output['environment']['server'] == 'memory'
+    results = output['results']
+    assert [(row['operation'], row['depth']) for row in results] == \
+        [(operation, depth) for depth in (1, 2) for operation in tsio_benchmark.OPERATIONS]
+    assert all(row['series_per_second'] > 0 for row in results)
+    select = [row for row in results if row['operation'] == 'select']
+    assert [row['calls'] for row in select] == [tsio_benchmark.GROUPS] * 2
+
+
+def test_stand_in(tmp_path):
+    pytest.importorskip('mongomock')
+    output = run(tmp_path, '--stand-in', '--host', 'mongomock://benchmark', '--value-codec', 'compressed',
+                 '--operations', 'write', 'read', *SMALL_RUN)
+    assert output['environment']['server'] == 'mongomock'
+    assert [row['operation'] for row in output['results']] == ['write', 'read'] * 2
+
+
+def test_compare(tmp_path, capsys):
+    output = run(tmp_path, '--memory', '--operations', 'write', 'read', *SMALL_RUN)
+    baseline_path = str(tmp_path / 'baseline.json')
+    with open(baseline_path, 'w') as baseline_file:
+        json.dump(output, baseline_file)
+    results_path = str(tmp_path / 'slower.json')
+    for row in output['results']:
+        row['series_per_second'] /= 2
+    with open(results_path, 'w') as results_file:
+        json.dump(output, results_file)
+    assert tsio_benchmark.main(['--compare', baseline_path, baseline_path]) == 0
+    assert tsio_benchmark.main(['--compare', baseline_path, results_path, '--threshold', '0.4']) == 1
+    assert 'REGRESSION' in capsys.readouterr().out
+
+
+def test_codecs(tmp_path):
+    rows = run(tmp_path, '--codecs', '--length', '1', '300', '--repeat', '1')['codecs']
+    assert [(row['codec'], row['length']) for row in rows] == \
+        [(codec, length) for length in (1, 300) for codec in ('plain', 'columnar', 'compressed')]
+    sizes = {row['codec']: row['bytes'] for row in rows if row['length'] == 300}
+    assert sizes['compressed'] < sizes['columnar'] < sizes['plain']
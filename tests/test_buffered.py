@@ -0,0 +1,113 @@
+# Copyright (C) 2016-2018 Lanx Capital Investimentos LTDA.
+#
+# This file is part of Time Series I/O (tsio).
+#
+# Time Series I/O (tsio) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# Time Series I/O (tsio) is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Time Series I/O (tsio). If not, see <https://www.gnu.org/licenses/>.
+"""
+Tests of BufferedDBIO on the in-memory storage backend.
+"""
+import gc
+import weakref
+import pandas as pd
+import pytest
+from tsio import DBIO, BufferedDBIO, MemoryBackend, TimeSeries, TimeSeriesCollection
+from tsio.constants import LAST_VALUE_UPDATE
+
+
+class FailingBackend(MemoryBackend):
+    """ MemoryBackend whose next `failures` writes raise.
+    """
+    def __init__(self, failures=0):
+        super().__init__()
+        self.failures = failures
+
+    def write(self, documents, ts_collection=None, mode='replace'):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError('Write failed.')
+        return super().write(documents, ts_collection, mode)
+
+
+def make_series(ts_name, values, start='2016-01-01', **attributes):
+    ts = TimeSeries(ts_name)
+    ts.set_attributes(attributes)
+    ts.update_values(pd.Series(values, index=pd.date_range(start, periods=len(values)), dtype=float))
+    return ts
+
+
+def read_values(dbio, ts_name):
+    ts_collection = TimeSeriesCollection([ts_name])
+    dbio.read(ts_collection)
+    return ts_collection.get(ts_name).ts_values.tolist()
+
+
+@pytest.fixture
+def buffered():
+    buffered = BufferedDBIO.from_dbio(DBIO(None, None, 'test', backend=FailingBackend(), last_use='off'),
+                                      flush_interval=3600)
+    yield buffered
+    buffered.close()
+
+
+def test_coalesce(buffered):
+    buffered.write(make_series('A', [1, 2], group='a'))
+    buffered.append(make_series('A', [3, 4], start='2016-01-02'))
+    assert buffered.pending_values == 3
+    buffered.flush()
+    assert read_values(buffered.dbio, 'A') == [1, 3, 4]
+    assert buffered.dbio.backend.documents['A']['GROUP'] == 'a'
+
+
+def test_failed_flush_is_retried(buffered):
+    buffered.dbio.backend.failures = 1
+    buffered.append(make_series('A', [1, 2]))
+    with pytest.warns(UserWarning, match='will be retried'):
+        assert buffered.flush() is None
+    assert isinstance(buffered.last_error, RuntimeError)
+    # Newer writes take precedence over the writes put back in the buffer.
+    buffered.append(make_series('A', [9, 3], start='2016-01-02'))
+    assert sorted(buffered.pending) == ['A']
+    buffered.flush()
+    assert read_values(buffered.dbio, 'A') == [1, 9, 3]
+    assert not buffered.pending
+
+
+def test_attribute_only_flush(buffered):
+    buffered.dbio.write(make_series('A', [1]))
+    stamp = buffered.dbio.backend.documents['A'][LAST_VALUE_UPDATE]
+    ts = TimeSeries('A')
+    ts.set_attribute('group', 'b')
+    buffered.write_attributes(ts)
+    buffered.flush()
+    document = buffered.dbio.backend.documents['A']
+    assert document['GROUP'] == 'b'
+    assert document[LAST_VALUE_UPDATE] == stamp
+    assert read_values(buffered.dbio, 'A') == [1]
+
+
+def test_close_flushes(buffered):
+    buffered.append(make_series('A', [1, 2]))
+    buffered.close()
+    assert read_values(buffered.dbio, 'A') == [1, 2]
+    with pytest.raises(ValueError):
+        buffered.append(make_series('A', [3]))
+
+
+def test_closed_instance_is_collected():
+    buffered = BufferedDBIO(None, None, 'test', backend=MemoryBackend(), last_use='off')
+    reference = weakref.ref(buffered)
+    buffered.close()
+    del buffered
+    gc.collect()
+    assert reference() is None
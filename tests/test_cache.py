@@ -0,0 +1,85 @@
+# Copyright (C) 2016-2018 Lanx Capital Investimentos LTDA.
+#
+# This file is part of Time Series I/O (tsio).
+#
+# Time Series I/O (tsio) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# Time Series I/O (tsio) is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Time Series I/O (tsio). If not, see <https://www.gnu.org/licenses/>.
+"""
+Tests of the time series cache of DBIO: hits, stale entries after writes, and reads that bypass the cache.
+"""
+import time
+import numpy as np
+import pandas as pd
+import pytest
+from tsio import DBIO, MemoryBackend, TimeSeries, TimeSeriesCache, TimeSeriesCollection
+
+
+def make_series(ts_name, values, start='2016-01-01'):
+    ts = TimeSeries(ts_name)
+    ts.update_values(pd.Series(values, index=pd.date_range(start, periods=len(values)), dtype=float))
+    return ts
+
+
+def read(dbio, ts_name):
+    ts_collection = TimeSeriesCollection([ts_name])
+    dbio.read(ts_collection)
+    return ts_collection.get(ts_name).ts_values.tolist()
+
+
+@pytest.fixture(params=['memory', 'mongodb'])
+def dbio_pair(request):
+    """ A :py:class:`DBIO` with a cache, and another one without a cache writing to the same collection.
+    """
+    if request.param == 'memory':
+        backend = MemoryBackend()
+        return (DBIO(None, None, 'test', backend=backend, last_use='off', cache=TimeSeriesCache()),
+                DBIO(None, None, 'test', backend=backend, last_use='off'))
+    mongo_dbio = request.getfixturevalue('mongo_dbio')
+    return mongo_dbio(cache=TimeSeriesCache()), mongo_dbio()
+
+
+def test_hit_and_stale_after_append(dbio_pair):
+    dbio, writer = dbio_pair
+    writer.write(make_series('A', np.arange(3)))
+    assert read(dbio, 'A') == [0, 1, 2]
+    assert read(dbio, 'A') == [0, 1, 2]
+    assert dbio.cache.stats()['hits'] == 1
+    assert dbio.cache.stats()['misses'] == 1
+    # MongoDB stores the update stamps in milliseconds.
+    time.sleep(0.01)
+    writer.append(make_series('A', [10, 20], start='2016-01-03'))
+    assert read(dbio, 'A') == [0, 1, 10, 20]
+    stats = dbio.cache.stats()
+    assert (stats['hits'], stats['misses'], stats['stale']) == (1, 2, 1)
+    assert read(dbio, 'A') == [0, 1, 10, 20]
+    assert dbio.cache.stats()['hits'] == 2
+
+
+def test_remove_discards_entries(dbio_pair):
+    dbio, _ = dbio_pair
+    dbio.write(make_series('A', np.arange(3)))
+    assert read(dbio, 'A') == [0, 1, 2]
+    assert 'A' in dbio.cache
+    dbio.remove(['A'], confirm=False)
+    assert 'A' not in dbio.cache
+    assert len(dbio.cache) == 0
+
+
+def test_partial_reads_bypass_cache(dbio_pair):
+    dbio, writer = dbio_pair
+    writer.write(make_series('A', np.arange(3)))
+    ts_collection = TimeSeriesCollection(['A'])
+    dbio.read(ts_collection, start='2016-01-02')
+    assert ts_collection.get('A').ts_values.tolist() == [1, 2]
+    assert len(dbio.cache) == 0
+    assert dbio.cache.stats()['misses'] == 0
@@ -0,0 +1,77 @@
+# Copyright (C) 2016-2018 Lanx Capital Investimentos LTDA.
+#
+# This file is part of Time Series I/O (tsio).
+#
+# Time Series I/O (tsio) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# Time Series I/O (tsio) is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Time Series I/O (tsio). If not, see <https://www.gnu.org/licenses/>.
+"""
+Tests of the value codecs: round trips and stored sizes.
+"""
+import bson
+import numpy as np
+import pandas as pd
+import pytest
+from tsio.io.codecs import COLUMNAR, COMPRESSED, COUNT, encode_values, decode_values, is_encoded
+
+CODECS = [COLUMNAR, COMPRESSED]
+
+
+def make_values(data):
+    return pd.Series(data, index=pd.date_range('2016-01-01', periods=len(data), freq='B'))
+
+
+@pytest.mark.parametrize('codec', CODECS)
+@pytest.mark.parametrize('data', [
+    np.cumsum(np.random.RandomState(0).normal(size=500)),
+    np.array([0.0, -0.0, np.nan, np.inf, -np.inf, 1e-300, 1e300]),
+    np.random.RandomState(0).randint(-2 ** 62, 2 ** 62, size=500),
+    np.arange(500, dtype=np.int32),
+    np.random.RandomState(0).rand(500) > 0.5,
+], ids=['float', 'float_special', 'int64', 'int32', 'bool'])
+def test_round_trip(codec, data):
+    values = make_values(data)
+    block = encode_values(values, codec)
+    assert is_encoded(block)
+    assert block[COUNT] == len(values)
+    decoded = decode_values(bson.decode(bson.encode({'block': block}))['block'])
+    pd.testing.assert_series_equal(decoded, values, check_freq=False)
+
+
+@pytest.mark.parametrize('codec', CODECS)
+def test_round_trip_empty(codec):
+    values = pd.Series([], index=pd.DatetimeIndex([]), dtype=float)
+    decoded = decode_values(encode_values(values, codec))
+    assert decoded.empty
+    assert decoded.dtype == values.dtype
+
+
+@pytest.mark.parametrize('codec', CODECS)
+def test_not_encodable(codec):
+    assert encode_values(make_values(['a', 'b']), codec) is None
+
+
+def test_unknown_codec():
+    with pytest.raises(ValueError):
+        encode_values(make_values([1.0]), 'unknown')
+
+
+@pytest.mark.parametrize('data, ratio', [
+    (np.repeat(np.round(np.cumsum(np.random.RandomState(0).normal(size=100)), 2), 25), 0.25),
+    (np.arange(2500, dtype=np.int64) // 10, 0.1),
+    (np.random.RandomState(0).rand(2500) > 0.9, 0.2),
+], ids=['float_steps', 'int_steps', 'bool'])
+def test_compression_ratio(data, ratio):
+    values = make_values(data)
+    columnar_size = len(bson.encode(encode_values(values, COLUMNAR)))
+    compressed_size = len(bson.encode(encode_values(values, COMPRESSED)))
+    assert compressed_size < ratio * columnar_size
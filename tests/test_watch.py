@@ -0,0 +1,90 @@
+# Copyright (C) 2016-2018 Lanx Capital Investimentos LTDA.
+#
+# This file is part of Time Series I/O (tsio).
+#
+# Time Series I/O (tsio) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# Time Series I/O (tsio) is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Time Series I/O (tsio). If not, see <https://www.gnu.org/licenses/>.
+"""
+Tests of the polling mode of Watcher, on the in-memory storage backend.
+"""
+import queue
+import threading
+import pandas as pd
+import pytest
+from tsio import DBIO, MemoryBackend, TimeSeries
+
+TIMEOUT = 5  # Seconds to wait for a delivery.
+
+
+class FailingBackend(MemoryBackend):
+    """ MemoryBackend whose next `failures` reads raise.
+    """
+    def __init__(self):
+        super().__init__()
+        self.failures = 0
+        self.failed = threading.Event()
+
+    def read(self, names_list, projection=None, start=None, end=None, last_n=None):
+        if self.failures:
+            self.failures -= 1
+            self.failed.set()
+            raise NotImplementedError('Read failed.')
+        return super().read(names_list, projection, start, end, last_n)
+
+
+def make_series(ts_name, values, start):
+    ts = TimeSeries(ts_name)
+    ts.update_values(pd.Series(values, index=pd.date_range(start, periods=len(values)), dtype=float))
+    return ts
+
+
+@pytest.fixture
+def dbio():
+    dbio = DBIO(None, None, 'test', backend=FailingBackend(), last_use='off')
+    dbio.write([make_series('A', [1, 2], '2016-01-01'), make_series('B', [1], '2016-01-01')])
+    return dbio
+
+
+def deliveries(dbio, **kwargs):
+    delivered = queue.Queue()
+    watcher = dbio.watch(callback=lambda changed: delivered.put({ts.ts_name: ts.ts_values.tolist() for ts in changed}),
+                         interval=0.01, change_stream=False, **kwargs)
+    return watcher, delivered
+
+
+def test_polling_delivers_deltas(dbio):
+    watcher, delivered = deliveries(dbio, ts_collection=['A'])
+    try:
+        dbio.append(make_series('A', [3], '2016-01-03'))
+        # The first delivery of a time series has its full history.
+        assert delivered.get(timeout=TIMEOUT) == {'A': [1, 2, 3]}
+        dbio.append(make_series('A', [4, 5], '2016-01-04'))
+        dbio.append(make_series('B', [2], '2016-01-02'))  # Not watched.
+        assert delivered.get(timeout=TIMEOUT) == {'A': [3, 4, 5]}
+    finally:
+        watcher.stop()
+    assert watcher.mode == 'polling'
+    assert delivered.empty()
+
+
+@pytest.mark.filterwarnings('ignore:Failed to read')
+def test_polling_survives_read_errors(dbio):
+    watcher, delivered = deliveries(dbio)
+    try:
+        dbio.backend.failures = 1
+        dbio.append(make_series('A', [3], '2016-01-03'))
+        assert dbio.backend.failed.wait(TIMEOUT)
+        dbio.append(make_series('B', [2], '2016-01-02'))
+        assert delivered.get(timeout=TIMEOUT) == {'B': [1, 2]}
+    finally:
+        watcher.stop()
@@ -2,4 +2,8 @@
 from tsio.timeseries import TimeSeries
 from tsio.timeseriescollection import TimeSeriesCollection
 from tsio.io.db import DBIO
-from tsio.io.gen import GenIO
\ No newline at end of file
+from tsio.io.gen import GenIO
+from tsio.io.aio import AsyncDBIO
+from tsio.io.cache import TimeSeriesCache
+from tsio.io.buffered import BufferedDBIO
+from tsio.io.backend import MemoryBackend
@@ -20,6 +20,8 @@ Definition of constants for TimeSeries and DB reading/writing classes.
 TODO: Implement a good way to override these constants (e.g.: with a config file).
 """
 COMPONENTS = "COMPONENTS"  # The key used to access the 'Components' dict of a TimeSeries object.
+COMPONENT_NAMES = 'COMPONENT_NAMES'  # Attribute (in a MongoDB document) containing the list of time series names in
+# the 'Components' dict. It is maintained by the writing methods and used to resolve components in the database.
 TS_NAME = 'TS_NAME'  # Attribute (in a MongoDB document) representing the ts_name if a TimeSeries.
 TS_VALUES = 'VALUE'  # Attribute (in a MongoDB document) representing the ts_values of the TimeSeries.
 LAST_USE = 'LAST_USE'  # Attribute for the last use date of a TimeSeries.
@@ -31,3 +33,12 @@ FIELD = 'FIELD'  # Optional attribute containing the field of a TimeSeries (e.g.
 # 'amount_outstanding'). This is only used in tsio.io.dbio.DBIO.select method.
 AND_VALUES = ['AND', 'E']  # Represents the 'and' specification for the tsio.io.dbio.DBIO.select method.
 OR_VALUES = ['OR', 'OU']  # Represents the 'or' specification for the tsio.io.dbio.DBIO.select method.
+BUCKET_PERIOD = 'BUCKET_PERIOD'  # Attribute (in a MongoDB document) marking a TimeSeries whose ts_values are stored in
+# buckets. Its value is the pandas period alias used for bucketing (e.g.: 'Y', 'M').
+BUCKET_START = 'BUCKET_START'  # Attribute (in a bucket document) containing the start datetime of the bucket period.
+BUCKET_END = 'BUCKET_END'  # Attribute (in a bucket document) containing the datetime of the last value in the bucket.
+BUCKETS_SUFFIX = '_buckets'  # Suffix of the MongoDB collection that stores the buckets of a collection.
+COMPONENTS_VIEW_SUFFIX = '_components'  # Suffix of the MongoDB view with only the names and component names of a
+# collection, used to resolve component trees.
+INTERNAL_KEYS = [BUCKET_PERIOD, COMPONENT_NAMES]  # Attributes (in a MongoDB document) used by tsio to locate values
+# and components, which are not part of the ts_attributes of a TimeSeries.
@@ -0,0 +1,138 @@
+# Copyright (C) 2016-2018 Lanx Capital Investimentos LTDA.
+#
+# This file is part of Time Series I/O (tsio).
+#
+# Time Series I/O (tsio) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# Time Series I/O (tsio) is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Time Series I/O (tsio). If not, see <https://www.gnu.org/licenses/>.
+"""
+AsyncDBIO class for reading/writing TimeSeries from/in MongoDB collections without blocking an asyncio event loop.
+"""
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from tsio.io.db import DBIO, last_use_executor
+
+
+class AsyncDBIO:
+    """ Asyncio interface for reading/writing time series in MongoDB.
+
+    Each call runs the corresponding :py:class:`DBIO` method on a thread pool, so the event loop is never blocked by
+    PyMongo. The ``LAST_USE`` updates of the reading methods are submitted to the same pool and are not awaited.
+
+    Parameters
+    ----------
+    host_address: str
+        Address of the MongoDB daemon.
+    db_name: str
+        MongoDB database name.
+    collection_name: str
+        MongoDB collection.
+    max_workers: int, optional
+        Number of threads of the pool. Default is the ``concurrent.futures.ThreadPoolExecutor`` default.
+    kwargs: dict
+        Additional parameters to be passed to :py:class:`DBIO`.
+
+    Note
+    ----
+    Use :py:meth:`from_dbio` to wrap an existing :py:class:`DBIO` (or :py:class:`GenIO`) instance, e.g. one connected
+    to a local stand-in of MongoDB in tests.
+    """
+    def __init__(self, host_address, db_name, collection_name, max_workers=None, **kwargs):
+        self._init(DBIO(host_address, db_name, collection_name, **kwargs), max_workers)
+
+    def _init(self, dbio, max_workers):
+        self.dbio = dbio
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='tsio-async')
+
+    @classmethod
+    def from_dbio(cls, dbio, max_workers=None):
+        """ Build an :py:class:`AsyncDBIO` running the methods of an existing instance.
+
+        Parameters
+        ----------
+        dbio: :py:class:`DBIO`
+            Instance whose methods are run on the thread pool.
+        max_workers: int, optional
+            Number of threads of the pool.
+
+        Returns
+        -------
+        :py:class:`AsyncDBIO`
+        """
+        instance = cls.__new__(cls)
+        instance._init(dbio, max_workers)
+        return instance
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def _run(self, method, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        # Run in a copy of the task context, so the call is recorded by tsio.io.instrument profiles of the task. The
+        # executor of its LAST_USE updates is set in that context only, so direct calls of the DBIO stay synchronous.
+        context = contextvars.copy_context()
+        context.run(last_use_executor.set, self.executor)
+        return await loop.run_in_executor(self.executor, functools.partial(context.run, method, *args, **kwargs))
+
+    async def close(self):
+        """ Wait for pending operations (including ``LAST_USE`` updates) and shut the thread pool down.
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, functools.partial(self.executor.shutdown, wait=True))
+        await loop.run_in_executor(None, self.dbio.flush_last_use)
+
+    async def read_attributes(self, ts_collection, components=True, depth=np.inf, attributes=None, **kwargs):
+        """ Read time series attributes from the database. See :py:meth:`DBIO.read_attributes`.
+        """
+        return await self._run(self.dbio.read_attributes, ts_collection, components=components, depth=depth,
+                               attributes=attributes, **kwargs)
+
+    async def read_values(self, ts_collection, components=True, depth=np.inf, **kwargs):
+        """ Read time series values from the database. See :py:meth:`DBIO.read_values`.
+        """
+        return await self._run(self.dbio.read_values, ts_collection, components=components, depth=depth, **kwargs)
+
+    async def read(self, ts_collection, components=True, depth=np.inf, **kwargs):
+        """ Read time series attributes and values from the database. See :py:meth:`DBIO.read`.
+        """
+        return await self._run(self.dbio.read, ts_collection, components=components, depth=depth, **kwargs)
+
+    async def write_attributes(self, ts_collection, components=True, depth=np.inf):
+        """ Write time series attributes to the database. See :py:meth:`DBIO.write_attributes`.
+        """
+        return await self._run(self.dbio.write_attributes, ts_collection, components=components, depth=depth)
+
+    async def write_values(self, ts_collection, components=True, depth=np.inf, mode='replace'):
+        """ Write time series values to the database. See :py:meth:`DBIO.write_values`.
+        """
+        return await self._run(self.dbio.write_values, ts_collection, components=components, depth=depth, mode=mode)
+
+    async def write(self, ts_collection, components=True, depth=np.inf, mode='replace'):
+        """ Write time series attributes and values to the database. See :py:meth:`DBIO.write`.
+        """
+        return await self._run(self.dbio.write, ts_collection, components=components, depth=depth, mode=mode)
+
+    async def append(self, ts_collection, components=True, depth=np.inf):
+        """ Merge time series values into the stored values. See :py:meth:`DBIO.append`.
+        """
+        return await self._run(self.dbio.append, ts_collection, components=components, depth=depth)
+
+    async def select(self, **kwargs):
+        """ Get time series names matching attribute specifications. See :py:meth:`DBIO.select`.
+        """
+        return await self._run(self.dbio.select, **kwargs)
@@ -0,0 +1,534 @@
+# Copyright (C) 2016-2018 Lanx Capital Investimentos LTDA.
+#
+# This file is part of Time Series I/O (tsio).
+#
+# Time Series I/O (tsio) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# Time Series I/O (tsio) is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Time Series I/O (tsio). If not, see <https://www.gnu.org/licenses/>.
+"""
+Storage backends of DBIO - the Backend interface and MemoryBackend (in process). The default backend,
+:py:class:`tsio.io.db.MongoBackend`, lives with DBIO.
+
+A backend stores one collection of time series: a document per time series, with its name (``TS_NAME``), attributes
+and update stamps, plus its values. Queries and projections use the MongoDB syntax, values are exchanged as
+pandas.Series.
+"""
+import copy
+import threading
+import numpy as np
+import pandas as pd
+from tsio.constants import TS_NAME, TS_VALUES, COMPONENTS, COMPONENT_NAMES
+from tsio.io.mongo_operators import AND, OR, NOR, NOT, IN, NIN, EXISTS, EQUAL_TO, NOT_EQUAL_TO, GREATER_THAN, \
+    GREATER_OR_EQUAL_THAN, LESSER_THAN, LESSER_OR_EQUAL_THAN, ID
+
+_MISSING = object()
+
+
+class Backend:
+    """ Interface of the storage of a :py:class:`DBIO` collection.
+
+    Subclasses implement :py:meth:`find`, :py:meth:`read`, :py:meth:`write`, :py:meth:`update`, :py:meth:`distinct`
+    and :py:meth:`delete`. The other methods have generic implementations on top of these, that subclasses may
+    replace by native ones (e.g. aggregations), and snapshots are only available where implemented.
+    """
+    def find(self, query, projection=None, batch_size=None):
+        """ Query documents, without their values.
+
+        Parameters
+        ----------
+        query: dict
+            MongoDB query (e.g.: ``{'TS_NAME': {'$in': names_list}}``).
+        projection: dict, optional
+            MongoDB projection. Default is all the fields.
+        batch_size: int, optional
+            Number of documents fetched per round trip, for backends that stream results.
+
+        Returns
+        -------
+        iterable(dict)
+        """
+        raise NotImplementedError
+
+    def read(self, names_list, projection=None, start=None, end=None, last_n=None):
+        """ Read time series by name, with their values filtered by date.
+
+        Parameters
+        ----------
+        names_list: list(str)
+        projection: dict, optional
+            Fields to be returned, in addition to the values. Default is all fields.
+        start: date-like, optional
+            Read only values at or after this date.
+        end: date-like, optional
+            Read only values at or before this date.
+        last_n: int, optional
+            Read only the last `last_n` values.
+
+        Returns
+        -------
+        list(tuple)
+            ``(ts_name, attributes, values)`` for each time series found, where ``values`` is a pandas.Series, or None
+            if the time series has no values.
+        """
+        raise NotImplementedError
+
+    def write(self, documents, ts_collection=None, mode='replace'):
+        """ Upsert time series documents and values.
+
+        Parameters
+        ----------
+        documents: dict
+            ``{ts_name: fields}``: fields (attributes and stamps) to be set in the document of each time series.
+        ts_collection: :py:class:`TimeSeriesCollection`, optional
+            Time series whose ``ts_values`` are to be written. Default is None (documents only).
+        mode: {'replace', 'merge'}, optional
+            'replace' overwrites the stored values, 'merge' merges the new values into them (see
+            :py:meth:`DBIO.write_values`). Default is 'replace'.
+
+        Returns
+        -------
+        dict, None
+            Bulk API result, or None if nothing was written.
+        """
+        raise NotImplementedError
+
+    def update(self, query, fields):
+        """ Set fields in the documents matching a query. Documents are not created.
+
+        Parameters
+        ----------
+        query: dict
+        fields: dict
+        """
+        raise NotImplementedError
+
+    def distinct(self, key, query=None):
+        """
+        Returns
+        -------
+        list
+            Distinct values of a field in the documents matching a query.
+        """
+        raise NotImplementedError
+
+    def delete(self, names_list):
+        """ Delete time series (documents and values).
+
+        Returns
+        -------
+        dict
+            ``{'n': number_of_documents_deleted, 'ok': 1.0}``
+        """
+        raise NotImplementedError
+
+    def ensure_index(self, keys, unique=False):
+        """ Create an index, for backends that have them. Does nothing by default.
+
+        Parameters
+        ----------
+        keys: str, list(tuple)
+            As in ``pymongo.collection.Collection.create_index``.
+        unique: bool, optional
+            Whether the index is unique. Default is False.
+
+        Returns
+        -------
+        str, None
+            Name of the index.
+        """
+        return None
+
+    def explain(self, query):
+        """ Explain how a query is run, for backends that have query plans. Does nothing by default.
+
+        Parameters
+        ----------
+        query: dict
+
+        Returns
+        -------
+        dict, None
+            The ``explain()`` output of MongoDB, or None.
+        """
+        return None
+
+    def component_closure(self, names_list, depth, projection):
+        """ Query time series and their components, recursively up to `depth`.
+
+        The default implementation queries one level of the component tree at a time.
+
+        Parameters
+        ----------
+        names_list: list(str)
+        depth: int
+            Depth of the component tree. ``depth = 2`` means only the direct components.
+        projection: dict
+            Fields to be returned for each time series.
+
+        Returns
+        -------
+        dict, None
+            ``{ts_name: document}`` for the time series and all their components found. None makes the caller
+            resolve the components level by level.
+        """
+        if any(projection.values()):
+            projection = dict(projection, **{TS_NAME: 1, COMPONENT_NAMES: 1})
+        documents = dict()
+        level = 0
+        while names_list and level < depth:
+            level += 1
+            found = list(self.find({TS_NAME: {IN: names_list}}, projection))
+            documents.update((document[TS_NAME], document) for document in found)
+            names_list = list({ts_name for document in found for ts_name in document.get(COMPONENT_NAMES) or list()
+                               if ts_name not in documents})
+        return documents
+
+    def attribute_names(self, names_list=None):
+        """ Collect the field names of time series documents.
+
+        Parameters
+        ----------
+        names_list: list(str), optional
+            Names of the time series. Default is None (all the time series).
+
+        Returns
+        -------
+        list(str)
+            Field names, including reserved and internal keys.
+        """
+        documents = self.find({TS_NAME: {IN: names_list}} if names_list else dict(), {TS_VALUES: 0})
+        return list({key for document in documents for key in document})
+
+    def attribute_values(self, attributes=None, excluded=None):
+        """ Collect the distinct values of attributes.
+
+        Values of list-like attributes are collected element by element, as by :py:meth:`distinct`.
+
+        Parameters
+        ----------
+        attributes: list(str), optional
+            Attribute names whose values are to be collected. Default is all attributes not in `excluded`.
+        excluded: list(str), optional
+            Attribute names whose values are not to be collected.
+
+        Returns
+        -------
+        list(tuple)
+            ``(attribute_name, value)`` pairs, unique by pair.
+        """
+        if attributes is None:
+            attributes = [key for key in self.attribute_names() if key not in set(excluded or list())]
+        return [(attribute, value) for attribute in attributes for value in self.distinct(attribute)]
+
+    def select_available(self, query, dates):
+        """ Get the names of time series matching a query that have values at any of a set of dates.
+
+        The default implementation reads the values between the first and the last of the dates.
+
+        Parameters
+        ----------
+        query: dict
+            MongoDB query of the time series.
+        dates: list(pandas.Timestamp)
+
+        Returns
+        -------
+        list(str)
+        """
+        names_list = [document[TS_NAME] for document in self.find(query, {TS_NAME: 1})]
+        available = {ts_name for ts_name, _, values in self.read(names_list, {TS_NAME: 1}, min(dates), max(dates))
+                     if values is not None and set(dates) & set(values.index)}
+        return [ts_name for ts_name in names_list if ts_name in available]
+
+    def rebuild_component_names(self):
+        """ Fill the ``COMPONENT_NAMES`` list of all the time series from their 'Components' dict.
+
+        Returns
+        -------
+        int
+            Number of modified documents.
+        """
+        modified = 0
+        for document in self.find({COMPONENTS: {EXISTS: True}}, {COMPONENTS: 1}):
+            self.update({TS_NAME: document[TS_NAME]}, {COMPONENT_NAMES: sorted(set(document[COMPONENTS].values()))})
+            modified += 1
+        return modified
+
+    def export_snapshot(self, path, query):
+        """ Write the time series matching a query to a snapshot file. See :py:meth:`DBIO.export_snapshot`.
+
+        Returns
+        -------
+        dict
+            Number of documents written, per collection.
+        """
+        raise NotImplementedError('Snapshots are not supported by {}.'.format(type(self).__name__))
+
+    def import_snapshot(self, path):
+        """ Insert the time series of a snapshot file. See :py:meth:`DBIO.import_snapshot`.
+
+        Returns
+        -------
+        dict
+            Bulk API result.
+        """
+        raise NotImplementedError('Snapshots are not supported by {}.'.format(type(self).__name__))
+
+
+def get_field(document, path):
+    """ Get a (dotted path) field of a document.
+
+    Returns
+    -------
+    object
+        The value, or ``_MISSING``.
+    """
+    value = document
+    for key in path.split('.'):
+        if not isinstance(value, dict) or key not in value:
+            return _MISSING
+        value = value[key]
+    return value
+
+
+def _compare(value, operator, argument):
+    try:
+        if operator == GREATER_THAN:
+            return value > argument
+        if operator == GREATER_OR_EQUAL_THAN:
+            return value >= argument
+        if operator == LESSER_THAN:
+            return value < argument
+        return value <= argument
+    except TypeError:
+        return False
+
+
+def _equals(value, argument):
+    """ MongoDB equality: null matches missing fields, and arrays match their elements.
+    """
+    if value is _MISSING:
+        return argument is None
+    if isinstance(value, list) and not isinstance(argument, list):
+        return any(_equals(item, argument) for item in value)
+    return value == argument
+
+
+def _match_condition(value, condition):
+    if not (isinstance(condition, dict) and condition and all(key.startswith('$') for key in condition)):
+        return _equals(value, condition)
+    for operator, argument in condition.items():
+        if operator == EQUAL_TO:
+            matched = _equals(value, argument)
+        elif operator == NOT_EQUAL_TO:
+            matched = not _equals(value, argument)
+        elif operator == IN:
+            matched = any(_equals(value, item) for item in argument)
+        elif operator == NIN:
+            matched = not any(_equals(value, item) for item in argument)
+        elif operator == EXISTS:
+            matched = (value is not _MISSING) == bool(argument)
+        elif operator == NOT:
+            matched = not _match_condition(value, argument)
+        elif operator in (GREATER_THAN, GREATER_OR_EQUAL_THAN, LESSER_THAN, LESSER_OR_EQUAL_THAN):
+            matched = value is not _MISSING and value is not None and _compare(value, operator, argument)
+        else:
+            raise NotImplementedError("Query operator '{}' is not supported by MemoryBackend.".format(operator))
+        if not matched:
+            return False
+    return True
+
+
+def matches(document, query):
+    """ Check whether a document matches a MongoDB query.
+
+    Supports the logical operators ``$and``, ``$or`` and ``$nor``, and the field operators ``$eq``, ``$ne``, ``$in``,
+    ``$nin``, ``$exists``, ``$not``, ``$gt``, ``$gte``, ``$lt`` and ``$lte``, on (dotted path) fields.
+
+    Parameters
+    ----------
+    document: dict
+    query: dict
+
+    Returns
+    -------
+    bool
+    """
+    for key, condition in query.items():
+        if key == AND:
+            if not all(matches(document, clause) for clause in condition):
+                return False
+        elif key == OR:
+            if not any(matches(document, clause) for clause in condition):
+                return False
+        elif key == NOR:
+            if any(matches(document, clause) for clause in condition):
+                return False
+        elif key.startswith('$'):
+            raise NotImplementedError("Query operator '{}' is not supported by MemoryBackend.".format(key))
+        elif not _match_condition(get_field(document, key), condition):
+            return False
+    return True
+
+
+def project(document, projection):
+    """ Apply a MongoDB projection (of top level fields) to a copy of a document.
+
+    Parameters
+    ----------
+    document: dict
+    projection: dict, None
+
+    Returns
+    -------
+    dict
+    """
+    fields = {key: value for key, value in (projection or dict()).items() if key != ID}
+    if fields and any(fields.values()):
+        return {key: copy.deepcopy(document[key]) for key in [TS_NAME] + list(fields)
+                if key in document and (key == TS_NAME or fields[key])}
+    return {key: copy.deepcopy(value) for key, value in document.items() if key not in fields}
+
+
+class MemoryBackend(Backend):
+    """ In-process storage, for tests and research loops that don't need a server.
+
+    Documents are kept as dicts, and the values of each time series as two numpy arrays (dates and values), so values
+    are read by slicing arrays, without encoding or decoding.
+
+    Note
+    ----
+    * Each instance holds one collection: share the instance between :py:class:`DBIO` (and :py:class:`GenIO`)
+      instances to share the time series, e.g. ``DBIO(None, None, 'research', backend=MemoryBackend())``.
+    * Storage options of :py:class:`DBIO` (``bucket_period``, ``value_codec``, batching, workers) don't apply.
+      Attribute names and catalogs, :py:meth:`DBIO.select` and the 'graph' `component_resolution` use the generic
+      implementations of :py:class:`Backend`. Snapshots and :py:attr:`DBIO.client` raise ``NotImplementedError``,
+      watchers poll instead of opening change streams, and the index advisor only counts the queries (there are no
+      indexes to create nor query plans to explain).
+    * Data is lost when the process ends.
+    """
+    def __init__(self):
+        self.documents = dict()
+        self.values = dict()  # {ts_name: (datetime64[ns] array, values array)}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.documents)
+
+    def _documents(self, query):
+        names = query.get(TS_NAME, dict()).get(IN) if len(query) == 1 and isinstance(query.get(TS_NAME), dict) \
+            else None
+        if names is not None and len(query[TS_NAME]) == 1:
+            # Lookup by name, the usual query of DBIO.
+            return [self.documents[ts_name] for ts_name in dict.fromkeys(names) if ts_name in self.documents]
+        return [document for document in self.documents.values() if matches(document, query)]
+
+    def find(self, query, projection=None, batch_size=None):
+        with self._lock:
+            return [project(document, projection) for document in self._documents(query)]
+
+    def read(self, names_list, projection=None, start=None, end=None, last_n=None):
+        records = list()
+        with self._lock:
+            for document in self._documents({TS_NAME: {IN: names_list}}):
+                attributes = project(document, projection)
+                ts_name = attributes.pop(TS_NAME)
+                attributes.pop(COMPONENT_NAMES, None)
+                stored = self.values.get(ts_name)
+                values = None if stored is None else self._slice(stored, start, end, last_n)
+                records.append((ts_name, attributes, values))
+        return records
+
+    @staticmethod
+    def _slice(stored, start, end, last_n):
+        index, data = stored
+        begin, stop = 0, len(index)
+        if start is not None:
+            begin = np.searchsorted(index, np.datetime64(pd.Timestamp(start), 'ns'), side='left')
+        if end is not None:
+            stop = np.searchsorted(index, np.datetime64(pd.Timestamp(end), 'ns'), side='right')
+        if last_n is not None:
+            begin = max(begin, stop - last_n) if last_n > 0 else stop
+        return pd.Series(data[begin:stop].copy(), index=pd.DatetimeIndex(index[begin:stop].copy()))
+
+    @staticmethod
+    def _columns(values):
+        values = values.sort_index()
+        return np.asarray(pd.DatetimeIndex(values.index).values, dtype='datetime64[ns]'), np.array(values.values)
+
+    def write(self, documents, ts_collection=None, mode='replace'):
+        if mode not in ('replace', 'merge'):
+            raise ValueError("Unknown write mode: '{}'. Use 'replace' or 'merge'.".format(mode))
+        new_values = dict()
+        for ts in ts_collection if ts_collection is not None else list():
+            if mode == 'replace' or not ts.ts_values.empty:
+                new_values[ts.ts_name] = ts.ts_values
+        names = list(dict.fromkeys(list(documents) + list(new_values)))
+        result = {'nInserted': 0, 'nUpserted': 0, 'nMatched': 0, 'nModified': 0, 'nRemoved': 0, 'upserted': [],
+                  'writeErrors': [], 'writeConcernErrors': []}
+        with self._lock:
+            for index, ts_name in enumerate(names):
+                document = self.documents.get(ts_name)
+                if document is None:
+                    document = self.documents[ts_name] = {TS_NAME: ts_name}
+                    result['nUpserted'] += 1
+                    result['upserted'].append({'index': index, TS_NAME: ts_name})
+                else:
+                    result['nMatched'] += 1
+                    result['nModified'] += 1
+                document.update(copy.deepcopy(documents.get(ts_name, dict())))
+                if ts_name in new_values:
+                    values = new_values[ts_name]
+                    stored = self.values.get(ts_name)
+                    if mode == 'merge' and stored is not None:
+                        values = pd.concat([values, pd.Series(stored[1], index=pd.DatetimeIndex(stored[0]))])
+                        values = values[~values.index.duplicated(keep='first')].dropna()
+                    self.values[ts_name] = self._columns(values)
+        return result if names else None
+
+    def update(self, query, fields):
+        with self._lock:
+            for document in self._documents(query):
+                document.update(copy.deepcopy(fields))
+
+    def distinct(self, key, query=None):
+        distinct = dict()
+        unhashable = list()
+        with self._lock:
+            for document in self._documents(query or dict()):
+                value = get_field(document, key)
+                for item in (value if isinstance(value, list) else [value]):
+                    if item is _MISSING:
+                        continue
+                    try:
+                        distinct.setdefault(item, copy.deepcopy(item))
+                    except TypeError:
+                        # Dicts (sub-documents) are compared one by one.
+                        if item not in unhashable:
+                            unhashable.append(copy.deepcopy(item))
+        return list(distinct.values()) + unhashable
+
+    def delete(self, names_list):
+        deleted = 0
+        with self._lock:
+            for ts_name in names_list:
+                if self.documents.pop(ts_name, None) is not None:
+                    deleted += 1
+                self.values.pop(ts_name, None)
+        return {'n': deleted, 'ok': 1.0}
+
+    def clear(self):
+        """ Delete all the time series.
+        """
+        with self._lock:
+            self.documents.clear()
+            self.values.clear()
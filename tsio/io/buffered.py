@@ -0,0 +1,230 @@
+# Copyright (C) 2016-2018 Lanx Capital Investimentos LTDA.
+#
+# This file is part of Time Series I/O (tsio).
+#
+# Time Series I/O (tsio) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# Time Series I/O (tsio) is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Time Series I/O (tsio). If not, see <https://www.gnu.org/licenses/>.
+"""
+BufferedDBIO class - write-behind buffer of time series writes, flushed to MongoDB by a background thread.
+"""
+import atexit
+import threading
+import warnings
+import weakref
+import numpy as np
+from tsio.timeseries import TimeSeries
+from tsio.timeseriescollection import TimeSeriesCollection
+from tsio.io.db import DBIO, ts_attributes_to_dict, merge_ts_values
+
+# Instances that are not closed yet. They are weakly referenced, so closed instances can be garbage collected.
+_instances = weakref.WeakSet()
+
+
+@atexit.register
+def close_all():
+    """ Close all the :py:class:`BufferedDBIO` instances of the process, flushing their pending writes. Called at
+    interpreter exit.
+    """
+    for instance in list(_instances):
+        instance.close()
+
+
+class BufferedDBIO:
+    """ Write-behind interface for writing time series in MongoDB.
+
+    Writes are coalesced in memory by time series name, and written by a background thread when the buffer reaches
+    `max_pending_series` time series or `max_pending_values` values, or every `flush_interval` seconds. The calling
+    thread never waits for MongoDB.
+
+    Buffered values are merged with the semantics of :py:meth:`TimeSeries.update_values` (the newest values take
+    precedence), and are written with ``mode='merge'``: only the buffered values are sent and merged into the stored
+    values. Buffered attributes are merged key by key.
+
+    Parameters
+    ----------
+    host_address: str
+        Address of the MongoDB daemon.
+    db_name: str
+        MongoDB database name.
+    collection_name: str
+        MongoDB collection.
+    flush_interval: float, optional
+        Seconds between flushes. Default is 1.
+    max_pending_series: int, optional
+        Number of buffered time series that triggers a flush. Default is 1000.
+    max_pending_values: int, optional
+        Number of buffered values that triggers a flush. Default is 100000.
+    kwargs: dict
+        Additional parameters to be passed to :py:class:`DBIO`.
+
+    Note
+    ----
+    * Reads are not served from the buffer: call :py:meth:`flush` before reading buffered time series through
+      ``dbio``.
+    * If a flush fails, its writes are put back in the buffer (under any newer writes) and retried on the next flush.
+      The exception is kept in ``last_error``.
+    * Pending writes are flushed by :py:meth:`close`, when leaving a ``with`` block and at interpreter exit.
+    """
+    def __init__(self, host_address, db_name, collection_name, flush_interval=1.0, max_pending_series=1000,
+                 max_pending_values=100000, **kwargs):
+        self._init(DBIO(host_address, db_name, collection_name, **kwargs), flush_interval, max_pending_series,
+                   max_pending_values)
+
+    def _init(self, dbio, flush_interval, max_pending_series, max_pending_values):
+        self.dbio = dbio
+        self.flush_interval = flush_interval
+        self.max_pending_series = max_pending_series
+        self.max_pending_values = max_pending_values
+        self.pending = dict()
+        self.pending_values = 0
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='tsio-write-behind', daemon=True)
+        self._thread.start()
+        _instances.add(self)
+
+    @classmethod
+    def from_dbio(cls, dbio, flush_interval=1.0, max_pending_series=1000, max_pending_values=100000):
+        """ Build a :py:class:`BufferedDBIO` writing through an existing :py:class:`DBIO` instance.
+
+        Returns
+        -------
+        :py:class:`BufferedDBIO`
+        """
+        instance = cls.__new__(cls)
+        instance._init(dbio, flush_interval, max_pending_series, max_pending_values)
+        return instance
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            if not self._closed:
+                self.flush()
+
+    def _buffer(self, ts_collection, components, depth, attributes, values):
+        """ Coalesce time series (and their components up to `depth`) into the buffer.
+        """
+        if self._closed:
+            raise ValueError('Write on a closed BufferedDBIO.')
+        if isinstance(components, list):
+            components = [key.upper() for key in components]
+        full_ts_collection = self.dbio._collect_for_writing(ts_collection, components, depth)
+        # Copies are buffered, the caller may keep changing its time series.
+        updates = [(ts.ts_name, ts_attributes_to_dict(ts) if attributes else None,
+                    ts.ts_values.copy() if values and not ts.ts_values.empty else None) for ts in full_ts_collection]
+        with self._lock:
+            for ts_name, new_attributes, new_values in updates:
+                self._merge(ts_name, new_attributes, new_values)
+            full = len(self.pending) >= self.max_pending_series or self.pending_values >= self.max_pending_values
+        if full:
+            self._wake.set()
+
+    def _merge(self, ts_name, new_attributes, new_values):
+        """ Merge a write into the buffer. Must be called with the lock held.
+        """
+        attributes, values = self.pending.get(ts_name, (None, None))
+        if new_attributes is not None:
+            attributes = dict(attributes or dict())
+            attributes.update(new_attributes)
+        if new_values is not None:
+            self.pending_values -= 0 if values is None else len(values)
+            values = new_values if values is None else merge_ts_values(values, new_values)
+            self.pending_values += len(values)
+        self.pending[ts_name] = (attributes, values)
+
+    def write(self, ts_collection, components=True, depth=np.inf):
+        """ Buffer the attributes and values of time series. See :py:meth:`DBIO.write`.
+        """
+        self._buffer(ts_collection, components, depth, attributes=True, values=True)
+
+    def write_attributes(self, ts_collection, components=True, depth=np.inf):
+        """ Buffer the attributes of time series. See :py:meth:`DBIO.write_attributes`.
+        """
+        self._buffer(ts_collection, components, depth, attributes=True, values=False)
+
+    def write_values(self, ts_collection, components=True, depth=np.inf):
+        """ Buffer the values of time series. See :py:meth:`DBIO.write_values`.
+        """
+        self._buffer(ts_collection, components, depth, attributes=False, values=True)
+
+    def append(self, ts_collection, components=True, depth=np.inf):
+        """ Buffer the values of time series. Same as :py:meth:`write_values`.
+        """
+        self.write_values(ts_collection, components=components, depth=depth)
+
+    def flush(self):
+        """ Write the buffered time series now.
+
+        Returns
+        -------
+        dict, None
+            The aggregated bulk API result, or None if there was nothing to write or the flush failed.
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending = self.pending
+                self.pending = dict()
+                self.pending_values = 0
+            if not pending:
+                return None
+            with_attributes = TimeSeriesCollection()
+            values_only = TimeSeriesCollection()
+            for ts_name, (attributes, values) in pending.items():
+                ts = TimeSeries(ts_name)
+                if attributes is not None:
+                    ts.update_attributes(attributes)
+                if values is not None:
+                    ts.ts_values = values
+                if attributes is not None:
+                    with_attributes.add(ts)
+                else:
+                    values_only.add(ts)
+            try:
+                results = [self.dbio.write(with_attributes, depth=1, mode='merge') if len(with_attributes) else None,
+                           self.dbio.write_values(values_only, depth=1, mode='merge') if len(values_only) else None]
+            except Exception as exception:
+                self.last_error = exception
+                with self._lock:
+                    # Put the writes back, under any write buffered in the meantime.
+                    newer = self.pending
+                    self.pending = dict()
+                    self.pending_values = 0
+                    for buffered in (pending, newer):
+                        for ts_name, (attributes, values) in buffered.items():
+                            self._merge(ts_name, attributes, values)
+                warnings.warn('Write-behind flush of {} time series failed, it will be retried: {}'.format(
+                    len(pending), exception))
+                return None
+            return self.dbio._combine_results(*results)
+
+    def close(self):
+        """ Stop the background thread and flush the buffer.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        _instances.discard(self)
+        self._wake.set()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+        self.flush()
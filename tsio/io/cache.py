@@ -0,0 +1,142 @@
+# Copyright (C) 2016-2018 Lanx Capital Investimentos LTDA.
+#
+# This file is part of Time Series I/O (tsio).
+#
+# Time Series I/O (tsio) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# Time Series I/O (tsio) is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Time Series I/O (tsio). If not, see <https://www.gnu.org/licenses/>.
+"""
+TimeSeriesCache class - in-process LRU cache of time series read from the database.
+"""
+import copy
+import sys
+import threading
+from collections import OrderedDict
+
+
+class TimeSeriesCache:
+    """ Memory-bounded LRU cache of time series attributes and values, validated by update stamps.
+
+    Each entry keeps the ``(LAST_VALUE_UPDATE, LAST_ATTRIBUTE_UPDATE)`` stamps the time series had in the database when
+    it was read. An entry is only returned if the stamps currently in the database are the same.
+
+    Parameters
+    ----------
+    max_series: int, optional
+        Maximum number of cached time series. Default is 1000.
+    max_bytes: int, optional
+        Maximum estimated memory of the cached values and attributes. Default is None (no limit).
+
+    Note
+    ----
+    Keys are time series names, so a cache must not be shared by :py:class:`DBIO` instances of different collections.
+    """
+    def __init__(self, max_series=1000, max_bytes=None):
+        self.max_series = max_series
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, ts_name):
+        return ts_name in self.entries
+
+    def get(self, ts_name, stamps):
+        """ Get a copy of a cached time series, if it is still fresh.
+
+        Parameters
+        ----------
+        ts_name: str
+            Name of the time series.
+        stamps: tuple, None
+            Current ``(LAST_VALUE_UPDATE, LAST_ATTRIBUTE_UPDATE)`` of the time series in the database, or None if
+            it is not in the database.
+
+        Returns
+        -------
+        tuple, None
+            ``(attributes, values)``, or None if the time series is not cached or is stale.
+        """
+        with self._lock:
+            entry = self.entries.get(ts_name)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] != stamps:
+                self.stale += 1
+                self.misses += 1
+                self._discard(ts_name)
+                return None
+            self.entries.move_to_end(ts_name)
+            self.hits += 1
+            _, attributes, values, _ = entry
+        return copy.deepcopy(attributes), values.copy()
+
+    def put(self, ts_name, stamps, attributes, values):
+        """ Cache a time series, evicting the least recently used ones if needed.
+
+        Parameters
+        ----------
+        ts_name: str
+            Name of the time series.
+        stamps: tuple
+            ``(LAST_VALUE_UPDATE, LAST_ATTRIBUTE_UPDATE)`` of the time series when it was read.
+        attributes: dict
+        values: pandas.Series
+        """
+        size = values.memory_usage(index=True, deep=True) + sys.getsizeof(attributes)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        entry = (stamps, copy.deepcopy(attributes), values.copy(), size)
+        with self._lock:
+            self._discard(ts_name)
+            self.entries[ts_name] = entry
+            self.bytes += size
+            while len(self.entries) > self.max_series or (self.max_bytes is not None and self.bytes > self.max_bytes):
+                self._discard(next(iter(self.entries)))
+                self.evictions += 1
+
+    def discard(self, ts_name):
+        """ Remove a time series from the cache. Does not raise an exception if absent.
+        """
+        with self._lock:
+            self._discard(ts_name)
+
+    def _discard(self, ts_name):
+        entry = self.entries.pop(ts_name, None)
+        if entry is not None:
+            self.bytes -= entry[3]
+
+    def clear(self):
+        """ Remove all time series from the cache. Counters are kept.
+        """
+        with self._lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        """
+        Returns
+        -------
+        dict
+            Counters of hits, misses (of which stale entries), evictions, and the current number of series and bytes.
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'stale': self.stale, 'evictions': self.evictions,
+                    'series': len(self.entries), 'bytes': self.bytes}
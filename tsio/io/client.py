@@ -0,0 +1,155 @@
+# Copyright (C) 2016-2018 Lanx Capital Investimentos LTDA.
+#
+# This file is part of Time Series I/O (tsio).
+#
+# Time Series I/O (tsio) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# Time Series I/O (tsio) is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Time Series I/O (tsio). If not, see <https://www.gnu.org/licenses/>.
+"""
+Process-wide registry of MongoDB clients, shared by all DBIO instances.
+
+A ``pymongo.MongoClient`` holds a connection pool and monitoring threads, so it should be created once per process and
+reused. Clients are keyed by host address and options. They are not shared with forked child processes: a child
+process gets new clients on first use.
+"""
+import os
+import threading
+import pymongo
+
+_clients = dict()
+_lock = threading.Lock()
+_pid = os.getpid()
+_version = 0  # Incremented whenever registered clients are closed or replaced.
+
+
+def _reset_after_fork():
+    global _clients, _lock, _pid, _version
+    # Clients (and the lock) inherited from the parent process must not be used in the child.
+    _clients = dict()
+    _lock = threading.Lock()
+    _pid = os.getpid()
+    _version += 1
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def client_options(max_pool_size=None, min_pool_size=None, timeout_ms=None, compressors=None, **options):
+    """ Build ``pymongo.MongoClient`` options.
+
+    Parameters
+    ----------
+    max_pool_size: int, optional
+        Maximum number of connections of the pool (``maxPoolSize``).
+    min_pool_size: int, optional
+        Minimum number of connections of the pool (``minPoolSize``).
+    timeout_ms: int, optional
+        Server selection, connection and socket timeout, in milliseconds (``serverSelectionTimeoutMS``,
+        ``connectTimeoutMS`` and ``socketTimeoutMS``).
+    compressors: str, list(str), optional
+        Wire protocol compressors, by order of preference (e.g.: ``['zstd', 'snappy', 'zlib']``).
+    options: dict
+        Additional ``pymongo.MongoClient`` options. They take precedence over the above parameters.
+
+    Returns
+    -------
+    dict
+    """
+    result = dict()
+    if max_pool_size is not None:
+        result['maxPoolSize'] = max_pool_size
+    if min_pool_size is not None:
+        result['minPoolSize'] = min_pool_size
+    if timeout_ms is not None:
+        result['serverSelectionTimeoutMS'] = timeout_ms
+        result['connectTimeoutMS'] = timeout_ms
+        result['socketTimeoutMS'] = timeout_ms
+    if compressors is not None:
+        result['compressors'] = compressors if isinstance(compressors, str) else ','.join(compressors)
+    result.update(options)
+    return result
+
+
+def get_client(host_address, **options):
+    """ Get the shared client for a host address and options, creating it on first use.
+
+    Parameters
+    ----------
+    host_address: str
+        Address of the MongoDB daemon.
+    options: dict
+        ``pymongo.MongoClient`` options (see :py:func:`client_options`).
+
+    Returns
+    -------
+    pymongo.MongoClient
+    """
+    global _pid, _version
+    key = (host_address, repr(sorted(options.items())))
+    with _lock:
+        if os.getpid() != _pid:
+            # Fallback for platforms without os.register_at_fork.
+            _clients.clear()
+            _pid = os.getpid()
+            _version += 1
+        client = _clients.get(key)
+        if client is None:
+            client = pymongo.MongoClient(host_address, **options)
+            _clients[key] = client
+        return client
+
+
+def registry_version():
+    """ Get the version of the registry, which changes whenever registered clients are closed or replaced.
+
+    Holders of a client (e.g.: :py:class:`DBIO` instances) only need to call :py:func:`get_client` again when the
+    version or the process changes.
+
+    Returns
+    -------
+    int
+    """
+    return _version
+
+
+def close_clients():
+    """ Close and forget all the shared clients of this process.
+    """
+    global _version
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+        _version += 1
+    for client in clients:
+        client.close()
+
+
+def register_client(host_address, client, **options):
+    """ Register the client to be used for a host address and options, instead of a new ``pymongo.MongoClient``.
+
+    Useful to run DBIO instances against an in-process stand-in of MongoDB with the ``pymongo`` API (e.g.:
+    ``mongomock.MongoClient()``).
+
+    Parameters
+    ----------
+    host_address: str
+        Address used by the DBIO instances.
+    client: pymongo.MongoClient, object
+        The client.
+    options: dict
+        ``pymongo.MongoClient`` options of the DBIO instances (see :py:func:`client_options`).
+    """
+    global _version
+    with _lock:
+        _clients[(host_address, repr(sorted(options.items())))] = client
+        _version += 1
@@ -0,0 +1,235 @@
+# Copyright (C) 2016-2018 Lanx Capital Investimentos LTDA.
+#
+# This file is part of Time Series I/O (tsio).
+#
+# Time Series I/O (tsio) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# Time Series I/O (tsio) is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Time Series I/O (tsio). If not, see <https://www.gnu.org/licenses/>.
+"""
+Value codecs - binary encodings of ``ts_values`` for storage in MongoDB.
+
+An encoded block is a dict stored in place of the ``{milliseconds_since_epoch: value}`` dict. It is recognized by its
+``CODEC`` key, which never appears in the plain format.
+
+Available codecs:
+
+* 'columnar': packed int64 nanoseconds and packed values.
+* 'compressed': delta-encoded nanoseconds and delta- (integers) or XOR-encoded (floats) values, each compressed with
+  zlib. Regular dates and slowly changing values become runs of repeated bytes, which compress well.
+"""
+import zlib
+import numpy as np
+import pandas as pd
+from bson.binary import Binary
+
+CODEC = 'CODEC'  # Key (in an encoded block) containing the name of the codec.
+COUNT = 'COUNT'  # Key (in an encoded block) containing the number of values.
+INDEX = 'INDEX'  # Key (in an encoded block) containing the packed index.
+DATA = 'DATA'  # Key (in an encoded block) containing the packed values.
+DTYPE = 'DTYPE'  # Key (in an encoded block) containing the numpy dtype string of the values.
+
+COLUMNAR = 'columnar'
+COMPRESSED = 'compressed'
+
+COMPRESSION_LEVEL = 6  # zlib compression level of the 'compressed' codec.
+
+
+def is_encoded(values):
+    """ Check whether stored ``ts_values`` are an encoded block.
+
+    Parameters
+    ----------
+    values: object
+        ``ts_values`` as read from the database.
+
+    Returns
+    -------
+    bool
+    """
+    return isinstance(values, dict) and CODEC in values
+
+
+def is_encodable(values):
+    """ Check whether a Series can be stored with a binary codec.
+
+    Only numeric (and boolean) values with a datetime index are supported.
+
+    Parameters
+    ----------
+    values: pandas.Series
+
+    Returns
+    -------
+    bool
+    """
+    return isinstance(values.index, pd.DatetimeIndex) and values.index.tz is None and \
+        (np.issubdtype(values.dtype, np.number) or np.issubdtype(values.dtype, np.bool_))
+
+
+def _index_to_int64(values):
+    return np.ascontiguousarray(values.index.values.astype('datetime64[ns]').view('<i8'))
+
+
+def _data_to_array(values):
+    return np.ascontiguousarray(values.values, dtype=values.dtype.newbyteorder('<'))
+
+
+def encode_columnar(values):
+    """ Encode a Series as packed int64 nanoseconds and packed values.
+
+    Parameters
+    ----------
+    values: pandas.Series
+
+    Returns
+    -------
+    dict
+        Encoded block.
+    """
+    data = _data_to_array(values)
+    return {CODEC: COLUMNAR,
+            COUNT: len(values),
+            DTYPE: data.dtype.str,
+            INDEX: Binary(_index_to_int64(values).tobytes()),
+            DATA: Binary(data.tobytes())}
+
+
+def decode_columnar(block):
+    """ Decode a block written by :py:func:`encode_columnar`.
+
+    Parameters
+    ----------
+    block: dict
+
+    Returns
+    -------
+    pandas.Series
+    """
+    index = np.frombuffer(block[INDEX], dtype='<i8').view('datetime64[ns]')
+    data = np.frombuffer(block[DATA], dtype=np.dtype(block[DTYPE]))
+    return pd.Series(data, index=pd.DatetimeIndex(index))
+
+
+def _delta_encode(array):
+    result = array.copy()
+    result[1:] = array[1:] - array[:-1]  # Integer overflow wraps around, and is undone by the cumulative sum.
+    return result
+
+
+def _delta_decode(array):
+    return np.cumsum(array, dtype=array.dtype)
+
+
+def _xor_encode(array):
+    bits = array.view('<u{}'.format(array.dtype.itemsize))
+    result = bits.copy()
+    result[1:] = bits[1:] ^ bits[:-1]
+    return result
+
+
+def _xor_decode(array, dtype):
+    return np.bitwise_xor.accumulate(array).view(dtype)
+
+
+def encode_compressed(values):
+    """ Encode a Series as delta/XOR-encoded, zlib-compressed dates and values.
+
+    Parameters
+    ----------
+    values: pandas.Series
+
+    Returns
+    -------
+    dict
+        Encoded block.
+    """
+    data = _data_to_array(values)
+    if data.dtype.kind == 'f':
+        packed = _xor_encode(data)
+    elif data.dtype.kind in 'iu':
+        packed = _delta_encode(data)
+    else:
+        packed = data
+    return {CODEC: COMPRESSED,
+            COUNT: len(values),
+            DTYPE: data.dtype.str,
+            INDEX: Binary(zlib.compress(_delta_encode(_index_to_int64(values)).tobytes(), COMPRESSION_LEVEL)),
+            DATA: Binary(zlib.compress(packed.tobytes(), COMPRESSION_LEVEL))}
+
+
+def decode_compressed(block):
+    """ Decode a block written by :py:func:`encode_compressed`.
+
+    Parameters
+    ----------
+    block: dict
+
+    Returns
+    -------
+    pandas.Series
+    """
+    dtype = np.dtype(block[DTYPE])
+    index = _delta_decode(np.frombuffer(zlib.decompress(block[INDEX]), dtype='<i8')).view('datetime64[ns]')
+    if dtype.kind == 'f':
+        packed = np.frombuffer(zlib.decompress(block[DATA]), dtype='<u{}'.format(dtype.itemsize))
+        data = _xor_decode(packed, dtype)
+    elif dtype.kind in 'iu':
+        data = _delta_decode(np.frombuffer(zlib.decompress(block[DATA]), dtype=dtype))
+    else:
+        data = np.frombuffer(zlib.decompress(block[DATA]), dtype=dtype)
+    return pd.Series(data, index=pd.DatetimeIndex(index))
+
+
+ENCODERS = {COLUMNAR: encode_columnar, COMPRESSED: encode_compressed}
+DECODERS = {COLUMNAR: decode_columnar, COMPRESSED: decode_compressed}
+
+
+def encode_values(values, codec):
+    """ Encode a Series with a codec.
+
+    Parameters
+    ----------
+    values: pandas.Series
+        Values to be encoded.
+    codec: str
+        Name of the codec (e.g.: 'columnar').
+
+    Returns
+    -------
+    dict, None
+        Encoded block, or None if `values` can't be encoded (e.g.: non-numeric values).
+    """
+    try:
+        encoder = ENCODERS[codec]
+    except KeyError:
+        raise ValueError("Unknown value codec: '{}'. Available codecs: {}".format(codec, sorted(ENCODERS)))
+    if not is_encodable(values):
+        return None
+    return encoder(values)
+
+
+def decode_values(block):
+    """ Decode an encoded block into a Series.
+
+    Parameters
+    ----------
+    block: dict
+
+    Returns
+    -------
+    pandas.Series
+    """
+    try:
+        decoder = DECODERS[block[CODEC]]
+    except KeyError:
+        raise ValueError("Unknown value codec: '{}'.".format(block[CODEC]))
+    return decoder(block)
@@ -17,20 +17,45 @@
 """
 DBIO class for reading/writing TimeSeries from/in MongoDB collections.
 """
+import asyncio
+import contextvars
+import copy
 import warnings
 import datetime
+import itertools
 import json
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import pandas as pd
 import pymongo
-from pymongo.errors import BulkWriteError
-from tsio.constants import COMPONENTS, TS_NAME, TS_VALUES, LAST_USE, RESERVED_KEYS, OR_VALUES, \
-    AND_VALUES, FIELD
-from tsio.io.mongo_operators import AND, OR, SET, IN, ID
-from tsio.tools import to_list
+from pymongo.errors import BulkWriteError, CollectionInvalid, OperationFailure, PyMongoError
+from tsio.constants import COMPONENTS, COMPONENT_NAMES, TS_NAME, TS_VALUES, LAST_USE, LAST_VALUE_UPDATE, \
+    LAST_ATTRIBUTE_UPDATE, RESERVED_KEYS, INTERNAL_KEYS, OR_VALUES, AND_VALUES, FIELD, BUCKET_PERIOD, BUCKET_START, \
+    BUCKET_END, BUCKETS_SUFFIX, COMPONENTS_VIEW_SUFFIX
+from tsio.io.mongo_operators import AND, OR, NOT, SET, UNSET, MAX, IN, NIN, ID, EQUAL_TO, GREATER_THAN, \
+    GREATER_OR_EQUAL_THAN, LESSER_OR_EQUAL_THAN, LESSER_THAN, NOT_EQUAL_TO, EXISTS, MATCH, PROJECT, ADD_FIELDS, \
+    SET_WINDOW_FIELDS, GRAPH_LOOKUP, UNWIND, GROUP, EXPR, FILTER, MAP, LET, OBJECT_TO_ARRAY, ARRAY_TO_OBJECT, TO_LONG, \
+    MAX_N, MIN, SUM, SIZE, IF_NULL, COND, LITERAL
+from tsio.io.client import get_client, registry_version, client_options as build_client_options
+from tsio.io.lastuse import LastUseBuffer
+from tsio.io.indexing import IndexAdvisor
+from tsio.io.local import LocalStore
+from tsio.io.watch import Watcher
+from tsio.io import instrument
+from tsio.io.backend import Backend
+from tsio.io.snapshot import DOCUMENTS, BUCKETS, RAW_BSON, open_snapshot, write_header, write_block, \
+    read_blocks
+from tsio.io.codecs import CODEC, COUNT, encode_values, decode_values, is_encoded
+from tsio.tools import to_list, filter_series, chunks
 from tsio.timeseries import TimeSeries
 from tsio.timeseriescollection import TimeSeriesCollection
 
+last_use_executor = contextvars.ContextVar('tsio_last_use_executor', default=None)  # Executor of the LAST_USE
+# updates of the running call (set by AsyncDBIO for the calls it runs). Updates are not awaited when it is set.
+SIZE_SAMPLE_LENGTH = 16  # Dicts of scalars longer than this have their BSON size estimated from their first entry.
+
 
 def convert_to_ts_collection(ts):
     """ Convert a time series list-like object into :py:class:`TimeSeriesCollection`
@@ -61,13 +86,15 @@ def convert_to_ts_collection(ts):
         return result
 
 
-def ts_to_dict(ts):
+def ts_to_dict(ts, value_codec=None):
     """ Convert :py:class:`TimeSeries` to dict, for writing in the database.
 
     Parameters
     ----------
     ts: object convertible to :py:class:`TimeSeriesCollection`
         A time series.
+    value_codec: str, optional
+        Binary codec for the values (see :py:mod:`tsio.io.codecs`). Default is None (plain dict).
 
     Returns
     -------
@@ -79,7 +106,7 @@ def ts_to_dict(ts):
     for ts in ts_collection:
         entry = ts_attributes_to_dict(ts)
         entry[TS_NAME] = ts.ts_name
-        entry[TS_VALUES] = ts_values_to_dict(ts)
+        entry[TS_VALUES] = ts_values_to_dict(ts, value_codec)
         json_list.append(entry)
     return json_list
 
@@ -106,31 +133,495 @@ def ts_attributes_to_dict(ts):
             if isinstance(value, TimeSeries):
                 attributes[COMPONENTS][key] = value.ts_name
             elif isinstance(value, str):
-                pass
+                attributes[COMPONENTS][key] = value
             else:
                 raise ValueError('{} has a component that is neither a TimeSeries nor a string'.format(ts.ts_name))
     return attributes
 
 
-def ts_values_to_dict(ts):
+def ts_values_to_dict(ts, value_codec=None):
     """ Convert a :py:class:`TimeSeries` ``ts_values`` element into a dict.
 
     Parameters
     ----------
     ts: :py:class:`TimeSeries`
         Time series.
+    value_codec: str, optional
+        Binary codec for the values (see :py:mod:`tsio.io.codecs`). Values that the codec can't encode (e.g.:
+        non-numeric values) are stored as a plain dict. Default is None (plain dict).
+
+    Returns
+    -------
+    dict
+        Dictionary ready to be written in MongoDB.
+    """
+    return values_to_dict(ts.ts_values, value_codec)
+
+
+def values_to_dict(values, value_codec=None):
+    """ Convert a pandas.Series of values into a dict.
+
+    Parameters
+    ----------
+    values: pandas.Series
+        Values indexed by datetime.
+    value_codec: str, optional
+        Binary codec for the values. Default is None (plain dict).
 
     Returns
     -------
     dict
         Dictionary ready to be written in MongoDB.
     """
-    values = ts.ts_values.copy()
+    if value_codec:
+        block = encode_values(values, value_codec)
+        if block is not None:
+            return block
+    values = values.copy()
     values = values.to_json()
     values = json.loads(values)
     return values
 
 
+def group_by_bucket(values, bucket_period):
+    """ Split a pandas.Series of values by bucket period.
+
+    Parameters
+    ----------
+    values: pandas.Series
+        Values indexed by datetime.
+    bucket_period: str
+        pandas period alias used to group the values (e.g.: 'Y' for one bucket per year, 'M' for one per month).
+
+    Returns
+    -------
+    iterator of (datetime.datetime, pandas.Series)
+        Start of each bucket period and the values in it.
+    """
+    if values.empty:
+        return
+    bucket_starts = values.index.to_period(bucket_period).start_time
+    for bucket_start, bucket_values in values.groupby(bucket_starts):
+        yield bucket_start.to_pydatetime(), bucket_values
+
+
+def bucket_to_dict(ts_name, bucket_start, values, value_codec=None):
+    """ Build a bucket document.
+
+    Parameters
+    ----------
+    ts_name: str
+        Name of the time series.
+    bucket_start: datetime.datetime
+        Start of the bucket period.
+    values: pandas.Series
+        Values in the bucket period.
+    value_codec: str, optional
+        Binary codec for the values. Default is None (plain dict).
+
+    Returns
+    -------
+    dict
+        Bucket document ready to be written in MongoDB.
+    """
+    return {TS_NAME: ts_name,
+            BUCKET_START: bucket_start,
+            BUCKET_END: values.index.max().to_pydatetime(),
+            TS_VALUES: values_to_dict(values, value_codec)}
+
+
+def ts_values_to_buckets(ts, bucket_period, value_codec=None):
+    """ Split a :py:class:`TimeSeries` ``ts_values`` element into bucket documents, one per period.
+
+    Parameters
+    ----------
+    ts: :py:class:`TimeSeries`
+        Time series.
+    bucket_period: str
+        pandas period alias used to group the values (e.g.: 'Y' for one bucket per year, 'M' for one per month).
+    value_codec: str, optional
+        Binary codec for the values of each bucket. Default is None (plain dict).
+
+    Returns
+    -------
+    list(dict)
+        Bucket documents ready to be written in MongoDB.
+    """
+    return [bucket_to_dict(ts.ts_name, bucket_start, bucket_values, value_codec)
+            for bucket_start, bucket_values in group_by_bucket(ts.ts_values, bucket_period)]
+
+
+def merge_ts_values(values, new_values):
+    """ Merge new values into existing values, with the semantics of :py:meth:`TimeSeries.update_values`.
+
+    Parameters
+    ----------
+    values: pandas.Series, None
+        Existing values.
+    new_values: pandas.Series
+        New values. They take precedence over existing values at the same dates.
+
+    Returns
+    -------
+    pandas.Series
+        Merged values.
+    """
+    ts = TimeSeries('')
+    if values is not None:
+        ts.ts_values = values
+    ts.update_values(new_values.copy())
+    return ts.ts_values
+
+
+def estimate_size(value):
+    """ Estimate the BSON size of a value, without encoding it.
+
+    Long dicts of scalars (``ts_values``, or updates of their fields) are estimated from their first entry, so the
+    estimate doesn't grow with the number of values written. Other scalars than strings and bytes count as 8 bytes.
+
+    Parameters
+    ----------
+    value: object
+
+    Returns
+    -------
+    int
+        Estimated size, in bytes.
+    """
+    if isinstance(value, dict):
+        if len(value) > SIZE_SAMPLE_LENGTH:
+            key, item = next(iter(value.items()))
+            if not isinstance(item, (dict, list, tuple)):
+                return 5 + len(value) * (len(key) + 2 + estimate_size(item))
+        return 5 + sum(len(key) + 2 + estimate_size(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return 5 + sum(len(str(index)) + 2 + estimate_size(item) for index, item in enumerate(value))
+    if isinstance(value, str):
+        return 5 + len(value.encode('utf-8'))
+    if isinstance(value, bytes):
+        return 5 + len(value)
+    return 8
+
+
+WriteRequest = namedtuple('WriteRequest', ['ts_name', 'operation', 'size'])
+WriteRequest.__doc__ = """ A bulk write operation, with the name of the time series it writes and its estimated BSON
+size. """
+
+
+def write_request(ts_name, operation_class, *documents, **kwargs):
+    """ Build a :py:class:`WriteRequest`.
+
+    Parameters
+    ----------
+    ts_name: str
+        Name of the time series written by the operation.
+    operation_class: type
+        PyMongo operation class (e.g.: ``pymongo.UpdateOne``).
+    documents: dict
+        Filter and update/replacement documents of the operation.
+    kwargs: dict
+        Additional parameters of the operation (e.g.: ``upsert=True``).
+
+    Returns
+    -------
+    :py:class:`WriteRequest`
+    """
+    size = sum(estimate_size(document) for document in documents)
+    return WriteRequest(ts_name, operation_class(*documents, **kwargs), size)
+
+
+def make_batches(requests, max_batch_size, max_batch_bytes):
+    """ Split write requests into batches limited by number of operations and estimated size.
+
+    Parameters
+    ----------
+    requests: list(:py:class:`WriteRequest`)
+    max_batch_size: int
+        Maximum number of operations in a batch.
+    max_batch_bytes: int
+        Maximum estimated BSON size of a batch. A single request larger than this makes a batch of its own.
+
+    Returns
+    -------
+    list(list(:py:class:`WriteRequest`))
+    """
+    batches = list()
+    batch = list()
+    batch_bytes = 0
+    for request in requests:
+        if batch and (len(batch) >= max_batch_size or batch_bytes + request.size > max_batch_bytes):
+            batches.append(batch)
+            batch = list()
+            batch_bytes = 0
+        batch.append(request)
+        batch_bytes += request.size
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def merge_bulk_results(results):
+    """ Aggregate bulk API results.
+
+    Parameters
+    ----------
+    results: list(dict)
+        Bulk API results, whose ``index`` entries are already relative to the same list of requests.
+
+    Returns
+    -------
+    dict
+        A single bulk API result.
+    """
+    merged = {'nInserted': 0, 'nUpserted': 0, 'nMatched': 0, 'nModified': 0, 'nRemoved': 0,
+              'upserted': [], 'writeErrors': [], 'writeConcernErrors': []}
+    for result in results:
+        if not result:
+            continue
+        for key, value in result.items():
+            if key in merged:
+                merged[key] += value
+    return merged
+
+
+def clean_document(document):
+    """ Fine tune inplace the encoding of a document to be written. e.g. MongoDB does not accept numpy.int64.
+
+    Parameters
+    ----------
+    document: dict
+    """
+    for key in document:
+        try:
+            if np.issubdtype(document[key], np.signedinteger):
+                document[key] = document[key].item()
+        except:
+            pass
+        try:
+            if pd.isnull(document[key]):
+                document[key] = None
+        except (TypeError, ValueError):  # List-like attributes.
+            pass
+
+
+def attributes_document(ts):
+    """ Build the document that writes the attributes of a time series.
+
+    The ``LAST_VALUE_UPDATE`` and ``LAST_ATTRIBUTE_UPDATE`` stamps are maintained by the writing methods, so the
+    (possibly outdated) stamps read into ``ts_attributes`` are not written back. The names in the 'Components' dict
+    are also written in the ``COMPONENT_NAMES`` list, which is used to resolve components in the database.
+
+    Parameters
+    ----------
+    ts: :py:class:`TimeSeries`
+
+    Returns
+    -------
+    dict
+    """
+    document = ts_attributes_to_dict(ts)
+    document.pop(LAST_VALUE_UPDATE, None)
+    document.pop(LAST_ATTRIBUTE_UPDATE, None)
+    if isinstance(document.get(COMPONENTS), dict):
+        document[COMPONENT_NAMES] = sorted(set(document[COMPONENTS].values()))
+    document[TS_NAME] = ts.ts_name
+    clean_document(document)
+    return document
+
+
+def decode_ts_values(values):
+    """ Convert ``ts_values`` read from the database into a pandas.Series.
+
+    Parameters
+    ----------
+    values: dict, list(dict), None
+        Dictionary of ``{milliseconds_since_epoch: value}`` pairs, a block encoded by a value codec, or a list of
+        those (e.g.: the values of each bucket of a time series).
+
+    Returns
+    -------
+    pandas.Series
+        Series indexed by datetime.
+    """
+    if isinstance(values, list):
+        parts = [decode_ts_values(part) for part in values if part]
+        if len(parts) == 1:
+            return parts[0]
+        elif parts:
+            return pd.concat(parts)
+        values = None
+    if is_encoded(values):
+        return decode_values(values)
+    if not values:
+        return pd.Series(index=pd.DatetimeIndex([]), dtype=float)
+    new_values = pd.Series(values)
+    new_values.index = pd.to_datetime(new_values.index, unit='ms', errors='coerce')
+    return new_values
+
+
+def filter_ts_values(values, start=None, end=None, last_n=None):
+    """ Filter a pandas.Series of values by date.
+
+    Used on the client side for values that can't be filtered in the database (e.g.: encoded blocks).
+
+    Parameters
+    ----------
+    values: pandas.Series
+    start: date-like, optional
+    end: date-like, optional
+    last_n: int, optional
+
+    Returns
+    -------
+    pandas.Series
+    """
+    if start is None and end is None and last_n is None:
+        return values
+    values = values.sort_index()
+    filter_series(values, initial_date=start, final_date=end)
+    if last_n is not None:
+        values = values.iloc[len(values) - last_n:] if last_n > 0 else values.iloc[:0]
+    return values
+
+
+def filter_available(ts_list, available_dates):
+    """ Keep the time series that have values at any of a set of dates.
+
+    Parameters
+    ----------
+    ts_list: iterable of :py:class:`TimeSeries`
+    available_dates: list(date-like)
+
+    Returns
+    -------
+    list(:py:class:`TimeSeries`)
+    """
+    return [ts for ts in ts_list if has_values_at(ts.ts_values, available_dates)]
+
+
+def has_values_at(values, dates):
+    """ Check whether a pandas.Series of values has values at any of a set of dates.
+
+    Parameters
+    ----------
+    values: pandas.Series
+    dates: list(date-like)
+
+    Returns
+    -------
+    bool
+    """
+    return bool(set(map(pd.to_datetime, dates)) & set(values.index))
+
+
+def to_milliseconds(date):
+    """ Convert a date-like object into milliseconds since epoch, the key format of stored ``ts_values``.
+
+    Parameters
+    ----------
+    date: date-like
+
+    Returns
+    -------
+    int
+    """
+    return pd.Timestamp(date).value // 10 ** 6
+
+
+def values_filter_expression(start=None, end=None, last_n=None, field='$' + TS_VALUES):
+    """ Build an aggregation expression that filters a stored ``ts_values`` dict by date on the server.
+
+    Parameters
+    ----------
+    start: date-like, optional
+        Keep only values at or after this date.
+    end: date-like, optional
+        Keep only values at or before this date.
+    last_n: int, optional
+        Keep only the last `last_n` values (after filtering by `start` and `end`). Requires MongoDB 5.2 or higher.
+    field: str, optional
+        Field path of the ``ts_values`` dict. Default is the ``TS_VALUES`` field.
+
+    Returns
+    -------
+    dict
+        Aggregation expression evaluating to the filtered dict.
+    """
+    entries = {OBJECT_TO_ARRAY: {IF_NULL: [field, {}]}}
+    if last_n is not None and last_n <= 0:
+        entries = {LITERAL: []}
+    conditions = list()
+    if start is not None:
+        conditions.append({GREATER_OR_EQUAL_THAN: [{TO_LONG: '$$this.k'}, to_milliseconds(start)]})
+    if end is not None:
+        conditions.append({LESSER_OR_EQUAL_THAN: [{TO_LONG: '$$this.k'}, to_milliseconds(end)]})
+    if conditions:
+        entries = {FILTER: {'input': entries, 'cond': {AND: conditions}}}
+    if last_n is not None and last_n > 0:
+        # The cutoff is the smallest of the `last_n` largest keys. It is bound once, outside the filter condition.
+        entries = {LET: {'vars': {'entries': entries},
+                         'in': {LET: {'vars': {'cutoff': {MIN: {MAX_N: {'n': last_n,
+                                                                        'input': {MAP: {'input': '$$entries',
+                                                                                        'in': {TO_LONG: '$$this.k'}}}
+                                                                        }}}},
+                                      'in': {FILTER: {'input': '$$entries',
+                                                      'cond': {GREATER_OR_EQUAL_THAN: [{TO_LONG: '$$this.k'},
+                                                                                       '$$cutoff']}}}}}}}
+    # Blocks encoded by a value codec are returned whole, and filtered after decoding.
+    return {COND: [{EQUAL_TO: [{IF_NULL: [field + '.' + CODEC, None]}, None]},
+                   {ARRAY_TO_OBJECT: entries},
+                   field]}
+
+
+def bucket_count_expression(start=None, end=None):
+    """ Build an aggregation expression counting the values of a bucket (filtered by `start` and `end`) that are
+    known to be in the date range.
+
+    Plain values are filtered on the server, so all of them are counted. Encoded blocks are only filtered after
+    decoding, so their ``COUNT`` is only used if the whole bucket is in the date range, and they count as 0
+    otherwise.
+
+    Parameters
+    ----------
+    start: date-like, optional
+    end: date-like, optional
+
+    Returns
+    -------
+    dict
+    """
+    inside = list()
+    if start is not None:
+        inside.append({GREATER_OR_EQUAL_THAN: ['$' + BUCKET_START, pd.Timestamp(start).to_pydatetime()]})
+    if end is not None:
+        inside.append({LESSER_OR_EQUAL_THAN: ['$' + BUCKET_END, pd.Timestamp(end).to_pydatetime()]})
+    encoded_count = '$' + TS_VALUES + '.' + COUNT
+    if inside:
+        encoded_count = {COND: [{AND: inside}, encoded_count, 0]}
+    return {COND: [{EQUAL_TO: [{IF_NULL: ['$' + TS_VALUES + '.' + CODEC, None]}, None]},
+                   {SIZE: {OBJECT_TO_ARRAY: {IF_NULL: ['$' + TS_VALUES, {}]}}},
+                   encoded_count]}
+
+
+def stored_layout_expression(field='$' + TS_VALUES):
+    """ Build an aggregation expression describing how ``ts_values`` are stored, without returning plain values.
+
+    Parameters
+    ----------
+    field: str, optional
+        Field path of the ``ts_values``. Default is the ``TS_VALUES`` field.
+
+    Returns
+    -------
+    dict
+        Aggregation expression evaluating to the block itself if it is encoded by a value codec, to True if the
+        values are a plain dict, and to None if there are no values.
+    """
+    return {COND: [{EQUAL_TO: [{IF_NULL: [field, None]}, None]},
+                   None,
+                   {COND: [{EQUAL_TO: [{IF_NULL: [field + '.' + CODEC, None]}, None]}, True, field]}]}
+
+
 def instantiate_components(ts, components, ts_collection):
     """ Convert inplace the string values in the 'Components' dict of a time series into time series objects.
 
@@ -175,13 +666,216 @@ class DBIO:
         MongoDB database name.
     collection_name: str
         MongoDB collection.
+    bucket_period: str, optional
+        pandas period alias (e.g.: 'Y', 'M'). If given, ``ts_values`` are written in one bucket document per period,
+        in the ``collection_name + '_buckets'`` collection, and the main document only keeps the attributes. Default
+        is None (values are stored inside the main document).
+    value_codec: str, optional
+        Binary codec used to write ``ts_values`` (see :py:mod:`tsio.io.codecs`), e.g. 'columnar' for packed int64
+        dates and packed numeric values, or 'compressed' for delta/XOR-encoded, zlib-compressed dates and values.
+        Default is None (``{milliseconds_since_epoch: value}`` dicts).
+    max_batch_size: int, optional
+        Maximum number of operations sent in each bulk write. Default is 1000.
+    max_batch_bytes: int, optional
+        Maximum estimated BSON size of each bulk write. Default is 32 MiB.
+    write_workers: int, optional
+        Number of bulk writes executed concurrently. Default is 1.
+    raise_on_write_error: bool, optional
+        Whether writes raise ``BulkWriteError`` (with the aggregated result in its ``details``) when any operation
+        fails. If False, the aggregated result is returned with the errors in its ``writeErrors``. Default is True.
+    read_chunk_size: int, optional
+        Maximum number of names queried in each ``find`` when reading. Default is None (all names in one query).
+    read_workers: int, optional
+        Number of chunks queried and decoded into pandas concurrently when reading. Default is 1.
+    client_options: dict, optional
+        Options of the MongoDB client, as accepted by :py:func:`tsio.io.client.client_options` (e.g.:
+        ``{'max_pool_size': 50, 'timeout_ms': 5000, 'compressors': ['zstd', 'zlib']}``). Instances with the same host
+        address and client options share one client (and its connection pool) per process. Default is None.
+    cache: :py:class:`tsio.io.cache.TimeSeriesCache`, optional
+        Cache of the time series read by :py:meth:`read` (without date filters). Cached time series are only returned
+        if their ``LAST_VALUE_UPDATE`` and ``LAST_ATTRIBUTE_UPDATE`` in the database are unchanged, which is checked
+        with a single query that doesn't return values. Default is None (no cache).
+    last_use: {'sync', 'buffered', 'off'}, optional
+        How reading methods update the ``LAST_USE`` attribute of the time series read. 'sync' updates it at the end
+        of each read. 'buffered' keeps the names in memory and writes them in a single update every
+        `last_use_interval` seconds, on a background thread shared by all instances (see :py:meth:`flush_last_use` and
+        :py:meth:`close`). 'off' never updates it, e.g. for read-only analytics. Default is 'sync'.
+    last_use_interval: float, optional
+        Seconds between the updates of the 'buffered' `last_use` mode. Default is 5.
+    component_resolution: {'levels', 'graph'}, optional
+        How reading methods find the components of the time series read. 'levels' queries one level of the
+        component tree at a time, i.e. one round trip per level. 'graph' queries the whole component tree (up to
+        `depth`) with a single ``$graphLookup`` aggregation over ``COMPONENT_NAMES`` (on a view of the collection
+        without values, see :py:data:`tsio.constants.COMPONENTS_VIEW_SUFFIX`), and then reads all the time series
+        at once. If the aggregation fails (e.g.: on the memory limit of ``$graphLookup``), 'levels' is used instead.
+        Time series written by older versions need :py:meth:`rebuild_component_names` for 'graph'. Default is
+        'levels'.
+    index_advisor: bool, dict, optional
+        Whether to attach an :py:class:`tsio.io.indexing.IndexAdvisor`, which ensures a unique ``TS_NAME`` index on
+        first use and watches the queries of :py:meth:`select`. A dict is passed as parameters to the advisor (e.g.:
+        ``{'auto_create': True, 'min_uses': 5}``). Default is None (no advisor).
+    local_store: :py:class:`tsio.io.local.LocalStore`, str, optional
+        Local mirror (or its directory) used as a read-through tier by :py:meth:`read` and :py:meth:`read_values`:
+        mirrored time series are read from memory-mapped local files, without querying the database, and time series
+        read in full from the database are mirrored. The mirror is updated by :py:meth:`sync_local`. For offline use,
+        also set ``last_use='off'``. Default is None (no mirror).
+    instrumentation: bool, optional
+        Whether the MongoDB client reports its commands to :py:mod:`tsio.io.instrument`, so the records of
+        instrumented calls count round trips, documents and bytes (the time per phase is recorded regardless).
+        Default is False.
+    backend: :py:class:`tsio.io.backend.Backend`, optional
+        Storage of the collection. Default is None (a :py:class:`MongoBackend` on `host_address`,
+        `db_name` and `collection_name`). Use a :py:class:`tsio.io.backend.MemoryBackend` to work in process,
+        without a server.
+
+    Note
+    ----
+    Reading is transparent to the storage layout: time series written with or without buckets or value codecs are
+    read by any instance, regardless of its ``bucket_period`` and ``value_codec``.
     """
-    def __init__(self, host_address, db_name, collection_name):
+    def __init__(self, host_address, db_name, collection_name, bucket_period=None, value_codec=None,
+                 max_batch_size=1000, max_batch_bytes=32 * 2 ** 20, write_workers=1, raise_on_write_error=True,
+                 read_chunk_size=None, read_workers=1, client_options=None, cache=None,
+                 last_use='sync', last_use_interval=5.0, component_resolution='levels',
+                 index_advisor=None, local_store=None, instrumentation=False, backend=None):
         self.host_address = host_address
         self.db_name = db_name
         self.collection_name = collection_name
-        self.db = pymongo.MongoClient(self.host_address)[self.db_name][self.collection_name]
+        self.bucket_period = bucket_period
+        self.value_codec = value_codec
+        self.max_batch_size = max_batch_size
+        self.max_batch_bytes = max_batch_bytes
+        self.write_workers = write_workers
+        self.raise_on_write_error = raise_on_write_error
+        self.read_chunk_size = read_chunk_size
+        self.read_workers = read_workers
+        self.cache = cache
+        if last_use not in ('sync', 'buffered', 'off'):
+            raise ValueError("Unknown last_use mode: '{}'. Use 'sync', 'buffered' or 'off'.".format(last_use))
+        self.last_use = last_use
+        if component_resolution not in ('levels', 'graph'):
+            raise ValueError("Unknown component_resolution: '{}'. Use 'levels' or 'graph'."
+                             .format(component_resolution))
+        self.component_resolution = component_resolution
+        if index_advisor is True:
+            index_advisor = IndexAdvisor(self)
+        elif isinstance(index_advisor, dict):
+            index_advisor = IndexAdvisor(self, **index_advisor)
+        self.index_advisor = index_advisor or None
+        self.local_store = LocalStore(local_store) if isinstance(local_store, str) else local_store
+        self.last_use_buffer = LastUseBuffer(self._flush_last_use, last_use_interval) if last_use == 'buffered' \
+            else None
+        self.client_options = build_client_options(**(client_options or dict()))
+        if instrumentation:
+            self.client_options['event_listeners'] = list(self.client_options.get('event_listeners', list())) + \
+                [instrument.COMMAND_RECORDER]
+        self._client = None
+        self._client_key = None  # (process id, registry version) the client was resolved for.
+        self._db = None
+        self._buckets = None
+        self._update_indexes_ensured = False
+        self._attribute_catalog = None
+        self.backend = MongoBackend(self) if backend is None else backend
+
+    @property
+    def client(self):
+        """ pymongo.MongoClient: The client shared by all instances with the same host address and client options.
+
+        It is resolved from :py:mod:`tsio.io.client` on first use, and again only in a forked child process or after
+        the shared clients are closed or replaced.
+        """
+        if not isinstance(self.backend, MongoBackend):
+            raise NotImplementedError('This feature requires the MongoDB backend, not {}.'.format(
+                type(self.backend).__name__))
+        client_key = (os.getpid(), registry_version())
+        if client_key != self._client_key:
+            client = get_client(self.host_address, **self.client_options)
+            if client is not self._client:
+                # First use, first use in a forked child process, or a new shared client.
+                self._client = client
+                self._db = client[self.db_name][self.collection_name]
+                self._buckets = client[self.db_name][self.collection_name + BUCKETS_SUFFIX]
+                if self.index_advisor is not None:
+                    self.index_advisor.ensure_name_index()
+            self._client_key = client_key
+        return self._client
+
+    @property
+    def db(self):
+        """ pymongo.collection.Collection: The MongoDB collection of the time series.
+        """
+        self.client
+        return self._db
+
+    @property
+    def buckets(self):
+        """ pymongo.collection.Collection: The MongoDB collection of the value buckets.
+        """
+        self.client
+        return self._buckets
+
+    def _touch(self, names_list):
+        """ Update the ``LAST_USE`` attribute of time series, according to the `last_use` mode.
+
+        In 'sync' mode, if the :py:data:`last_use_executor` context variable is set, the update is submitted to it and
+        this method returns immediately (the update runs in place if the executor is shut down).
+
+        Parameters
+        ----------
+        names_list: list(str)
+            Names of the time series that were read.
+        """
+        if not names_list or self.last_use == 'off':
+            return
+        executor = last_use_executor.get()
+        with instrument.phase(instrument.LAST_USE):
+            if self.last_use_buffer is not None:
+                self.last_use_buffer.add(names_list, datetime.datetime.utcnow())
+            elif executor is not None:
+                try:
+                    executor.submit(self._update_last_use, names_list, datetime.datetime.utcnow())
+                except RuntimeError:  # The executor is shut down.
+                    self._update_last_use(names_list, datetime.datetime.utcnow())
+            else:
+                self._update_last_use(names_list, datetime.datetime.utcnow())
+
+    def _update_last_use(self, names_list, last_use):
+        self.backend.update({TS_NAME: {IN: names_list}}, {LAST_USE: last_use})
+
+    def _flush_last_use(self, names_list, last_use):
+        for names_chunk in chunks(names_list, self.read_chunk_size):
+            self._update_last_use(names_chunk, last_use)
+
+    def flush_last_use(self):
+        """ Write the ``LAST_USE`` updates buffered in 'buffered' `last_use` mode now. Does nothing in other modes.
+        """
+        if self.last_use_buffer is not None:
+            self.last_use_buffer.flush()
+
+    def close(self):
+        """ Write the pending ``LAST_USE`` updates and unregister the instance from the background flushing thread of
+        the 'buffered' `last_use` mode. The instance can still be used afterwards.
+
+        The MongoDB client is shared with other instances and stays open (see :py:func:`tsio.io.client.close_clients`).
+        """
+        if self.last_use_buffer is not None:
+            self.last_use_buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _ensure_update_indexes(self):
+        """ Create the ``LAST_VALUE_UPDATE`` and ``LAST_ATTRIBUTE_UPDATE`` indexes, once per instance.
+        """
+        if not self._update_indexes_ensured:
+            self.backend.ensure_index([(LAST_VALUE_UPDATE, pymongo.ASCENDING)])
+            self.backend.ensure_index([(LAST_ATTRIBUTE_UPDATE, pymongo.ASCENDING)])
+            self._update_indexes_ensured = True
 
+    @instrument.instrumented
     def read_attributes(self, ts_collection, components=True, depth=np.inf, attributes=None):
         """ Read time series attributes from the database.
 
@@ -213,13 +907,23 @@ class DBIO:
         temp_ts_collection = convert_to_ts_collection(ts_collection)
         counter = 0
         all_names_list = list()
+        prefetched = None
+        if self._resolve_graph(depth):
+            with instrument.phase(instrument.COMPONENTS):
+                prefetched = self.backend.component_closure(temp_ts_collection.ts_names(), depth, attr_specs)
 
         while counter < depth:
             ts_collection = temp_ts_collection
             names_list = ts_collection.ts_names()
             if not names_list:
                 break
-            query_bulk_result = list(self.db.find({TS_NAME: {IN: names_list}}, attr_specs))
+            if prefetched is None:
+                with instrument.phase(instrument.QUERY):
+                    query_bulk_result = self._map_chunks(
+                        lambda chunk: list(self.backend.find({TS_NAME: {IN: chunk}}, attr_specs)), names_list)
+            else:
+                query_bulk_result = [copy.deepcopy(prefetched[ts_name]) for ts_name in names_list
+                                     if ts_name in prefetched]
             all_names_list += names_list
             temp_ts_collection = TimeSeriesCollection()
             counter += 1
@@ -227,16 +931,20 @@ class DBIO:
                 ts = ts_collection.get(result[TS_NAME])
                 if isinstance(ts, TimeSeries):
                     del result[TS_NAME]
-                    del result[ID]
-                    ts.update_attributes(result)
+                    result.pop(ID, None)
+                    result.pop(BUCKET_PERIOD, None)
+                    result.pop(COMPONENT_NAMES, None)
+                    with instrument.phase(instrument.MERGE):
+                        ts.update_attributes(result)
                     if counter < depth:
-                        instantiate_components(ts, components, temp_ts_collection)
+                        with instrument.phase(instrument.COMPONENTS):
+                            instantiate_components(ts, components, temp_ts_collection)
 
         # Now updating LAST_USE attribute for the requested TimeSeries
-        self.db.update_many({TS_NAME: {IN: all_names_list}},
-                            {SET: {LAST_USE: datetime.datetime.utcnow()}})
+        self._touch(all_names_list)
 
-    def read_values(self, ts_collection, components=True, depth=np.inf):
+    @instrument.instrumented
+    def read_values(self, ts_collection, components=True, depth=np.inf, start=None, end=None, last_n=None):
         """ Read time series values from the database.
 
         Parameters
@@ -247,6 +955,17 @@ class DBIO:
             Optional collection of component names to be read and instantiated. Default is all components.
         depth: int, optional
             Depth of component instantiation. ``depth = 1`` means no components are instantiated. Default is infinity.
+        start: date-like, optional
+            Read only values at or after this date. Default is no lower bound.
+        end: date-like, optional
+            Read only values at or before this date. Default is no upper bound.
+        last_n: int, optional
+            Read only the last `last_n` values (within `start` and `end`). Default is all values.
+
+        Note
+        ----
+        The date filters are evaluated in the database, so only the requested values are transferred. ``last_n``
+        requires MongoDB 5.2 or higher.
         """
         if isinstance(components, list):
             components = [key.upper() for key in components]
@@ -254,27 +973,34 @@ class DBIO:
         temp_ts_collection = convert_to_ts_collection(ts_collection)
         counter = 0
         all_names_list = list()
+        with instrument.phase(instrument.COMPONENTS):
+            prefetched = self._prefetch_series(temp_ts_collection.ts_names(), depth, {TS_NAME: 1}, start, end,
+                                               last_n)
 
         while counter < depth:
             ts_collection = temp_ts_collection
             names_list = ts_collection.ts_names()
             if not names_list:
                 break
-            query_bulk_result = list(self.db.find({TS_NAME: {IN: names_list}}, {TS_NAME: 1, TS_VALUES: 1}))
+            if prefetched is None:
+                query_bulk_result = self._fetch_series(names_list, {TS_NAME: 1}, start, end, last_n)
+            else:
+                query_bulk_result = self._take_prefetched(prefetched, names_list)
             all_names_list += names_list
             temp_ts_collection = TimeSeriesCollection()
             counter += 1
-            for result in query_bulk_result:
-                if result and TS_VALUES in result:
-                    ts = ts_collection.get(result[TS_NAME])
+            for ts_name, _, new_values in query_bulk_result:
+                if new_values is not None:
+                    ts = ts_collection.get(ts_name)
                     if isinstance(ts, TimeSeries):
-                        new_values = pd.Series(result[TS_VALUES])
-                        new_values.index = pd.to_datetime(new_values.index, unit='ms', errors='coerce')
-                        ts.update_values(new_values)
+                        with instrument.phase(instrument.MERGE):
+                            ts.update_values(new_values)
                         if counter < depth:
-                            instantiate_components(ts, components, temp_ts_collection)
+                            with instrument.phase(instrument.COMPONENTS):
+                                instantiate_components(ts, components, temp_ts_collection)
 
-    def read(self, ts_collection, components=True, depth=np.inf):
+    @instrument.instrumented
+    def read(self, ts_collection, components=True, depth=np.inf, start=None, end=None, last_n=None):
         """ Read time series attributes and values from the database.
 
         Parameters
@@ -285,6 +1011,17 @@ class DBIO:
             Optional collection of component names to be read and instantiated. Default is all components.
         depth: int, optional
             Depth of component instantiation. ``depth = 1`` means no components are instantiated. Default is infinity.
+        start: date-like, optional
+            Read only values at or after this date. Default is no lower bound.
+        end: date-like, optional
+            Read only values at or before this date. Default is no upper bound.
+        last_n: int, optional
+            Read only the last `last_n` values (within `start` and `end`). Default is all values.
+
+        Note
+        ----
+        The date filters are evaluated in the database, so only the requested values are transferred. ``last_n``
+        requires MongoDB 5.2 or higher.
         """
         if isinstance(components, list):
             components = [key.upper() for key in components]
@@ -292,34 +1029,78 @@ class DBIO:
         temp_ts_collection = convert_to_ts_collection(ts_collection)
         counter = 0
         all_names_list = list()
+        with instrument.phase(instrument.COMPONENTS):
+            prefetched = self._prefetch_series(temp_ts_collection.ts_names(), depth, None, start, end, last_n)
         while counter < depth:
             ts_collection = temp_ts_collection
             names_list = ts_collection.ts_names()
             if not names_list:
                 break
-            query_bulk_result = list(self.db.find({TS_NAME: {IN: names_list}}))
+            if prefetched is None:
+                query_bulk_result = self._fetch_series(names_list, start=start, end=end, last_n=last_n)
+            else:
+                query_bulk_result = self._take_prefetched(prefetched, names_list)
             all_names_list += names_list
             temp_ts_collection = TimeSeriesCollection()
             counter += 1
-            new_values_dict = dict()
-            for result in query_bulk_result:
-                ts = ts_collection.get(result[TS_NAME])
+            for ts_name, new_attributes, new_values in query_bulk_result:
+                ts = ts_collection.get(ts_name)
                 if isinstance(ts, TimeSeries):
-                    new_values_dict[TS_VALUES] = result[TS_VALUES]
-                    del result[TS_VALUES]
-                    del result[ID]
-                    del result[TS_NAME]
-                    ts.update_attributes(result)
-                    new_values = pd.Series(new_values_dict[TS_VALUES])
-                    new_values.index = pd.to_datetime(new_values.index, unit='ms', errors='coerce')
-                    ts.update_values(new_values)
+                    with instrument.phase(instrument.MERGE):
+                        ts.update_attributes(new_attributes)
+                        if new_values is not None:
+                            ts.update_values(new_values)
                     if counter < depth:
-                        instantiate_components(ts, components, temp_ts_collection)
+                        with instrument.phase(instrument.COMPONENTS):
+                            instantiate_components(ts, components, temp_ts_collection)
 
         # Now updating LAST_USE attribute for the requested TimeSeries
-        self.db.update_many({TS_NAME: {IN: all_names_list}},
-                            {SET: {LAST_USE: datetime.datetime.utcnow()}})
+        self._touch(all_names_list)
+
+    def _resolve_graph(self, depth):
+        """ Whether components are to be resolved with a single aggregation.
+        """
+        return self.component_resolution == 'graph' and depth > 1
+
+    def _prefetch_series(self, names_list, depth, projection=None, start=None, end=None, last_n=None):
+        """ In 'graph' `component_resolution`, read time series and all their components up to `depth` at once.
+
+        Returns
+        -------
+        dict, None
+            ``{ts_name: (ts_name, attributes, values)}``, see :py:meth:`_fetch_series`. None in 'levels'
+            `component_resolution`.
+        """
+        if not self._resolve_graph(depth):
+            return None
+        # The tree is resolved without values, which are then read for all the time series at once.
+        closure = self.backend.component_closure(names_list, depth, {TS_NAME: 1})
+        if closure is None:
+            return None
+        return {record[0]: record for record in self._fetch_series(list(closure), projection, start, end, last_n)}
+
+    @staticmethod
+    def _take_prefetched(prefetched, names_list):
+        """ Get copies of prefetched records, since a time series may appear at more than one level of the tree.
+        """
+        return [(ts_name, copy.deepcopy(attributes), None if values is None else values.copy())
+                for ts_name, attributes, values in (prefetched[ts_name] for ts_name in names_list
+                                                    if ts_name in prefetched)]
+
+    def rebuild_component_names(self):
+        """ Fill the ``COMPONENT_NAMES`` list of all the time series from their 'Components' dict.
 
+        Only needed for time series written by older versions, before reading them with the 'graph'
+        `component_resolution`. Requires MongoDB 4.2 or higher.
+
+        Returns
+        -------
+        int
+            Number of modified documents.
+        """
+        return self.backend.rebuild_component_names()
+
+    @instrument.instrumented
     def write_attributes(self, ts_collection, components=True, depth=np.inf):
         """ Write time series attributes to the database.
 
@@ -334,50 +1115,52 @@ class DBIO:
         """
         if isinstance(components, list):
             components = [key.upper() for key in components]
-        temp_ts_collection = convert_to_ts_collection(ts_collection)
-        counter = 0
-        full_ts_collection = TimeSeriesCollection()
-        while counter < depth:
-            ts_collection = temp_ts_collection
-            names_list = ts_collection.ts_names()
-            if not names_list:
-                break
-            full_ts_collection.add_list(ts_collection)
-            counter += 1
-            temp_ts_collection = TimeSeriesCollection()
-            for result in names_list:
-                ts = ts_collection.get(result)
-                if isinstance(ts, TimeSeries) and counter < depth:
-                    instantiate_components(ts, components, temp_ts_collection)
+        full_ts_collection = self._collect_for_writing(ts_collection, components, depth)
+        self._attribute_catalog = None
+        now = datetime.datetime.utcnow()
+        documents = dict()
+        with instrument.phase(instrument.ENCODE):
+            for ts in full_ts_collection:
+                document = attributes_document(ts)
+                document[LAST_ATTRIBUTE_UPDATE] = now
+                documents[ts.ts_name] = document
+        return self.backend.write(documents)
+
+    @instrument.instrumented
+    def write(self, ts_collection, components=True, depth=np.inf, mode='replace'):
+        """ Write time series attributes and values to the database.
 
-        documents = ts_to_dict(full_ts_collection)
-        if documents:
-            bulkop = self.db.initialize_ordered_bulk_op()
-            for document in documents:
-                for key in document:  # Some fine tuning in encoding. e.g. MongoDB does not accept numpy.int64.
-                    try:
-                        if np.issubdtype(document[key], np.signedinteger):
-                            document[key] = document[key].item()
-                    except:
-                        pass
-                try:
-                    # Remove values from the document, we are only updating the attributes
-                    del document[TS_VALUES]
-                except:
-                    pass
-
-                bulkop.find({TS_NAME: document[TS_NAME]}).upsert().update({SET: document})
+        Parameters
+        ----------
+        ts_collection: type convertible to :py:class:`TimeSeriesCollection`
+            Time series to be written.
+        components: list(str), optional
+            Optional collection of component names to be written. Default is all components.
+        depth: int, optional
+            Depth of component writing. ``depth = 1`` means no components are written. Default is infinity.
+        mode: {'replace', 'merge'}, optional
+            How to write the values, see :py:meth:`write_values`. Default is 'replace'.
+        """
+        if isinstance(components, list):
+            components = [key.upper() for key in components]
 
-            try:
-                return bulkop.execute()
-            except BulkWriteError as bwe:
-                print(bwe.details)
-                werrors = bwe.details['writeErrors']
-                input(werrors)
-                raise
-
-    def write(self, ts_collection, components=True, depth=np.inf):
-        """ Write time series attributes and values to the database.
+        full_ts_collection = self._collect_for_writing(ts_collection, components, depth)
+        self._attribute_catalog = None
+        now = datetime.datetime.utcnow()
+        documents = dict()
+        with instrument.phase(instrument.ENCODE):
+            for ts in full_ts_collection:
+                document = attributes_document(ts)
+                document[LAST_ATTRIBUTE_UPDATE] = now
+                if mode != 'merge' or not ts.ts_values.empty:
+                    # Empty merges write no values (e.g.: attribute changes flushed by BufferedDBIO).
+                    document[LAST_VALUE_UPDATE] = now
+                documents[ts.ts_name] = document
+        return self.backend.write(documents, full_ts_collection, mode)
+
+    @instrument.instrumented
+    def write_values(self, ts_collection, components=True, depth=np.inf, mode='replace'):
+        """ Write time series values to the database.
 
         Parameters
         ----------
@@ -387,22 +1170,54 @@ class DBIO:
             Optional collection of component names to be written. Default is all components.
         depth: int, optional
             Depth of component writing. ``depth = 1`` means no components are written. Default is infinity.
+        mode: {'replace', 'merge'}, optional
+            'replace' overwrites the stored values with ``ts_values``. 'merge' only sends ``ts_values`` and merges
+            them into the stored values, with the semantics of :py:meth:`TimeSeries.update_values`. Default is
+            'replace'.
+
+        Note
+        ----
+        In 'merge' mode the new values are written in the storage layout of the stored time series (its bucket period
+        and the codec of its values or of each bucket), which is read with a single query. Time series not stored yet
+        are written in the layout of this instance. Encoded values can't be updated in place, so they (or only the
+        affected buckets, if bucketed) are read by that query and rewritten.
         """
         if isinstance(components, list):
             components = [key.upper() for key in components]
+        full_ts_collection = self._collect_for_writing(ts_collection, components, depth)
+        now = datetime.datetime.utcnow()
+        # Only time series whose values are written get the stamp (empty merges write nothing).
+        documents = {ts.ts_name: {LAST_VALUE_UPDATE: now} for ts in full_ts_collection
+                     if mode != 'merge' or not ts.ts_values.empty}
+        return self.backend.write(documents, full_ts_collection, mode)
 
-        temp_ts_collection = convert_to_ts_collection(ts_collection)
-        to_updating_collection_names = temp_ts_collection.ts_names()[:]
+    @instrument.instrumented
+    def append(self, ts_collection, components=True, depth=np.inf):
+        """ Merge time series values into the values stored in the database, sending only the passed values.
+
+        Equivalent to ``write_values(ts_collection, components, depth, mode='merge')``.
+
+        Parameters
+        ----------
+        ts_collection: type convertible to :py:class:`TimeSeriesCollection`
+            Time series whose new values are to be written.
+        components: list(str), optional
+            Optional collection of component names to be written. Default is all components.
+        depth: int, optional
+            Depth of component writing. ``depth = 1`` means no components are written. Default is infinity.
+        """
+        return self.write_values(ts_collection, components=components, depth=depth, mode='merge')
 
-        if len(to_updating_collection_names) >= 1000:
-            new_ts_collection = TimeSeriesCollection(temp_ts_collection)
-            temp_ts_collection.remove_list(to_updating_collection_names[998:])
-            new_ts_collection.remove_list(to_updating_collection_names[:998])
-            self.write(new_ts_collection, components, depth)
+    def _collect_for_writing(self, ts_collection, components, depth):
+        """ Collect time series and their components up to `depth`.
 
+        Returns
+        -------
+        :py:class:`TimeSeriesCollection`
+        """
+        temp_ts_collection = convert_to_ts_collection(ts_collection)
         counter = 0
         full_ts_collection = TimeSeriesCollection()
-
         while counter < depth:
             ts_collection = temp_ts_collection
             names_list = ts_collection.ts_names()
@@ -414,29 +1229,185 @@ class DBIO:
             for result in names_list:
                 ts = ts_collection.get(result)
                 if isinstance(ts, TimeSeries) and counter < depth:
-                    instantiate_components(ts, components, temp_ts_collection)
+                    with instrument.phase(instrument.COMPONENTS):
+                        instantiate_components(ts, components, temp_ts_collection)
+        return full_ts_collection
+
+    @staticmethod
+    def _combine_results(*results):
+        """ Combine the results of bulk writes in different collections.
+        """
+        results = [result for result in results if result]
+        if not results:
+            return None
+        if len(results) == 1:
+            return results[0]
+        return merge_bulk_results(results)
+
+    def _fetch_series(self, names_list, projection=None, start=None, end=None, last_n=None):
+        """ Query and decode time series.
+
+        If ``read_chunk_size`` is set, names are queried in chunks of that size, and if ``read_workers`` is greater
+        than 1, the chunks are queried and decoded concurrently on a thread pool.
 
-        documents = ts_to_dict(full_ts_collection)
-        if documents:
-            bulkop = self.db.initialize_ordered_bulk_op()
+        Parameters
+        ----------
+        names_list: list(str)
+            Names of the time series to be read.
+        projection: dict, optional
+            Fields to be returned, in addition to the values. Default is all fields.
+        start: date-like, optional
+            Read only values at or after this date.
+        end: date-like, optional
+            Read only values at or before this date.
+        last_n: int, optional
+            Read only the last `last_n` values.
+
+        Returns
+        -------
+        list(tuple)
+            ``(ts_name, attributes, values)`` for each time series found, where ``values`` is a pandas.Series, or None
+            if the document has no values.
+        """
+        full = projection is None and start is None and end is None and last_n is None
+        local_records = list()
+        if self.local_store is not None:
+            local_records, names_list = self._fetch_local(names_list, start, end, last_n)
+            if not names_list:
+                return local_records
+        if self.cache is not None and full:
+            records = self._fetch_cached(names_list)
+        else:
+            records = self._map_chunks(lambda chunk: self.backend.read(chunk, projection, start, end, last_n),
+                                       names_list)
+        if self.local_store is not None and full:
+            self._mirror(records)
+        return local_records + records
+
+    def _fetch_local(self, names_list, start=None, end=None, last_n=None):
+        """ Read time series from ``local_store``.
+
+        Returns
+        -------
+        list(tuple), list(str)
+            Records of the mirrored time series (see :py:meth:`_fetch_series`), and the names not mirrored.
+        """
+        records = list()
+        missing = list()
+        for ts_name in names_list:
+            entry = self.local_store.get(ts_name)
+            if entry is None:
+                missing.append(ts_name)
+            else:
+                attributes, values = entry
+                records.append((ts_name, attributes, filter_ts_values(values, start, end, last_n)))
+        return records, missing
+
+    def _mirror(self, records):
+        """ Write records read in full from the database (see :py:meth:`_fetch_series`) into ``local_store``.
+        """
+        mirrored = False
+        for ts_name, attributes, values in records:
+            if values is not None:
+                stamps = (attributes.get(LAST_VALUE_UPDATE), attributes.get(LAST_ATTRIBUTE_UPDATE))
+                mirrored = self.local_store.put(ts_name, attributes, values, stamps, save=False) or mirrored
+        if mirrored:
+            self.local_store.save()
+
+    @instrument.instrumented
+    def sync_local(self, ts_collection=None):
+        """ Update ``local_store`` incrementally.
+
+        Only the time series whose ``LAST_VALUE_UPDATE`` or ``LAST_ATTRIBUTE_UPDATE`` changed since they were
+        mirrored (or that were not mirrored yet) are read. Mirrored time series no longer in the database are removed
+        from the mirror.
+
+        Parameters
+        ----------
+        ts_collection: type convertible to :py:class:`TimeSeriesCollection`, optional
+            Time series to be mirrored. Default is all the time series already in the mirror.
+
+        Returns
+        -------
+        list(str)
+            Names of the time series read from the database.
+        """
+        if self.local_store is None:
+            raise ValueError('This DBIO instance has no local_store.')
+        if ts_collection is None:
+            names_list = self.local_store.names()
+        else:
+            names_list = convert_to_ts_collection(ts_collection).ts_names()
+        if not names_list:
+            return list()
+        projection = {TS_NAME: 1, LAST_VALUE_UPDATE: 1, LAST_ATTRIBUTE_UPDATE: 1, ID: 0}
+        documents = self._map_chunks(lambda chunk: list(self.backend.find({TS_NAME: {IN: chunk}}, projection)),
+                                     names_list)
+        stamps = {document[TS_NAME]: (document.get(LAST_VALUE_UPDATE), document.get(LAST_ATTRIBUTE_UPDATE))
+                  for document in documents}
+        for ts_name in names_list:
+            if ts_name not in stamps:
+                self.local_store.remove(ts_name, save=False)
+        # Time series without stamps can't be compared, so they are always read.
+        stale = [ts_name for ts_name in names_list if ts_name in stamps and
+                 (stamps[ts_name] == (None, None) or self.local_store.stamps(ts_name) != stamps[ts_name])]
+        self._mirror(self._map_chunks(self.backend.read, stale))
+        self.local_store.save()
+        return stale
+
+    def _fetch_cached(self, names_list):
+        """ Read time series through ``cache``, querying only those that are not cached or are stale.
+
+        See :py:meth:`_fetch_series`.
+        """
+        stamps = dict()
+        cached_names = [ts_name for ts_name in names_list if ts_name in self.cache]
+        if cached_names:
+            projection = {TS_NAME: 1, LAST_VALUE_UPDATE: 1, LAST_ATTRIBUTE_UPDATE: 1, ID: 0}
+            with instrument.phase(instrument.QUERY):
+                documents = self._map_chunks(lambda chunk: list(self.backend.find({TS_NAME: {IN: chunk}}, projection)),
+                                             cached_names)
             for document in documents:
-                for key in document:  # Some fine tuning in encoding. e.g. MongoDB does not accept numpy.int64.
-                    try:
-                        if np.issubdtype(document[key], np.signedinteger):
-                            document[key] = document[key].item()
-                    except:
-                        pass
-                    if pd.isnull(document[key]):
-                        document[key] = None
-                bulkop.find({TS_NAME: document[TS_NAME]}).upsert().update({SET: document})
+                stamps[document[TS_NAME]] = (document.get(LAST_VALUE_UPDATE), document.get(LAST_ATTRIBUTE_UPDATE))
+        records = list()
+        missing = list()
+        for ts_name in names_list:
+            entry = self.cache.get(ts_name, stamps.get(ts_name))
+            if entry is None:
+                missing.append(ts_name)
+            else:
+                records.append((ts_name,) + entry)
+        for ts_name, attributes, values in self._map_chunks(self.backend.read, missing):
+            records.append((ts_name, attributes, values))
+            ts_stamps = (attributes.get(LAST_VALUE_UPDATE), attributes.get(LAST_ATTRIBUTE_UPDATE))
+            # Time series without stamps (e.g.: written by older versions) can't be validated, so they aren't cached.
+            if values is not None and ts_stamps != (None, None):
+                self.cache.put(ts_name, ts_stamps, attributes, values)
+        return records
+
+    def _map_chunks(self, function, names_list):
+        """ Apply a function to chunks of ``read_chunk_size`` names, on ``read_workers`` threads.
 
-            try:
-                retval = bulkop.execute()
-                return retval
-            except BulkWriteError as bwe:
-                warnings.warn(bwe.details)
-                raise bwe
+        Parameters
+        ----------
+        function: callable
+            Function receiving a list of names and returning a list.
+        names_list: list(str)
 
+        Returns
+        -------
+        list
+            Concatenation of the results of each chunk.
+        """
+        names_chunks = chunks(names_list, self.read_chunk_size)
+        if self.read_workers and self.read_workers > 1 and len(names_chunks) > 1:
+            with ThreadPoolExecutor(max_workers=self.read_workers) as executor:
+                results = list(executor.map(instrument.propagate(function), names_chunks))
+        else:
+            results = [function(chunk) for chunk in names_chunks]
+        return [item for result in results for item in result]
+
+    @instrument.instrumented
     def remove(self, ts_collection, components=False, depth=np.inf, confirm=True):
         """ Remove time series from the database.
 
@@ -482,8 +1453,17 @@ class DBIO:
                 elif ans == 'y':
                     break
         if names_to_delete:
-            return list(self.db.remove({TS_NAME: {IN: names_to_delete}}))
-
+            self._attribute_catalog = None
+            if self.cache is not None:
+                for ts_name in names_to_delete:
+                    self.cache.discard(ts_name)
+            if self.local_store is not None:
+                for ts_name in names_to_delete:
+                    self.local_store.remove(ts_name, save=False)
+                self.local_store.save()
+            return list(self.backend.delete(names_to_delete))
+
+    @instrument.instrumented
     def attribute_names(self, ts_names=None):
         """ Return set of attribute names in the database.
 
@@ -497,20 +1477,17 @@ class DBIO:
         -------
         list(str)
             All the attribute names in `ts_names` or in the database.
-        """
-        all_attributes = set()
 
-        if not ts_names:
-            all_docs = self.db.find()
-        else:
-            all_docs = self.db.find({TS_NAME: {IN: ts_names}}, {TS_VALUES: 0})
-
-        for doc in all_docs:
-            all_attributes.update(doc.keys())
-        all_attributes = sorted(list(all_attributes))
-        all_attributes = [x for x in all_attributes if x not in RESERVED_KEYS]
+        Note
+        ----
+        With MongoDB, the attribute names are collected by an aggregation in the database, values are not
+        transferred.
+        """
+        all_attributes = sorted(self.backend.attribute_names(ts_names))
+        all_attributes = [x for x in all_attributes if x not in RESERVED_KEYS + INTERNAL_KEYS]
         return all_attributes
 
+    @instrument.instrumented
     def read_all_attribute_values(self, attributes=None):
         """ Return set of attribute values in the database.
 
@@ -526,20 +1503,45 @@ class DBIO:
         """
         if attributes is None:
             attributes = self.attribute_names()
-        try:
-            attributes.remove(TS_VALUES)
-        except:
-            pass
-        try:
-            attributes.remove(COMPONENTS)
-        except:
-            pass
-        all_values = []
-        for attribute in attributes:
-            all_values.extend(self.db.distinct(attribute))
+        attributes = [attribute for attribute in attributes if attribute not in (TS_VALUES, COMPONENTS)]
+        all_values = [value for _, value in self.backend.attribute_values(attributes)]
         all_values = sorted(all_values)
         return all_values
 
+    def attribute_catalog(self, refresh=False):
+        """ Return the attribute names in the database and the distinct values of each one.
+
+        The catalog is built by a single aggregation and kept in memory until :py:meth:`write`,
+        :py:meth:`write_attributes` or :py:meth:`remove` is called on this instance, so it can be queried repeatedly
+        (e.g.: to fill selection lists). Changes made by other instances or processes are only seen with
+        ``refresh=True``.
+
+        Parameters
+        ----------
+        refresh: bool, optional
+            Whether to rebuild the catalog even if it is cached. Default is False.
+
+        Returns
+        -------
+        dict
+            ``{attribute_name: list(values)}``. The 'Components' dict and the attributes maintained by tsio (e.g.:
+            ``LAST_USE``) are not included.
+        """
+        catalog = self._attribute_catalog
+        if catalog is None or refresh:
+            catalog = dict()
+            excluded = RESERVED_KEYS + INTERNAL_KEYS + [TS_VALUES, COMPONENTS, LAST_USE, LAST_VALUE_UPDATE,
+                                                        LAST_ATTRIBUTE_UPDATE]
+            for attribute, value in self.backend.attribute_values(excluded=excluded):
+                catalog.setdefault(attribute, list()).append(value)
+            for attribute, values in catalog.items():
+                try:
+                    values.sort()
+                except TypeError:  # Values of different types.
+                    pass
+            self._attribute_catalog = catalog
+        return {attribute: list(values) for attribute, values in catalog.items()}
+
     def in_db(self, ts):
         """ Check if a time series is in the database.
 
@@ -552,12 +1554,51 @@ class DBIO:
         bool
             Whether there is a time series with the same name in the database.
         """
-        found_entry = self.db.find({TS_NAME: ts.ts_name}, {ID: 1}).count()
-        if found_entry > 0:
-            return True
-        else:
-            return False
+        return ts.ts_name in self.exists(ts)
+
+    @instrument.instrumented
+    def exists(self, ts_collection):
+        """ Get the names of the time series that are in the database.
+
+        Names are queried in chunks of ``read_chunk_size``, and only ``TS_NAME`` is returned. With an index on
+        ``TS_NAME`` (created by the `index_advisor`), the queries are covered by the index and no document is fetched.
+
+        Parameters
+        ----------
+        ts_collection: type convertible to :py:class:`TimeSeriesCollection`
+            Time series (or names) to be checked.
+
+        Returns
+        -------
+        set(str)
+            Names of the time series that are in the database.
+        """
+        names_list = convert_to_ts_collection(ts_collection).ts_names()
+        if not names_list:
+            return set()
+        found = self._map_chunks(lambda chunk: [doc[TS_NAME] for doc in self.backend.find({TS_NAME: {IN: chunk}},
+                                                                                         {TS_NAME: 1, ID: 0})],
+                                 names_list)
+        return set(found)
+
+    def missing(self, ts_collection):
+        """ Get the names of the time series that are not in the database.
+
+        Parameters
+        ----------
+        ts_collection: type convertible to :py:class:`TimeSeriesCollection`
+            Time series (or names) to be checked.
+
+        Returns
+        -------
+        list(str)
+            Names of the time series that are not in the database, in the order of `ts_collection`.
+        """
+        names_list = convert_to_ts_collection(ts_collection).ts_names()
+        found = self.exists(names_list)
+        return [ts_name for ts_name in names_list if ts_name not in found]
 
+    @instrument.instrumented
     def select(self, **kwargs):
         """ Get time series names matching attribute specifications.
 
@@ -569,8 +1610,9 @@ class DBIO:
         Note
         ----
         * Use ``MODE={"OR", "AND"}`` to choose whether to match attributes with "AND" or "OR". Default is "AND".
-        * Use ``AVAILABLE_DATES=list(date-like)`` to return only names of time series that have values at a set of
-        dates.
+        * Use ``AVAILABLE=list(date-like)`` to return only names of time series that have values at any of a set of
+        dates. The dates are checked in the database, without reading values (except values stored with a value
+        codec).
         * Use ``ALL_FIELDS=True`` to choose whether to return time series with the "FIELD" attribute. The default
         behaviour is to not return these time series.
 
@@ -579,6 +1621,29 @@ class DBIO:
         list(str)
             Names of time series matching the passed specifications.
         """
+        query, available_dates = self._select_query(**kwargs)
+        if self.index_advisor is not None:
+            self.index_advisor.observe(query)
+        if available_dates is None:
+            with instrument.phase(instrument.QUERY):
+                names_list = [doc[TS_NAME] for doc in self.backend.find(query, {TS_NAME: 1})]
+        else:
+            names_list = self.backend.select_available(query, [pd.to_datetime(date) for date in available_dates])
+
+        new_collection = TimeSeriesCollection()
+        for ts_name in names_list:
+            new_collection.add(ts_name)
+        return new_collection
+
+    @staticmethod
+    def _select_query(**kwargs):
+        """ Build the MongoDB query of attribute specifications. See :py:meth:`select`.
+
+        Returns
+        -------
+        dict, list
+            The query, and the dates of the ``AVAILABLE`` specification (None if not given).
+        """
         # Loads entire DB, all timeseries (only with names and attributes) and selects by attributes given in arguments.
         # EXCLUSIVE = 'NO' means it will keep timeseries that do not have one of the attributes. MODE= 'AND'
         # means it will keep only the timeseries with attributes matching all those given.
@@ -593,25 +1658,254 @@ class DBIO:
             kwargs[FIELD] = [None]
 
         if mode.upper() in OR_VALUES:
-            filtered_collection = self.db.find({OR: [{i: {IN: list(v)}} for i, v in kwargs.items()]},
-                                               {TS_NAME: 1})
+            query = {OR: [{i: {IN: list(v)}} for i, v in kwargs.items()]}
         elif mode.upper() in AND_VALUES:
-            filtered_collection = self.db.find({AND: [{i: {IN: list(v)}} for i, v in kwargs.items()]},
-                                               {TS_NAME: 1})
+            query = {AND: [{i: {IN: list(v)}} for i, v in kwargs.items()]}
         else:
-            filtered_collection = self.db.find({}, {TS_NAME: 1})
+            query = {}
+        return query, available_dates
 
-        new_collection = TimeSeriesCollection()
-        for doc in filtered_collection:
-            new_collection.add(doc[TS_NAME])
+    def iter_read(self, ts_collection=None, query=None, batch_size=100, batches=False, start=None, end=None,
+                  last_n=None):
+        """ Read time series attributes and values in batches, as a generator.
 
-        if available_dates is not None:
-            available_date = list(map(pd.to_datetime, available_dates))
-            self.read_values(new_collection)
-            new_collection = TimeSeriesCollection([ts for ts in new_collection if
-                                                   bool(set(available_date) & set(ts.ts_values.index))])
+        Only one batch is kept in memory at a time, so the whole collection can be scanned with bounded memory.
 
-        return new_collection
+        Parameters
+        ----------
+        ts_collection: type convertible to :py:class:`TimeSeriesCollection`, optional
+            Time series to be read.
+        query: dict, optional
+            Attribute specifications of the time series to be read, as the keyword arguments of :py:meth:`select`
+            (e.g.: ``{'FIELD': 'quote', 'CURRENCY': ['USD', 'EUR']}``). Used if `ts_collection` is not given. Default
+            is all the time series selected by ``select()``.
+        batch_size: int, optional
+            Number of time series read in each round trip. Default is 100.
+        batches: bool, optional
+            Whether to yield each batch as a :py:class:`TimeSeriesCollection` instead of each
+            :py:class:`TimeSeries`. Default is False.
+        start: date-like, optional
+            Read only values at or after this date. Default is no lower bound.
+        end: date-like, optional
+            Read only values at or before this date. Default is no upper bound.
+        last_n: int, optional
+            Read only the last `last_n` values (within `start` and `end`). Default is all values.
+
+        Yields
+        ------
+        :py:class:`TimeSeries`, :py:class:`TimeSeriesCollection`
+            New time series objects. Components are not instantiated.
+        """
+        if ts_collection is not None:
+            names = iter(convert_to_ts_collection(ts_collection).ts_names())
+            available_dates = None
+        else:
+            query, available_dates = self._select_query(**(query or dict()))
+            if self.index_advisor is not None:
+                self.index_advisor.observe(query)
+            names = (document[TS_NAME] for document in self.backend.find(query, {TS_NAME: 1, ID: 0},
+                                                                           batch_size=batch_size))
+        while True:
+            names_list = list(itertools.islice(names, batch_size))
+            if not names_list:
+                return
+            batch = list()
+            for ts_name, attributes, values in self._fetch_series(names_list, start=start, end=end, last_n=last_n):
+                ts = TimeSeries(ts_name)
+                ts.update_attributes(attributes)
+                if values is not None:
+                    ts.update_values(values)
+                batch.append(ts)
+            self._touch(names_list)
+            if available_dates is not None:
+                batch = filter_available(batch, available_dates)
+            if batches:
+                yield TimeSeriesCollection(batch)
+            else:
+                yield from batch
+
+    def _changed_documents(self, since, query, names_list=None, strict=False):
+        """ Query the names and update stamps of the time series updated at or after (or, if `strict`, after) a date.
+
+        Returns
+        -------
+        list(dict)
+        """
+        self._ensure_update_indexes()
+        since = pd.Timestamp(since).to_pydatetime()
+        operator = GREATER_THAN if strict else GREATER_OR_EQUAL_THAN
+        changed = {OR: [{LAST_VALUE_UPDATE: {operator: since}}, {LAST_ATTRIBUTE_UPDATE: {operator: since}}]}
+        projection = {TS_NAME: 1, LAST_VALUE_UPDATE: 1, LAST_ATTRIBUTE_UPDATE: 1, ID: 0}
+        if names_list is None:
+            return list(self.backend.find({AND: [query, changed]}, projection))
+        return self._map_chunks(lambda chunk: list(self.backend.find({AND: [query, changed, {TS_NAME: {IN: chunk}}]},
+                                                                     projection)), names_list)
+
+    @instrument.instrumented
+    def changed_since(self, timestamp, query=None):
+        """ Get the names of the time series whose values or attributes were written at or after a date.
+
+        The query is served by the ``LAST_VALUE_UPDATE`` and ``LAST_ATTRIBUTE_UPDATE`` indexes, which are created on
+        first use.
+
+        Parameters
+        ----------
+        timestamp: date-like
+            Watermark (UTC, as the update stamps).
+        query: dict, optional
+            Attribute specifications, as the keyword arguments of :py:meth:`select` (``AVAILABLE`` is ignored).
+            Default is all the time series of the collection.
+
+        Returns
+        -------
+        list(str)
+        """
+        query = self._select_query(**query)[0] if query is not None else dict()
+        return [document[TS_NAME] for document in self._changed_documents(timestamp, query)]
+
+    @instrument.instrumented
+    def sync(self, ts_collection, since=None):
+        """ Re-read the time series of a collection that were written after a watermark.
+
+        Only the changed time series are transferred. Their values are replaced by the stored values, and their
+        attributes updated. Components are not read.
+
+        Parameters
+        ----------
+        ts_collection: :py:class:`TimeSeriesCollection`
+            Time series to be kept up to date.
+        since: date-like, optional
+            Watermark returned by the previous call. Default is None (read all the time series).
+
+        Returns
+        -------
+        list(str), datetime.datetime
+            Names of the time series read, and the watermark for the next call: the most recent update stamp seen
+            (or `since` if nothing changed).
+
+        Note
+        ----
+        Update stamps are set by the clocks of the writing processes, with millisecond precision. A write stamped with
+        the same millisecond as the watermark, but not yet visible when the watermark was taken, is not seen.
+        """
+        ts_collection = convert_to_ts_collection(ts_collection)
+        names_list = ts_collection.ts_names()
+        if since is None:
+            documents = self._map_chunks(lambda chunk: list(self.backend.find({TS_NAME: {IN: chunk}},
+                                                                              {TS_NAME: 1, LAST_VALUE_UPDATE: 1,
+                                                                               LAST_ATTRIBUTE_UPDATE: 1, ID: 0})),
+                                         names_list)
+        else:
+            documents = self._changed_documents(since, dict(), names_list, strict=True)
+        stamps = [document.get(key) for document in documents for key in (LAST_VALUE_UPDATE, LAST_ATTRIBUTE_UPDATE)]
+        stamps = [stamp for stamp in stamps if stamp is not None]
+        watermark = max(stamps) if stamps else since
+        changed = TimeSeriesCollection()
+        for document in documents:
+            ts = ts_collection.get(document[TS_NAME])
+            if isinstance(ts, TimeSeries):
+                ts.ts_values = pd.Series(index=pd.DatetimeIndex([]), dtype=float)
+                changed.add(ts)
+        if len(changed):
+            self.read(changed, depth=1)
+        return changed.ts_names(), watermark
+
+    def watch(self, ts_collection=None, query=None, callback=None, queue=None, loop=None, interval=1.0,
+              change_stream=True):
+        """ Watch time series and push their changes to a callback or an asyncio queue.
+
+        Each tick, only the time series written since the previous tick are read, and only their new values (see
+        :py:class:`Watcher`). Changes are taken from a MongoDB change stream if the server supports them, otherwise
+        from one query per tick on the indexed update stamps (as :py:meth:`changed_since`).
+
+        Parameters
+        ----------
+        ts_collection: type convertible to :py:class:`TimeSeriesCollection`, optional
+            Time series (or names) to be watched. Default is the time series matching `query`.
+        query: dict, optional
+            Attribute specifications, as the keyword arguments of :py:meth:`select` (``AVAILABLE`` is ignored), used
+            if `ts_collection` is None. Default is all the time series of the collection.
+        callback: callable, optional
+            Called, on the watcher thread, with the :py:class:`TimeSeriesCollection` of the changed time series.
+        queue: asyncio.Queue, optional
+            Queue receiving the :py:class:`TimeSeriesCollection` of the changed time series.
+        loop: asyncio.AbstractEventLoop, optional
+            Event loop of `queue`. Default is the running event loop.
+        interval: float, optional
+            Seconds between ticks. Default is 1.
+        change_stream: bool, optional
+            Whether to try a change stream before polling. Default is True.
+
+        Returns
+        -------
+        :py:class:`Watcher`
+            The started watcher. Call :py:meth:`Watcher.stop` (or use it in a ``with`` block) to stop watching.
+        """
+        names_list = None if ts_collection is None else convert_to_ts_collection(ts_collection).ts_names()
+        query = self._select_query(**query)[0] if query is not None else dict()
+        watcher = Watcher(self, names_list=names_list, query=query, interval=interval, change_stream=change_stream)
+        if callback is not None:
+            watcher.add_callback(callback)
+        if queue is not None:
+            watcher.add_queue(queue, loop if loop is not None else asyncio.get_running_loop())
+        return watcher.start()
+
+    def export_snapshot(self, path, query=None):
+        """ Export time series documents (and their value buckets) to a snapshot file.
+
+        Documents are streamed as raw BSON, as stored in the database, without conversion to :py:class:`TimeSeries`.
+        See :py:mod:`tsio.io.snapshot` for the file format.
+
+        Parameters
+        ----------
+        path: str
+            Path of the snapshot file. If it ends with '.gz', the file is gzip compressed.
+        query: dict, optional
+            Attribute specifications of the time series to be exported, as the keyword arguments of
+            :py:meth:`select` (``AVAILABLE`` is ignored). Default is all the documents of the collection.
+
+        Returns
+        -------
+        dict
+            Number of exported documents of each collection (``{'documents': int, 'buckets': int}``).
+
+        Note
+        ----
+        Documents are read by a cursor, not from a point-in-time view: writes made during the export may or may not
+        be in the snapshot.
+        """
+        if query is None:
+            query = dict()
+        else:
+            query, _ = self._select_query(**query)
+        return self.backend.export_snapshot(path, query)
+
+    def import_snapshot(self, path):
+        """ Import a snapshot file written by :py:meth:`export_snapshot`.
+
+        Documents are inserted as raw BSON, with unordered bulk inserts limited by ``max_batch_size`` and
+        ``max_batch_bytes`` (and run on ``write_workers`` threads). A unique ``TS_NAME`` index is created first, so
+        time series already in the collection are not replaced: their documents fail with duplicate key errors (see
+        ``raise_on_write_error``) and their buckets are not imported. The cache and the local store of this instance
+        are cleared.
+
+        Parameters
+        ----------
+        path: str
+            Path of the snapshot file.
+
+        Returns
+        -------
+        dict, None
+            The aggregated bulk API result.
+        """
+        result = self.backend.import_snapshot(path)
+        self._attribute_catalog = None
+        if self.cache is not None:
+            self.cache.clear()
+        if self.local_store is not None:
+            self.local_store.clear()
+        return result
 
     def search(self, **kwargs):
         """ This method is not yet implemented.
@@ -632,5 +1926,600 @@ class DBIO:
         """
         report = dict()
         for attribute in attributes:
-            report[attribute] = self.db.create_index(attribute)
+            report[attribute] = self.backend.ensure_index(attribute)
         return report
+
+
+class MongoBackend(Backend):
+    """ Storage in MongoDB: the collection of a :py:class:`DBIO` instance and its buckets collection, written with
+    the storage options of the instance (``bucket_period``, ``value_codec``, batching and workers).
+
+    This is the default backend of :py:class:`DBIO`.
+
+    Parameters
+    ----------
+    dbio: :py:class:`DBIO`
+    """
+    def __init__(self, dbio):
+        self.dbio = dbio
+        self._name_index_ensured = False
+        self._bucket_index_ensured = False
+        self._components_view = None
+
+    @property
+    def db(self):
+        """ pymongo.collection.Collection: The MongoDB collection of the time series.
+        """
+        return self.dbio.db
+
+    @property
+    def buckets(self):
+        """ pymongo.collection.Collection: The MongoDB collection of the value buckets.
+        """
+        return self.dbio.buckets
+
+    def find(self, query, projection=None, batch_size=None):
+        if batch_size is None:
+            return self.db.find(query, projection)
+        return self.db.find(query, projection, batch_size=batch_size)
+
+    def update(self, query, fields):
+        self.db.update_many(query, {SET: fields})
+
+    def distinct(self, key, query=None):
+        return self.db.distinct(key, query)
+
+    def delete(self, names_list):
+        self.buckets.delete_many({TS_NAME: {IN: names_list}})
+        return self.db.remove({TS_NAME: {IN: names_list}})
+
+    def ensure_index(self, keys, unique=False):
+        return self.db.create_index(keys, unique=unique)
+
+    def explain(self, query):
+        return self.db.find(query, {TS_NAME: 1}).explain()
+
+    def attribute_names(self, names_list=None):
+        """ Collect the attribute names with an aggregation in the database. Values are not transferred.
+        """
+        pipeline = list()
+        if names_list:
+            pipeline.append({MATCH: {TS_NAME: {IN: names_list}}})
+        pipeline += [{PROJECT: {TS_VALUES: 0}},
+                     {PROJECT: {'_key': {MAP: {'input': {OBJECT_TO_ARRAY: '$$ROOT'}, 'in': '$$this.k'}}}},
+                     {UNWIND: '$_key'},
+                     {GROUP: {ID: '$_key'}}]
+        return [document[ID] for document in self.db.aggregate(pipeline)]
+
+    def rebuild_component_names(self):
+        """ Fill the ``COMPONENT_NAMES`` lists with a single update. Requires MongoDB 4.2 or higher.
+        """
+        result = self.db.update_many({COMPONENTS: {EXISTS: True}},
+                                     [{SET: {COMPONENT_NAMES: {MAP: {'input': {OBJECT_TO_ARRAY: '$' + COMPONENTS},
+                                                                     'in': '$$this.v'}}}}])
+        return result.modified_count
+
+    def export_snapshot(self, path, query):
+        """ Stream the documents (and value buckets) matching a query to a snapshot file, as raw BSON.
+        """
+        counts = {DOCUMENTS: 0, BUCKETS: 0}
+        with open_snapshot(path, 'wb') as snapshot_file:
+            write_header(snapshot_file)
+            cursor = self.db.with_options(codec_options=RAW_BSON).find(query, batch_size=self.dbio.max_batch_size)
+            for block in iter(lambda: list(itertools.islice(cursor, self.dbio.max_batch_size)), []):
+                write_block(snapshot_file, DOCUMENTS, block)
+                counts[DOCUMENTS] += len(block)
+            bucketed = [document[TS_NAME] for document in self.db.find({AND: [query, {BUCKET_PERIOD: {EXISTS: True}}]},
+                                                                       {TS_NAME: 1})]
+            buckets = self.buckets.with_options(codec_options=RAW_BSON)
+            for names_chunk in chunks(bucketed, self.dbio.read_chunk_size):
+                if not names_chunk:
+                    continue
+                cursor = buckets.find({TS_NAME: {IN: names_chunk}}, batch_size=self.dbio.max_batch_size)
+                for block in iter(lambda: list(itertools.islice(cursor, self.dbio.max_batch_size)), []):
+                    write_block(snapshot_file, BUCKETS, block)
+                    counts[BUCKETS] += len(block)
+        return counts
+
+    def import_snapshot(self, path):
+        """ Insert the documents of a snapshot file as raw BSON, with unordered bulk inserts.
+        """
+        results = list()
+        rejected = set()
+        with open_snapshot(path, 'rb') as snapshot_file:
+            # The blocks of documents come before the blocks of buckets.
+            for collection, block in read_blocks(snapshot_file):
+                if collection == BUCKETS:
+                    self._ensure_bucket_index()
+                    target = self.buckets
+                    # The values of time series whose document was rejected (e.g.: already in the collection) are not
+                    # merged into the stored values.
+                    block = [document for document in block if document[TS_NAME] not in rejected]
+                else:
+                    self._ensure_name_index()
+                    target = self.db
+                # Only the names are decoded from the raw documents.
+                requests = [WriteRequest(document[TS_NAME], pymongo.InsertOne(document), len(document.raw))
+                            for document in block]
+                result = self._bulk_write(target, requests)
+                if collection == DOCUMENTS and result:
+                    rejected.update(error[TS_NAME] for error in result['writeErrors'])
+                results.append(result)
+        return DBIO._combine_results(*results)
+
+    def _ensure_name_index(self):
+        """ Create the unique ``TS_NAME`` index of the collection, once per instance.
+        """
+        if not self._name_index_ensured:
+            self.ensure_index([(TS_NAME, pymongo.ASCENDING)], unique=True)
+            self._name_index_ensured = True
+
+    def _ensure_bucket_index(self):
+        """ Create the (TS_NAME, BUCKET_START) unique index of the buckets collection, once per instance.
+        """
+        if not self._bucket_index_ensured:
+            self.buckets.create_index([(TS_NAME, pymongo.ASCENDING), (BUCKET_START, pymongo.ASCENDING)], unique=True)
+            self._bucket_index_ensured = True
+
+    def _attach_bucket_values(self, documents, start=None, end=None, last_n=None):
+        """ Fill inplace the values of bucketed documents with the values stored in their buckets.
+
+        Parameters
+        ----------
+        documents: list(dict)
+            Documents read from the main collection. The ``BUCKET_PERIOD`` marker is removed from them.
+        start: date-like, optional
+            Read only values at or after this date.
+        end: date-like, optional
+            Read only values at or before this date.
+        last_n: int, optional
+            Read only the last `last_n` values.
+        """
+        bucketed = dict()
+        for document in documents:
+            if document.pop(BUCKET_PERIOD, None) is not None:
+                # The values of each bucket are kept apart, they are decoded and joined by decode_ts_values.
+                document[TS_VALUES] = list()
+                bucketed[document[TS_NAME]] = document
+        if not bucketed:
+            return
+        query = {TS_NAME: {IN: list(bucketed)}}
+        if start is not None:
+            query[BUCKET_END] = {GREATER_OR_EQUAL_THAN: pd.Timestamp(start).to_pydatetime()}
+        if end is not None:
+            query[BUCKET_START] = {LESSER_OR_EQUAL_THAN: pd.Timestamp(end).to_pydatetime()}
+        if start is None and end is None and last_n is None:
+            buckets = self.buckets.find(query, {TS_NAME: 1, TS_VALUES: 1})
+        else:
+            pipeline = [{MATCH: query},
+                        {PROJECT: {TS_NAME: 1, BUCKET_START: 1, BUCKET_END: 1,
+                                   TS_VALUES: values_filter_expression(start, end)}}]
+            if last_n is not None:
+                # Keep, for each time series, only the most recent buckets needed to hold `last_n` values.
+                pipeline += [{SET_WINDOW_FIELDS: {'partitionBy': '$' + TS_NAME,
+                                                  'sortBy': {BUCKET_START: -1},
+                                                  'output': {'_preceding': {SUM: bucket_count_expression(start, end),
+                                                                            'window': {'documents': ['unbounded',
+                                                                                                     -1]}}}}},
+                             {MATCH: {EXPR: {LESSER_THAN: [{IF_NULL: ['$_preceding', 0]}, last_n]}}}]
+            buckets = self.buckets.aggregate(pipeline)
+        for bucket in buckets:
+            bucketed[bucket[TS_NAME]][TS_VALUES].append(bucket[TS_VALUES])
+
+    def _find_with_values(self, names_list, projection=None, start=None, end=None, last_n=None):
+        """ Query documents by name, with their values filtered by date on the server.
+
+        Parameters
+        ----------
+        names_list: list(str)
+            Names of the time series to be read.
+        projection: dict, optional
+            Fields to be returned, in addition to the values. Default is all fields.
+        start: date-like, optional
+            Read only values at or after this date.
+        end: date-like, optional
+            Read only values at or before this date.
+        last_n: int, optional
+            Read only the last `last_n` values.
+
+        Returns
+        -------
+        list(dict)
+            Documents with the (filtered) values in the ``TS_VALUES`` field.
+        """
+        if start is None and end is None and last_n is None:
+            if projection:
+                projection = dict(projection, **{TS_VALUES: 1, BUCKET_PERIOD: 1})
+            documents = list(self.db.find({TS_NAME: {IN: names_list}}, projection))
+        else:
+            values = values_filter_expression(start, end, last_n)
+            if projection:
+                stage = {PROJECT: dict(projection, **{TS_VALUES: values, BUCKET_PERIOD: 1})}
+            else:
+                stage = {ADD_FIELDS: {TS_VALUES: values}}
+            documents = list(self.db.aggregate([{MATCH: {TS_NAME: {IN: names_list}}}, stage]))
+        self._attach_bucket_values(documents, start, end, last_n)
+        return documents
+
+    def read(self, names_list, projection=None, start=None, end=None, last_n=None):
+        """ Query and decode a chunk of time series. See :py:meth:`DBIO._fetch_series`.
+        """
+        records = list()
+        with instrument.phase(instrument.QUERY):
+            for document in self._find_with_values(names_list, projection, start, end, last_n):
+                ts_name = document.pop(TS_NAME)
+                document.pop(ID, None)
+                document.pop(COMPONENT_NAMES, None)
+                with instrument.phase(instrument.DECODE):
+                    if TS_VALUES in document:
+                        values = filter_ts_values(decode_ts_values(document.pop(TS_VALUES)), start, end, last_n)
+                    else:
+                        values = None
+                records.append((ts_name, document, values))
+        return records
+
+    def _stored_layouts(self, names_list):
+        """ Read how the values of time series are stored. Plain values are not transferred.
+
+        Returns
+        -------
+        dict
+            ``{ts_name: (bucket_period, values)}`` for the stored time series, where ``values`` is evaluated by
+            :py:func:`stored_layout_expression`.
+        """
+        if not names_list:
+            return dict()
+        documents = self.db.aggregate([{MATCH: {TS_NAME: {IN: names_list}}},
+                                       {PROJECT: {TS_NAME: 1, BUCKET_PERIOD: 1,
+                                                  TS_VALUES: stored_layout_expression()}}])
+        return {document[TS_NAME]: (document.get(BUCKET_PERIOD), document.get(TS_VALUES)) for document in documents}
+
+    def _ensure_components_view(self):
+        """ Create the view of the collection with only ``TS_NAME`` and ``COMPONENT_NAMES``, once per instance.
+
+        Returns
+        -------
+        str
+            Name of the view, or of the collection itself if the view can't be created.
+        """
+        if self._components_view is None:
+            view_name = self.dbio.collection_name + COMPONENTS_VIEW_SUFFIX
+            try:
+                self.dbio.client[self.dbio.db_name].create_collection(
+                    view_name, viewOn=self.dbio.collection_name, pipeline=[{PROJECT: {TS_NAME: 1, COMPONENT_NAMES: 1}}])
+            except CollectionInvalid:
+                pass  # Already created.
+            except (PyMongoError, NotImplementedError) as exception:
+                if not isinstance(exception, OperationFailure) or exception.code != 48:  # 48: NamespaceExists.
+                    warnings.warn("Could not create the view '{}', component trees are resolved on the collection: "
+                                  "{}".format(view_name, exception))
+                    view_name = self.dbio.collection_name
+            self._components_view = view_name
+        return self._components_view
+
+    def component_closure(self, names_list, depth, projection):
+        """ Query time series and their components, recursively up to `depth`.
+
+        The names in the component tree are resolved with a single ``$graphLookup`` aggregation (per chunk of names)
+        on the view of the collection without values, and the documents are then queried by name.
+
+        Parameters
+        ----------
+        names_list: list(str)
+            Names of the time series at the root of the component tree.
+        depth: int
+            Depth of the component tree. ``depth = 2`` means only the direct components.
+        projection: dict
+            Fields to be returned (or excluded) for each time series.
+
+        Returns
+        -------
+        dict, None
+            ``{ts_name: document}`` for the time series and all their components found, or None if the aggregation
+            failed (e.g.: on the memory limit of ``$graphLookup``), to resolve the components level by level.
+        """
+        graph_lookup = {'from': self._ensure_components_view(),
+                        'startWith': '$' + COMPONENT_NAMES,
+                        'connectFromField': COMPONENT_NAMES,
+                        'connectToField': TS_NAME,
+                        'as': '_closure'}
+        if depth != np.inf:
+            graph_lookup['maxDepth'] = int(depth) - 2
+        closure = set()
+        try:
+            for names_chunk in chunks(names_list, self.dbio.read_chunk_size):
+                pipeline = [{MATCH: {TS_NAME: {IN: names_chunk}}},
+                            {GRAPH_LOOKUP: graph_lookup},
+                            {PROJECT: {TS_NAME: 1, '_closure.' + TS_NAME: 1}}]
+                with instrument.phase(instrument.QUERY):
+                    for root in self.db.aggregate(pipeline):
+                        closure.add(root[TS_NAME])
+                        closure.update(document[TS_NAME] for document in root.get('_closure', []))
+        except OperationFailure as exception:
+            warnings.warn('Component tree query failed, components are resolved level by level: {}'.format(exception))
+            return None
+        if projection == {TS_NAME: 1}:
+            return {ts_name: {TS_NAME: ts_name} for ts_name in closure}
+        if any(projection.values()):
+            projection = dict(projection, **{TS_NAME: 1})
+        with instrument.phase(instrument.QUERY):
+            documents = self.dbio._map_chunks(lambda chunk: list(self.db.find({TS_NAME: {IN: chunk}}, projection)),
+                                              sorted(closure))
+        return {document[TS_NAME]: document for document in documents}
+
+    def write(self, documents, ts_collection=None, mode='replace'):
+        """ Write documents and values, with the storage options of the :py:class:`DBIO` instance.
+
+        See :py:meth:`tsio.io.backend.Backend.write`.
+        """
+        values_updates, bucket_requests = dict(), list()
+        if ts_collection is not None:
+            with instrument.phase(instrument.ENCODE):
+                values_updates, bucket_requests = self._values_updates(ts_collection, mode)
+        bucket_result = self._bulk_write(self.buckets, bucket_requests)
+        requests = list()
+        with instrument.phase(instrument.ENCODE):
+            for ts_name in dict.fromkeys(list(values_updates) + list(documents)):
+                update = values_updates.get(ts_name, dict())
+                if ts_name in documents:
+                    update[SET] = dict(documents[ts_name], **update.get(SET, dict()))
+                if update:
+                    requests.append(write_request(ts_name, pymongo.UpdateOne, {TS_NAME: ts_name}, update,
+                                                  upsert=True))
+        return DBIO._combine_results(bucket_result, self._bulk_write(self.db, requests))
+
+    def _values_updates(self, ts_collection, mode='replace'):
+        """ Build the updates that write time series values, in the storage layout of the :py:class:`DBIO` instance.
+
+        Parameters
+        ----------
+        ts_collection: :py:class:`TimeSeriesCollection`
+            Time series whose values are to be written.
+        mode: {'replace', 'merge'}, optional
+            See :py:meth:`DBIO.write_values`.
+
+        Returns
+        -------
+        dict, list
+            ``{ts_name: update}`` for the main documents, and the write requests for the buckets collection.
+        """
+        if mode not in ('replace', 'merge'):
+            raise ValueError("Unknown write mode: '{}'. Use 'replace' or 'merge'.".format(mode))
+        if mode == 'merge':
+            return self._merge_updates(ts_collection)
+        updates = dict()
+        bucket_requests = list()
+        if self.dbio.bucket_period:
+            self._ensure_bucket_index()
+            bucket_requests = self._replace_buckets_requests(ts_collection)
+            for ts in ts_collection:
+                # Values are in the buckets, the main document only keeps the attributes.
+                updates[ts.ts_name] = {SET: {BUCKET_PERIOD: self.dbio.bucket_period}, UNSET: {TS_VALUES: ''}}
+        else:
+            for ts in ts_collection:
+                updates[ts.ts_name] = {SET: {TS_VALUES: ts_values_to_dict(ts, self.dbio.value_codec)},
+                                       UNSET: {BUCKET_PERIOD: ''}}
+        return updates, bucket_requests
+
+    def _merge_updates(self, ts_collection):
+        """ Build the updates that merge time series values into their stored values, in their stored layout.
+
+        Time series not stored yet (or stored without values) are written in the layout of the :py:class:`DBIO`
+        instance.
+
+        Returns
+        -------
+        dict, list
+            See :py:meth:`_values_updates`.
+        """
+        updates = {ts.ts_name: dict() for ts in ts_collection}
+        ts_list = [ts for ts in ts_collection if not ts.ts_values.empty]
+        layouts = self._stored_layouts([ts.ts_name for ts in ts_list])
+        bucketed = dict()
+        for ts in ts_list:
+            bucket_period, values = layouts.get(ts.ts_name, (None, None))
+            if bucket_period is None and values is None:
+                bucket_period = self.dbio.bucket_period
+            if bucket_period:
+                bucketed.setdefault(bucket_period, list()).append(ts)
+                updates[ts.ts_name] = {SET: {BUCKET_PERIOD: bucket_period}}
+            elif is_encoded(values):
+                merged = merge_ts_values(decode_values(values), ts.ts_values)
+                updates[ts.ts_name] = {SET: {TS_VALUES: values_to_dict(merged, values[CODEC])}}
+            elif values is None and self.dbio.value_codec:
+                updates[ts.ts_name] = {SET: {TS_VALUES: ts_values_to_dict(ts, self.dbio.value_codec)}}
+            else:
+                updates[ts.ts_name] = {SET: {TS_VALUES + '.' + key: value
+                                             for key, value in ts_values_to_dict(ts).items()}}
+        bucket_requests = list()
+        for bucket_period, bucketed_list in bucketed.items():
+            self._ensure_bucket_index()
+            bucket_requests += self._merge_buckets_requests(bucketed_list, bucket_period)
+        return updates, bucket_requests
+
+    def _replace_buckets_requests(self, ts_collection):
+        """ Build the write requests that replace the value buckets of time series.
+
+        Buckets of periods that are no longer in ``ts_values`` are deleted.
+        """
+        requests = list()
+        for ts in ts_collection:
+            bucket_starts = list()
+            for bucket in ts_values_to_buckets(ts, self.dbio.bucket_period, self.dbio.value_codec):
+                bucket_starts.append(bucket[BUCKET_START])
+                requests.append(write_request(ts.ts_name, pymongo.ReplaceOne,
+                                              {TS_NAME: ts.ts_name, BUCKET_START: bucket[BUCKET_START]}, bucket,
+                                              upsert=True))
+            requests.append(write_request(ts.ts_name, pymongo.DeleteMany,
+                                          {TS_NAME: ts.ts_name, BUCKET_START: {NIN: bucket_starts}}))
+        return requests
+
+    def _merge_buckets_requests(self, ts_list, bucket_period):
+        """ Build the write requests that merge values into the value buckets of time series.
+
+        Only the buckets of periods present in ``ts_values`` are touched. Each bucket keeps its stored layout: plain
+        buckets are updated in place, encoded buckets are read and rewritten with their codec, and new buckets are
+        written with the ``value_codec`` of this instance.
+
+        Parameters
+        ----------
+        ts_list: list(:py:class:`TimeSeries`)
+        bucket_period: str
+            Bucket period the time series are stored with.
+        """
+        requests = list()
+        new_buckets = [(ts.ts_name, bucket_start, bucket_values) for ts in ts_list
+                       for bucket_start, bucket_values in group_by_bucket(ts.ts_values, bucket_period)]
+        if not new_buckets:
+            return requests
+        stored_buckets = self.buckets.aggregate([
+            {MATCH: {TS_NAME: {IN: list({ts_name for ts_name, _, _ in new_buckets})},
+                     BUCKET_START: {IN: list({start for _, start, _ in new_buckets})}}},
+            {PROJECT: {TS_NAME: 1, BUCKET_START: 1, TS_VALUES: stored_layout_expression()}}])
+        stored_values = {(bucket[TS_NAME], bucket[BUCKET_START]): bucket.get(TS_VALUES) for bucket in stored_buckets}
+        for ts_name, bucket_start, bucket_values in new_buckets:
+            stored = stored_values.get((ts_name, bucket_start))
+            if is_encoded(stored) or (stored is None and self.dbio.value_codec):
+                merged = merge_ts_values(decode_values(stored) if stored is not None else None, bucket_values)
+                codec = stored[CODEC] if stored is not None else self.dbio.value_codec
+                if merged.empty:
+                    requests.append(write_request(ts_name, pymongo.DeleteOne,
+                                                  {TS_NAME: ts_name, BUCKET_START: bucket_start}))
+                else:
+                    requests.append(write_request(ts_name, pymongo.ReplaceOne,
+                                                  {TS_NAME: ts_name, BUCKET_START: bucket_start},
+                                                  bucket_to_dict(ts_name, bucket_start, merged, codec), upsert=True))
+            else:
+                bucket = bucket_to_dict(ts_name, bucket_start, bucket_values)
+                new_values = {TS_VALUES + '.' + key: value for key, value in bucket[TS_VALUES].items()}
+                requests.append(write_request(ts_name, pymongo.UpdateOne,
+                                              {TS_NAME: ts_name, BUCKET_START: bucket_start},
+                                              {SET: new_values, MAX: {BUCKET_END: bucket[BUCKET_END]}}, upsert=True))
+        return requests
+
+    def _bulk_write(self, collection, requests):
+        """ Execute write requests as unordered bulk writes, in batches limited by count and estimated size.
+
+        Parameters
+        ----------
+        collection: pymongo.collection.Collection
+        requests: list(:py:class:`WriteRequest`)
+
+        Returns
+        -------
+        dict, None
+            The aggregated bulk API result, or None if there were no requests. Each entry in ``writeErrors`` has the
+            name of the time series in its ``TS_NAME`` key.
+        """
+        if not requests:
+            return None
+        batches = make_batches(requests, self.dbio.max_batch_size, self.dbio.max_batch_bytes)
+        offsets = np.cumsum([0] + [len(batch) for batch in batches[:-1]]).tolist()
+        with instrument.phase(instrument.QUERY):
+            if self.dbio.write_workers and self.dbio.write_workers > 1 and len(batches) > 1:
+                with ThreadPoolExecutor(max_workers=self.dbio.write_workers) as executor:
+                    results = list(executor.map(instrument.propagate(lambda args: self._write_batch(collection, *args)),
+                                                zip(batches, offsets)))
+            else:
+                results = [self._write_batch(collection, batch, offset) for batch, offset in zip(batches, offsets)]
+        return self._check_result(merge_bulk_results(results))
+
+    @staticmethod
+    def _write_batch(collection, batch, offset):
+        """ Execute a batch of write requests as an unordered bulk write.
+
+        Returns
+        -------
+        dict
+            Bulk API result, with indexes relative to the full list of requests.
+        """
+        try:
+            result = collection.bulk_write([request.operation for request in batch], ordered=False).bulk_api_result
+        except BulkWriteError as bwe:
+            result = bwe.details
+        for entry in result.get('upserted', []) + result.get('writeErrors', []):
+            entry[TS_NAME] = batch[entry['index']].ts_name
+            entry['index'] += offset
+        return result
+
+    def _check_result(self, result):
+        """ Warn about (and optionally raise) write errors in an aggregated bulk API result.
+        """
+        if result and (result['writeErrors'] or result['writeConcernErrors']):
+            warnings.warn(str(result['writeErrors'] or result['writeConcernErrors']))
+            if self.dbio.raise_on_write_error:
+                raise BulkWriteError(result)
+        return result
+
+    def attribute_values(self, attributes=None, excluded=None):
+        """ Collect the distinct values of attributes with a single aggregation.
+
+        Values of list-like attributes are collected element by element, as by ``distinct``.
+
+        Parameters
+        ----------
+        attributes: list(str), optional
+            Attribute names whose values are to be collected. Default is all attributes not in `excluded`.
+        excluded: list(str), optional
+            Attribute names whose values are not to be collected.
+
+        Returns
+        -------
+        list(tuple)
+            ``(attribute_name, value)`` pairs, unique by pair.
+        """
+        if attributes is not None:
+            condition = {IN: ['$$this.k', list(attributes)]}
+        else:
+            condition = {NOT: {IN: ['$$this.k', list(excluded or [])]}}
+        pipeline = [{PROJECT: {TS_VALUES: 0}},
+                    {PROJECT: {'_attribute': {FILTER: {'input': {OBJECT_TO_ARRAY: '$$ROOT'}, 'cond': condition}}}},
+                    {UNWIND: '$_attribute'},
+                    {UNWIND: {'path': '$_attribute.v', 'preserveNullAndEmptyArrays': True}},
+                    {GROUP: {ID: {'k': '$_attribute.k', 'v': '$_attribute.v'}}}]
+        # Empty list-like values have no elements, and are left without 'v' by the second $unwind.
+        return [(doc[ID]['k'], doc[ID]['v']) for doc in self.db.aggregate(pipeline) if 'v' in doc[ID]]
+
+    def select_available(self, query, dates):
+        """ Get the names of time series matching a query that have values at any of a set of dates.
+
+        The dates are checked in the database, without reading values, except for values stored with a value codec,
+        which are read (only the buckets covering the dates, if bucketed) and checked after decoding.
+
+        Parameters
+        ----------
+        query: dict
+            MongoDB query of the time series.
+        dates: list(pandas.Timestamp)
+
+        Returns
+        -------
+        list(str)
+        """
+        has_dates = {OR: [{TS_VALUES + '.' + str(to_milliseconds(date)): {NOT_EQUAL_TO: None}} for date in dates]}
+        names_list = list()
+        bucketed = list()
+        encoded = list()
+        for document in self.db.find(query, {TS_NAME: 1, BUCKET_PERIOD: 1, TS_VALUES + '.' + CODEC: 1}):
+            names_list.append(document[TS_NAME])
+            if document.get(BUCKET_PERIOD) is not None:
+                bucketed.append(document[TS_NAME])
+            elif is_encoded(document.get(TS_VALUES)):
+                encoded.append(document[TS_NAME])
+
+        available = {document[TS_NAME] for document in self.db.find({AND: [query, has_dates]}, {TS_NAME: 1})}
+        if bucketed:
+            covering = {OR: [{BUCKET_START: {LESSER_OR_EQUAL_THAN: date.to_pydatetime()},
+                              BUCKET_END: {GREATER_OR_EQUAL_THAN: date.to_pydatetime()}} for date in dates]}
+            for names_chunk in chunks(bucketed, self.dbio.read_chunk_size):
+                available.update(self.buckets.distinct(TS_NAME, {AND: [{TS_NAME: {IN: names_chunk}}, has_dates]}))
+                encoded_buckets = {AND: [{TS_NAME: {IN: names_chunk}, TS_VALUES + '.' + CODEC: {EXISTS: True}},
+                                         covering]}
+                for bucket in self.buckets.find(encoded_buckets, {TS_NAME: 1, TS_VALUES: 1}):
+                    if has_values_at(decode_ts_values(bucket[TS_VALUES]), dates):
+                        available.add(bucket[TS_NAME])
+        if encoded:
+            for ts_name, _, values in self.dbio._fetch_series(encoded, {TS_NAME: 1}, min(dates), max(dates)):
+                if values is not None and has_values_at(values, dates):
+                    available.add(ts_name)
+        return [ts_name for ts_name in names_list if ts_name in available]
@@ -20,6 +20,7 @@ GenIO class - Generalized reading class for TimeSeries.
 import numpy as np
 from tsio.timeseriescollection import TimeSeriesCollection
 from tsio.io.db import DBIO, convert_to_ts_collection, instantiate_components
+from tsio.io import instrument
 
 
 def generate_source_map(ts, external_interfaces):
@@ -111,16 +112,19 @@ class GenIO(DBIO):
         MongoDB collection.
     external_interfaces: list(obj)
         Instances of external reading classes.
+    kwargs: dict
+        Additional parameters to be passed to :py:class:`DBIO` (e.g.: ``bucket_period``).
 
     """
-    def __init__(self, host_address, db_name, collection_name, external_interfaces=None):
-        super().__init__(host_address=host_address, db_name=db_name, collection_name=collection_name)
+    def __init__(self, host_address, db_name, collection_name, external_interfaces=None, **kwargs):
+        super().__init__(host_address=host_address, db_name=db_name, collection_name=collection_name, **kwargs)
         if not external_interfaces:
             self.external_interfaces = []
         else:
             self.external_interfaces = external_interfaces
         self.interfaces_map = {i: interface for i, interface in enumerate(self.external_interfaces)}
 
+    @instrument.instrumented
     def read_attributes(self, ts_collection, components=True, depth=np.inf, attributes=None, use_external=True,
                         **kwargs):
         """ Read time series attributes from the database.
@@ -144,10 +148,13 @@ class GenIO(DBIO):
             flat_collection = flatten(ts)
             source_map = generate_source_map(flat_collection, self.external_interfaces)
             for interface_code, ts_collection in source_map.items():
-                self.interfaces_map[interface_code].read_attributes(ts_collection=ts_collection, attributes=attributes,
-                                                                    **kwargs)
+                with instrument.phase(instrument.EXTERNAL):
+                    self.interfaces_map[interface_code].read_attributes(ts_collection=ts_collection,
+                                                                        attributes=attributes, **kwargs)
 
-    def read_values(self, ts_collection, components=True, depth=np.inf, use_external=True, **kwargs):
+    @instrument.instrumented
+    def read_values(self, ts_collection, components=True, depth=np.inf, use_external=True, start=None, end=None,
+                    last_n=None, **kwargs):
         """ Read time series values from the database.
 
         Parameters
@@ -160,18 +167,27 @@ class GenIO(DBIO):
             Depth of component instantiation. ``depth = 1`` means no components are instantiated. Default is infinity.
         use_external: bool, optional
             Whether to use the external reading classes. Default is True.
+        start: date-like, optional
+            Read from the database only values at or after this date. Default is no lower bound.
+        end: date-like, optional
+            Read from the database only values at or before this date. Default is no upper bound.
+        last_n: int, optional
+            Read from the database only the last `last_n` values. Default is all values.
         kwargs: dict
             Additional parameters to be passed to the external reading classes methods.
         """
         ts = convert_to_ts_collection(ts_collection)
-        super().read(ts_collection=ts, components=components, depth=depth)
+        super().read(ts_collection=ts, components=components, depth=depth, start=start, end=end, last_n=last_n)
         if use_external:
             flat_collection = flatten(ts)
             source_map = generate_source_map(flat_collection, self.external_interfaces)
             for interface_code, ts_collection in source_map.items():
-                self.interfaces_map[interface_code].read_values(ts_collection=ts_collection, **kwargs)
+                with instrument.phase(instrument.EXTERNAL):
+                    self.interfaces_map[interface_code].read_values(ts_collection=ts_collection, **kwargs)
 
-    def read(self, ts_collection, components=True, depth=np.inf, use_external=True, **kwargs):
+    @instrument.instrumented
+    def read(self, ts_collection, components=True, depth=np.inf, use_external=True, start=None, end=None,
+             last_n=None, **kwargs):
         """ Read time series attributes and values from the database.
 
         Parameters
@@ -184,13 +200,20 @@ class GenIO(DBIO):
             Depth of component instantiation. ``depth = 1`` means no components are instantiated. Default is infinity.
         use_external: bool, optional
             Whether to use the external reading classes. Default is True.
+        start: date-like, optional
+            Read from the database only values at or after this date. Default is no lower bound.
+        end: date-like, optional
+            Read from the database only values at or before this date. Default is no upper bound.
+        last_n: int, optional
+            Read from the database only the last `last_n` values. Default is all values.
         kwargs: dict
             Additional parameters to be passed to the external reading classes methods.
         """
         ts = convert_to_ts_collection(ts_collection)
-        super().read(ts_collection=ts, components=components, depth=depth)
+        super().read(ts_collection=ts, components=components, depth=depth, start=start, end=end, last_n=last_n)
         if use_external:
             flat_collection = flatten(ts)
             source_map = generate_source_map(flat_collection, self.external_interfaces)
             for interface_code, ts_collection in source_map.items():
-                self.interfaces_map[interface_code].read(ts_collection=ts_collection, **kwargs)
+                with instrument.phase(instrument.EXTERNAL):
+                    self.interfaces_map[interface_code].read(ts_collection=ts_collection, **kwargs)
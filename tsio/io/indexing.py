@@ -0,0 +1,211 @@
+# Copyright (C) 2016-2018 Lanx Capital Investimentos LTDA.
+#
+# This file is part of Time Series I/O (tsio).
+#
+# Time Series I/O (tsio) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# Time Series I/O (tsio) is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Time Series I/O (tsio). If not, see <https://www.gnu.org/licenses/>.
+"""
+IndexAdvisor class - index management for DBIO collections, driven by the queries of ``select``.
+"""
+import threading
+import warnings
+from collections import Counter
+import pymongo
+from pymongo.errors import PyMongoError
+from tsio.constants import TS_NAME
+from tsio.io.mongo_operators import AND, OR
+
+COLLECTION_SCAN = 'COLLSCAN'  # Stage of a query plan that reads the whole collection.
+
+
+def query_shape(query):
+    """ Get the logical operator and the attribute names of a query built by ``DBIO.select``.
+
+    Parameters
+    ----------
+    query: dict
+        ``{'$and': [{attribute: {'$in': values}}, ...]}``, ``{'$or': [...]}`` or ``{}``.
+
+    Returns
+    -------
+    str, tuple(str)
+        The operator (None for an empty query) and the sorted attribute names.
+    """
+    for operator in (AND, OR):
+        if operator in query:
+            return operator, tuple(sorted({key for clause in query[operator] for key in clause}))
+    return None, tuple()
+
+
+def uses_collection_scan(plan):
+    """ Check whether a query plan (or any of its input stages) is a collection scan.
+
+    Parameters
+    ----------
+    plan: dict, list
+        Query plan, e.g. the ``queryPlanner.winningPlan`` entry of an ``explain()`` output.
+
+    Returns
+    -------
+    bool
+    """
+    if isinstance(plan, dict):
+        return plan.get('stage') == COLLECTION_SCAN or any(uses_collection_scan(value) for value in plan.values())
+    if isinstance(plan, list):
+        return any(uses_collection_scan(value) for value in plan)
+    return False
+
+
+class IndexAdvisor:
+    """ Index management for the collection of a :py:class:`DBIO` instance.
+
+    * Ensures a unique ``TS_NAME`` index, which every read and write filters on, on first use.
+    * Counts the attribute combinations queried by ``select`` and, if `auto_create` is True, creates indexes for the
+      combinations used at least `min_uses` times: one compound index for "AND" queries, and one index per attribute
+      for "OR" queries.
+    * Runs ``explain()`` once for each new query shape and keeps a report of those that fall back to a collection scan
+      (see :py:attr:`collection_scans`).
+
+    Parameters
+    ----------
+    dbio: :py:class:`DBIO`
+    auto_create: bool, optional
+        Whether to create indexes for frequently used attribute combinations. Default is False.
+    min_uses: int, optional
+        Number of ``select`` calls with the same attribute combination after which its index is created. Default is 10.
+    max_indexes: int, optional
+        Maximum number of indexes created by the advisor (the ``TS_NAME`` index is not counted). Default is 10.
+    explain: bool, optional
+        Whether to explain new query shapes. Default is True.
+
+    Note
+    ----
+    Use ``DBIO(..., index_advisor=True)`` (or pass an instance) to attach an advisor to a :py:class:`DBIO` instance.
+    """
+    def __init__(self, dbio, auto_create=False, min_uses=10, max_indexes=10, explain=True):
+        self.dbio = dbio
+        self.auto_create = auto_create
+        self.min_uses = min_uses
+        self.max_indexes = max_indexes
+        self.explain = explain
+        self.usage = Counter()
+        self.created = list()
+        self.collection_scans = list()
+        self.name_index_ensured = False
+        self._explained = set()
+        self._lock = threading.Lock()
+
+    def ensure_name_index(self):
+        """ Create the unique ``TS_NAME`` index, once per advisor.
+
+        A warning is issued, instead of an exception, if the index can't be created (e.g.: duplicate names).
+        """
+        if self.name_index_ensured:
+            return
+        self.name_index_ensured = True
+        try:
+            self.dbio.backend.ensure_index([(TS_NAME, pymongo.ASCENDING)], unique=True)
+        except PyMongoError as exception:
+            warnings.warn("Could not create the unique '{}' index of '{}': {}".format(
+                TS_NAME, self.dbio.collection_name, exception))
+
+    def observe(self, query):
+        """ Record a query of ``select``, and create or explain indexes as configured.
+
+        Parameters
+        ----------
+        query: dict
+            Query built by ``DBIO.select``.
+        """
+        operator, attributes = query_shape(query)
+        if not attributes:
+            return
+        with self._lock:
+            self.usage[(operator, attributes)] += 1
+            uses = self.usage[(operator, attributes)]
+            explain = self.explain and (operator, attributes) not in self._explained
+            self._explained.add((operator, attributes))
+        if self.auto_create and uses >= self.min_uses:
+            self.create_indexes(operator, attributes)
+        if explain:
+            self.explain_query(query)
+
+    def create_indexes(self, operator, attributes):
+        """ Create the indexes for an attribute combination, if not yet created and within `max_indexes`.
+
+        Parameters
+        ----------
+        operator: str
+            '$and' or '$or'.
+        attributes: tuple(str)
+
+        Returns
+        -------
+        list(str)
+            Names of the indexes created (none if the backend of the :py:class:`DBIO` has no indexes).
+        """
+        if operator == AND:
+            keys_list = [[(attribute, pymongo.ASCENDING) for attribute in attributes]]
+        else:
+            keys_list = [[(attribute, pymongo.ASCENDING)] for attribute in attributes]
+        names = list()
+        for keys in keys_list:
+            with self._lock:
+                if keys in self.created or len(self.created) >= self.max_indexes:
+                    continue
+                self.created.append(keys)
+            name = self.dbio.backend.ensure_index(keys)
+            if name is not None:
+                names.append(name)
+        return names
+
+    def explain_query(self, query):
+        """ Explain a query and report it if it falls back to a collection scan.
+
+        Parameters
+        ----------
+        query: dict
+
+        Returns
+        -------
+        dict, None
+            The ``explain()`` output, or None if the server couldn't explain the query (or the backend of the
+            :py:class:`DBIO` has no query plans).
+        """
+        try:
+            explanation = self.dbio.backend.explain(query)
+        except (PyMongoError, NotImplementedError) as exception:
+            warnings.warn("Could not explain query {}: {}".format(query, exception))
+            return None
+        if explanation is None:
+            return None
+        plan = explanation.get('queryPlanner', dict()).get('winningPlan', explanation)
+        if uses_collection_scan(plan):
+            operator, attributes = query_shape(query)
+            with self._lock:
+                self.collection_scans.append({'operator': operator, 'attributes': attributes, 'query': query,
+                                              'explain': explanation})
+            warnings.warn("select on {} of '{}' uses a collection scan. Consider an index (see "
+                          "IndexAdvisor.create_indexes).".format(list(attributes), self.dbio.collection_name))
+        return explanation
+
+    def report(self):
+        """
+        Returns
+        -------
+        dict
+            Usage counts by ``(operator, attributes)``, indexes created, and queries that use collection scans.
+        """
+        with self._lock:
+            return {'usage': dict(self.usage), 'created': list(self.created),
+                    'collection_scans': list(self.collection_scans)}
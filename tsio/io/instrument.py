@@ -0,0 +1,295 @@
+# Copyright (C) 2016-2018 Lanx Capital Investimentos LTDA.
+#
+# This file is part of Time Series I/O (tsio).
+#
+# Time Series I/O (tsio) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# Time Series I/O (tsio) is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Time Series I/O (tsio). If not, see <https://www.gnu.org/licenses/>.
+"""
+Instrumentation of DBIO and GenIO calls - per call records of MongoDB round trips, documents, bytes and time per phase.
+
+Records are collected inside :py:func:`profile` blocks, and passed to the hooks registered with :py:func:`add_hook`.
+Round trips, documents and bytes are only recorded for DBIO instances built with ``instrumentation=True``, whose
+client reports its commands to :py:data:`COMMAND_RECORDER`. When no profile block is active and no hook is
+registered, instrumented methods only check a context variable.
+
+Example::
+
+    from tsio.io.instrument import profile
+
+    with profile() as records:
+        genio.read(ts_collection)
+    print(records[0].as_dict())
+"""
+import contextlib
+import contextvars
+import functools
+import time
+import warnings
+from collections import Counter
+import bson
+from pymongo import monitoring
+
+# Phases of a call. Phases are exclusive: the time of a phase nested in another one is not counted in the outer phase.
+QUERY = 'query'  # Waiting for MongoDB (including the BSON decoding by pymongo).
+DECODE = 'decode'  # Decoding stored values into pandas.Series.
+ENCODE = 'encode'  # Encoding time series into documents and write requests.
+MERGE = 'merge'  # Updating the attributes and values of the time series objects.
+COMPONENTS = 'components'  # Resolving and instantiating components.
+LAST_USE = 'last_use'  # Updating LAST_USE.
+EXTERNAL = 'external'  # External reading interfaces of GenIO.
+
+_records = contextvars.ContextVar('tsio_records', default=None)  # Lists collecting records (one per profile block).
+_call = contextvars.ContextVar('tsio_call', default=None)  # Record of the running call.
+_phase = contextvars.ContextVar('tsio_phase', default=None)  # [name, begin] of the running phase.
+_hooks = list()
+_NULL_CONTEXT = contextlib.nullcontext()
+
+
+class CallRecord:
+    """ Measurements of one call of an instrumented method.
+
+    Calls made by an instrumented method (e.g.: ``DBIO.read`` called by ``GenIO.read``) are counted in its record.
+
+    Attributes
+    ----------
+    operation: str
+        Qualified name of the method (e.g.: 'GenIO.read').
+    duration: float
+        Seconds.
+    phases: dict
+        ``{phase: seconds}``. With ``read_workers`` greater than 1, the phases of concurrent threads add up.
+    round_trips: int
+        Number of MongoDB commands (including ``getMore``).
+    commands: collections.Counter
+        Number of MongoDB commands by name.
+    command_seconds: float
+        Sum of the durations of the commands, as reported by pymongo.
+    documents: int
+        Documents returned (or written, by write commands).
+    bytes_sent: int
+        BSON size of the commands.
+    bytes_received: int
+        BSON size of the replies.
+    error: str, None
+        Name of the exception raised by the call, if any.
+    """
+    __slots__ = ('operation', 'duration', 'phases', 'round_trips', 'commands', 'command_seconds', 'documents',
+                 'bytes_sent', 'bytes_received', 'error')
+
+    def __init__(self, operation):
+        self.operation = operation
+        self.duration = 0.0
+        self.phases = dict()
+        self.round_trips = 0
+        self.commands = Counter()
+        self.command_seconds = 0.0
+        self.documents = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.error = None
+
+    def __repr__(self):
+        return 'CallRecord({})'.format(self.as_dict())
+
+    def add_phase(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def as_dict(self):
+        """
+        Returns
+        -------
+        dict
+        """
+        return {key: dict(getattr(self, key)) if key in ('phases', 'commands') else getattr(self, key)
+                for key in self.__slots__}
+
+
+def enabled():
+    """
+    Returns
+    -------
+    bool
+        Whether calls are being recorded (in a :py:func:`profile` block, or with a registered hook).
+    """
+    return bool(_hooks) or _records.get() is not None
+
+
+def add_hook(hook):
+    """ Register a callable receiving the :py:class:`CallRecord` of every instrumented call, in any thread.
+    """
+    _hooks.append(hook)
+
+
+def remove_hook(hook):
+    """ Unregister a hook. Does not raise an exception if absent.
+    """
+    if hook in _hooks:
+        _hooks.remove(hook)
+
+
+@contextlib.contextmanager
+def profile():
+    """ Record the instrumented calls made inside a ``with`` block (in this thread or task).
+
+    Yields
+    ------
+    list(:py:class:`CallRecord`)
+        Filled as the calls finish.
+    """
+    records = list()
+    outer = _records.get()
+    token = _records.set((outer or tuple()) + (records,))
+    try:
+        yield records
+    finally:
+        _records.reset(token)
+
+
+class _Call:
+    __slots__ = ('record', 'begin', 'tokens')
+
+    def __init__(self, operation):
+        self.record = CallRecord(operation)
+
+    def __enter__(self):
+        self.tokens = (_call.set(self.record), _phase.set(None))
+        self.begin = time.perf_counter()
+        return self.record
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        now = time.perf_counter()
+        running = _phase.get()
+        if running is not None:
+            self.record.add_phase(running[0], now - running[1])
+        self.record.duration = now - self.begin
+        if exc_type is not None:
+            self.record.error = exc_type.__name__
+        _phase.reset(self.tokens[1])
+        _call.reset(self.tokens[0])
+        for records in _records.get() or tuple():
+            records.append(self.record)
+        for hook in list(_hooks):
+            try:
+                hook(self.record)
+            except Exception as exception:
+                warnings.warn('Instrumentation hook {} failed: {}'.format(hook, exception))
+
+
+def instrumented(method):
+    """ Decorator recording the calls of a method (but not the calls it makes to other instrumented methods).
+    """
+    operation = method.__qualname__
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        if _call.get() is not None or not enabled():
+            return method(*args, **kwargs)
+        with _Call(operation):
+            return method(*args, **kwargs)
+    return wrapper
+
+
+class _Phase:
+    __slots__ = ('record', 'name', 'outer', 'token')
+
+    def __init__(self, record, name):
+        self.record = record
+        self.name = name
+
+    def __enter__(self):
+        now = time.perf_counter()
+        self.outer = _phase.get()
+        if self.outer is not None:
+            self.record.add_phase(self.outer[0], now - self.outer[1])
+        self.token = _phase.set([self.name, now])
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        now = time.perf_counter()
+        self.record.add_phase(self.name, now - _phase.get()[1])
+        _phase.reset(self.token)
+        if self.outer is not None:
+            self.outer[1] = now
+
+
+def phase(name):
+    """ Context manager timing a phase of the running instrumented call. Does nothing outside instrumented calls.
+
+    Parameters
+    ----------
+    name: str
+        One of the phase constants of this module.
+    """
+    record = _call.get()
+    if record is None:
+        return _NULL_CONTEXT
+    return _Phase(record, name)
+
+
+def propagate(function):
+    """ Wrap a function to be run on another thread, so that its MongoDB commands and phases are counted in the
+    running instrumented call.
+
+    Returns
+    -------
+    callable
+    """
+    if _call.get() is None:
+        return function
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        # Each run gets its own copy of the context, with no running phase.
+        run_context = context.copy()
+        run_context.run(_phase.set, None)
+        return run_context.run(function, *args, **kwargs)
+    return run
+
+
+def reply_documents(reply):
+    """ Count the documents of a MongoDB command reply.
+
+    Returns
+    -------
+    int
+        Documents of the cursor batch of the reply, or its ``n`` field (documents written) for write commands.
+    """
+    cursor = reply.get('cursor')
+    if cursor is not None:
+        return len(cursor.get('firstBatch', cursor.get('nextBatch', [])))
+    return reply.get('n', 0) if isinstance(reply.get('n', 0), int) else 0
+
+
+class CommandRecorder(monitoring.CommandListener):
+    """ pymongo command listener counting the commands of the running instrumented call.
+    """
+    def started(self, event):
+        record = _call.get()
+        if record is not None:
+            record.round_trips += 1
+            record.commands[event.command_name] += 1
+            record.bytes_sent += len(bson.encode(event.command))
+
+    def succeeded(self, event):
+        record = _call.get()
+        if record is not None:
+            record.command_seconds += event.duration_micros / 1e6
+            record.documents += reply_documents(event.reply)
+            record.bytes_received += len(bson.encode(event.reply))
+
+    def failed(self, event):
+        record = _call.get()
+        if record is not None:
+            record.command_seconds += event.duration_micros / 1e6
+
+
+COMMAND_RECORDER = CommandRecorder()
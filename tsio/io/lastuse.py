@@ -0,0 +1,160 @@
+# Copyright (C) 2016-2018 Lanx Capital Investimentos LTDA.
+#
+# This file is part of Time Series I/O (tsio).
+#
+# Time Series I/O (tsio) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# Time Series I/O (tsio) is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Time Series I/O (tsio). If not, see <https://www.gnu.org/licenses/>.
+"""
+LastUseBuffer class - in-memory buffer of ``LAST_USE`` updates, flushed periodically in the background.
+"""
+import atexit
+import os
+import threading
+import time
+import warnings
+import weakref
+from tsio.constants import LAST_USE
+
+# Buffers with pending names, and the flushing thread shared by all the buffers of the process. Buffers are weakly
+# referenced: instances that are not closed can still be garbage collected.
+_buffers = weakref.WeakSet()
+_flusher_lock = threading.Lock()
+_flusher_wake = threading.Event()
+_flusher_pid = None
+
+
+def _start_flusher():
+    """ Start the shared flushing thread, once per process.
+    """
+    global _flusher_pid, _flusher_wake
+    with _flusher_lock:
+        if _flusher_pid != os.getpid():
+            # First use, or first use in a forked child process (threads are not inherited).
+            _flusher_pid = os.getpid()
+            _flusher_wake = threading.Event()
+            threading.Thread(target=_run_flusher, name='tsio-last-use', daemon=True).start()
+    _flusher_wake.set()
+
+
+def _flush_due():
+    """ Flush the buffers whose period is over.
+
+    Returns
+    -------
+    float, None
+        Seconds until the next buffer is due, or None if no buffer has pending names.
+    """
+    now = time.monotonic()
+    timeout = None
+    for buffer in list(_buffers):
+        due = buffer._due
+        if due is None:
+            continue
+        if due <= now:
+            buffer.flush()
+        else:
+            timeout = due - now if timeout is None else min(timeout, due - now)
+    return timeout
+
+
+def _run_flusher():
+    wake = _flusher_wake
+    while True:
+        # Cleared before scanning, so buffers scheduled during the scan wake the thread up again. The buffers are
+        # only referenced during the scan, so idle instances can be garbage collected.
+        wake.clear()
+        wake.wait(_flush_due())
+
+
+@atexit.register
+def flush_all():
+    """ Write the pending names of all the buffers of the process. Called at interpreter exit.
+    """
+    for buffer in list(_buffers):
+        buffer.flush()
+
+
+class LastUseBuffer:
+    """ Buffer of the names of time series that were read, flushed as a single update per period.
+
+    All the buffers of a process are flushed by a single background thread.
+
+    Parameters
+    ----------
+    flush_function: callable
+        Function receiving the list of buffered names and the ``LAST_USE`` datetime to be written (the time of the
+        most recent read).
+    interval: float, optional
+        Seconds between flushes. Default is 5.
+
+    Note
+    ----
+    Pending names are also flushed when :py:meth:`close` is called and at interpreter exit. Names still pending when
+    an unclosed buffer is garbage collected are lost. A forked child process starts with an empty buffer.
+    """
+    def __init__(self, flush_function, interval=5.0):
+        self.flush_function = flush_function
+        self.interval = interval
+        self.names = set()
+        self.last_use = None
+        self._lock = threading.Lock()
+        self._due = None
+        self._pid = None
+
+    def add(self, names_list, last_use):
+        """ Buffer the names of time series read at `last_use`.
+
+        Parameters
+        ----------
+        names_list: list(str)
+        last_use: datetime.datetime
+        """
+        with self._lock:
+            if self._pid != os.getpid():
+                # First use, or first use in a forked child process (names buffered by the parent are its own).
+                self.names = set()
+                self.last_use = None
+                self._due = None
+                self._pid = os.getpid()
+                _buffers.add(self)
+            self.names.update(names_list)
+            if self.last_use is None or last_use > self.last_use:
+                self.last_use = last_use
+            scheduled = self._due is None
+            if scheduled:
+                self._due = time.monotonic() + self.interval
+        if scheduled:
+            _start_flusher()
+
+    def flush(self):
+        """ Write the buffered names now.
+        """
+        with self._lock:
+            names, last_use = self.names, self.last_use
+            self.names = set()
+            self.last_use = None
+            self._due = None
+        if not names:
+            return
+        try:
+            self.flush_function(sorted(names), last_use)
+        except Exception as exception:
+            # LAST_USE is informative, a failed update must not break the reading process.
+            warnings.warn("Failed to update '{}' of {} time series: {}".format(LAST_USE, len(names), exception))
+
+    def close(self):
+        """ Write the buffered names and unregister the buffer from the flushing thread.
+        """
+        _buffers.discard(self)
+        self._pid = None
+        self.flush()
@@ -0,0 +1,197 @@
+# Copyright (C) 2016-2018 Lanx Capital Investimentos LTDA.
+#
+# This file is part of Time Series I/O (tsio).
+#
+# Time Series I/O (tsio) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# Time Series I/O (tsio) is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Time Series I/O (tsio). If not, see <https://www.gnu.org/licenses/>.
+"""
+LocalStore class - local on-disk mirror of time series, read through memory-mapped numpy files.
+
+Layout of the directory:
+
+* ``index.json``: ``{ts_name: {'FILE': ..., 'COUNT': ..., 'STAMPS': ..., 'ATTRIBUTES': ...}}``, in MongoDB extended
+  JSON (see ``bson.json_util``).
+* ``<FILE>.index.npy``: int64 nanoseconds since epoch of the values.
+* ``<FILE>.values.npy``: the values.
+"""
+import copy
+import hashlib
+import os
+import threading
+import numpy as np
+import pandas as pd
+from bson import json_util
+from bson.json_util import JSONOptions, JSONMode
+from tsio.io.codecs import is_encodable
+
+INDEX_FILE = 'index.json'
+FILE = 'FILE'
+COUNT = 'COUNT'
+STAMPS = 'STAMPS'
+ATTRIBUTES = 'ATTRIBUTES'
+
+JSON_OPTIONS = JSONOptions(json_mode=JSONMode.CANONICAL, tz_aware=False)  # Keeps types (and naive datetimes, as read
+# from MongoDB) in the index file.
+
+
+class LocalStore:
+    """ Mirror of time series in a local directory, for fast (and offline) reading.
+
+    Values are kept in numpy files opened as memory maps, so reading a time series doesn't copy or decode its values.
+    Only numeric (and boolean) values with a datetime index can be mirrored.
+
+    Parameters
+    ----------
+    path: str
+        Directory of the mirror. It is created if it doesn't exist.
+
+    Note
+    ----
+    Use ``DBIO(..., local_store=LocalStore(path))`` to read through the mirror, and :py:meth:`DBIO.sync_local` to
+    update it incrementally. Only one process should write to a directory at a time.
+    """
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.Lock()
+        self.entries = dict()
+        index_path = os.path.join(path, INDEX_FILE)
+        if os.path.exists(index_path):
+            with open(index_path) as index_file:
+                self.entries = json_util.loads(index_file.read(), json_options=JSON_OPTIONS)
+
+    def __contains__(self, ts_name):
+        return ts_name in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def names(self):
+        """
+        Returns
+        -------
+        list(str)
+            Names of the mirrored time series.
+        """
+        return list(self.entries)
+
+    def stamps(self, ts_name):
+        """
+        Returns
+        -------
+        tuple, None
+            ``(LAST_VALUE_UPDATE, LAST_ATTRIBUTE_UPDATE)`` of the time series when it was mirrored, or None if it is
+            not mirrored.
+        """
+        entry = self.entries.get(ts_name)
+        return None if entry is None else tuple(entry[STAMPS])
+
+    def _file_path(self, entry, suffix):
+        return os.path.join(self.path, entry[FILE] + suffix)
+
+    def get(self, ts_name):
+        """ Get a mirrored time series.
+
+        Parameters
+        ----------
+        ts_name: str
+
+        Returns
+        -------
+        tuple, None
+            ``(attributes, values)``, where ``values`` are backed by memory maps (read-only), or None if the time
+            series is not mirrored.
+        """
+        entry = self.entries.get(ts_name)
+        if entry is None:
+            return None
+        attributes = copy.deepcopy(entry[ATTRIBUTES])
+        if not entry[COUNT]:
+            return attributes, pd.Series(index=pd.DatetimeIndex([]), dtype=float)
+        index = np.load(self._file_path(entry, '.index.npy'), mmap_mode='r')
+        data = np.load(self._file_path(entry, '.values.npy'), mmap_mode='r')
+        return attributes, pd.Series(data, index=pd.DatetimeIndex(index.view('datetime64[ns]')), copy=False)
+
+    def put(self, ts_name, attributes, values, stamps, save=True):
+        """ Mirror a time series, replacing any previous version.
+
+        Parameters
+        ----------
+        ts_name: str
+        attributes: dict
+        values: pandas.Series
+        stamps: tuple
+            ``(LAST_VALUE_UPDATE, LAST_ATTRIBUTE_UPDATE)`` of the time series, used for incremental updates.
+        save: bool, optional
+            Whether to write the index file. Use False when mirroring many time series, and then call
+            :py:meth:`save`. Default is True.
+
+        Returns
+        -------
+        bool
+            Whether the time series was mirrored (False if its values can't be memory mapped).
+        """
+        if not values.empty and not is_encodable(values):
+            return False
+        values = values.sort_index()
+        entry = {FILE: hashlib.sha1(ts_name.encode('utf-8')).hexdigest(), COUNT: len(values), STAMPS: list(stamps),
+                 ATTRIBUTES: copy.deepcopy(attributes)}
+        if len(values):
+            self._save_array(self._file_path(entry, '.index.npy'), values.index.values.astype('datetime64[ns]')
+                             .view('<i8'))
+            self._save_array(self._file_path(entry, '.values.npy'), np.asarray(values.values))
+        with self._lock:
+            self.entries[ts_name] = entry
+        if save:
+            self.save()
+        return True
+
+    @staticmethod
+    def _save_array(path, array):
+        # Written to a temporary file and then moved, so memory maps of the previous version stay valid.
+        temporary_path = path + '.tmp'
+        with open(temporary_path, 'wb') as array_file:
+            np.save(array_file, array)
+        os.replace(temporary_path, path)
+
+    def remove(self, ts_name, save=True):
+        """ Remove a time series from the mirror. Does not raise an exception if absent.
+        """
+        with self._lock:
+            entry = self.entries.pop(ts_name, None)
+        if entry is not None:
+            for suffix in ('.index.npy', '.values.npy'):
+                try:
+                    os.remove(self._file_path(entry, suffix))
+                except FileNotFoundError:
+                    pass
+            if save:
+                self.save()
+
+    def clear(self, save=True):
+        """ Remove all time series from the mirror.
+        """
+        for ts_name in self.names():
+            self.remove(ts_name, save=False)
+        if save:
+            self.save()
+
+    def save(self):
+        """ Write the index file.
+        """
+        with self._lock:
+            content = json_util.dumps(self.entries, json_options=JSON_OPTIONS)
+        index_path = os.path.join(self.path, INDEX_FILE)
+        with open(index_path + '.tmp', 'w') as index_file:
+            index_file.write(content)
+        os.replace(index_path + '.tmp', index_path)
@@ -23,6 +23,8 @@ ID = "_id"
 
 # Comparison
 SET = "$set"
+UNSET = "$unset"
+MAX = "$max"  # Updates a field only if the specified value is greater than the existing value.
 EQUAL_TO = "$eq"  # Matches values that are equal to a specified value.
 GREATER_THAN = "$gt"  # Matches values that are greater than a specified value.
 GREATER_OR_EQUAL_THAN = "$gte"  # Matches values that are greater than or equal to a specified value.
@@ -31,6 +33,7 @@ LESSER_THAN = "$lt"  # Matches values that are less than a specified value.
 LESSER_OR_EQUAL_THAN = "$lte"  # Matches values that are less than or equal to a specified value.
 NOT_EQUAL_TO = "$ne"  # Matches all values that are not equal to a specified value.
 NIN = "$nin"  # Matches none of the values specified in an array.
+EXISTS = "$exists"  # Matches documents that have the specified field.
 
 # Logical
 AND = "$and"
@@ -41,3 +44,28 @@ NOR = "$nor"
 # Joins query clauses with a logical NOR returns all documents that fail to match both clauses.
 OR = "$or"
 # Joins query clauses with a logical OR returns all documents that match the conditions of either clause.
+
+# Aggregation stages
+MATCH = "$match"
+PROJECT = "$project"
+ADD_FIELDS = "$addFields"
+SET_WINDOW_FIELDS = "$setWindowFields"
+GRAPH_LOOKUP = "$graphLookup"  # Recursive search on a collection.
+UNWIND = "$unwind"  # Outputs a document for each element of an array.
+GROUP = "$group"  # Groups documents by an expression.
+
+# Aggregation expressions
+EXPR = "$expr"  # Allows the use of aggregation expressions within the query language.
+FILTER = "$filter"  # Selects the elements of an array that match a condition.
+MAP = "$map"  # Applies an expression to each element of an array.
+LET = "$let"  # Binds variables for use in a sub-expression.
+OBJECT_TO_ARRAY = "$objectToArray"  # Converts a document into an array of {k, v} documents.
+ARRAY_TO_OBJECT = "$arrayToObject"  # Converts an array of {k, v} documents into a document.
+TO_LONG = "$toLong"  # Converts a value to a 64-bit integer.
+MAX_N = "$maxN"  # Returns the n largest elements of an array.
+MIN = "$min"
+SUM = "$sum"
+SIZE = "$size"
+IF_NULL = "$ifNull"
+COND = "$cond"  # Evaluates one of two expressions, depending on a condition.
+LITERAL = "$literal"  # Returns a value without parsing it as an expression.
@@ -0,0 +1,113 @@
+# Copyright (C) 2016-2018 Lanx Capital Investimentos LTDA.
+#
+# This file is part of Time Series I/O (tsio).
+#
+# Time Series I/O (tsio) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# Time Series I/O (tsio) is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Time Series I/O (tsio). If not, see <https://www.gnu.org/licenses/>.
+"""
+Snapshot file format - a stream of BSON documents, as stored in MongoDB, used by ``DBIO.export_snapshot`` and
+``DBIO.import_snapshot``.
+
+The file starts with a header document, followed by blocks. Each block is a block header document, saying which
+collection the block belongs to and how many documents it has, followed by those documents. Documents are written and
+read as raw BSON, so they are never decoded into Python objects. Files whose name ends with '.gz' are gzip compressed.
+"""
+import gzip
+import bson
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+
+FORMAT = 'FORMAT'  # Key (in the header) containing the format name.
+VERSION = 'VERSION'  # Key (in the header) containing the format version.
+SNAPSHOT_FORMAT = 'tsio-snapshot'
+SNAPSHOT_VERSION = 1
+COLLECTION = 'COLLECTION'  # Key (in a block header) containing the collection of the block.
+COUNT = 'COUNT'  # Key (in a block header) containing the number of documents of the block.
+
+DOCUMENTS = 'documents'  # Collection of the time series documents.
+BUCKETS = 'buckets'  # Collection of the value buckets.
+
+RAW_BSON = CodecOptions(document_class=RawBSONDocument)
+
+
+def open_snapshot(path, mode='rb'):
+    """ Open a snapshot file, gzip compressed if `path` ends with '.gz'.
+
+    Parameters
+    ----------
+    path: str
+    mode: {'rb', 'wb'}
+
+    Returns
+    -------
+    file object
+    """
+    if path.endswith('.gz'):
+        return gzip.open(path, mode)
+    return open(path, mode)
+
+
+def write_header(snapshot_file):
+    """ Write the header of a snapshot file.
+    """
+    snapshot_file.write(bson.encode({FORMAT: SNAPSHOT_FORMAT, VERSION: SNAPSHOT_VERSION}))
+
+
+def write_block(snapshot_file, collection, documents):
+    """ Write a block of documents.
+
+    Parameters
+    ----------
+    snapshot_file: file object
+    collection: {'documents', 'buckets'}
+    documents: list(bson.raw_bson.RawBSONDocument)
+
+    Returns
+    -------
+    int
+        Number of bytes written.
+    """
+    if not documents:
+        return 0
+    header = bson.encode({COLLECTION: collection, COUNT: len(documents)})
+    snapshot_file.write(header)
+    size = len(header)
+    for document in documents:
+        snapshot_file.write(document.raw)
+        size += len(document.raw)
+    return size
+
+
+def read_blocks(snapshot_file):
+    """ Read the blocks of a snapshot file.
+
+    Parameters
+    ----------
+    snapshot_file: file object
+
+    Yields
+    ------
+    str, list(bson.raw_bson.RawBSONDocument)
+        The collection of each block and its documents.
+    """
+    documents = bson.decode_file_iter(snapshot_file, codec_options=RAW_BSON)
+    header = next(documents, None)
+    if header is None or header.get(FORMAT) != SNAPSHOT_FORMAT:
+        raise ValueError('Not a tsio snapshot file.')
+    if header[VERSION] > SNAPSHOT_VERSION:
+        raise ValueError('Unsupported tsio snapshot version: {}.'.format(header[VERSION]))
+    for block_header in documents:
+        block = [document for _, document in zip(range(block_header[COUNT]), documents)]
+        if len(block) < block_header[COUNT]:
+            raise ValueError('Truncated tsio snapshot file.')
+        yield block_header[COLLECTION], block
@@ -0,0 +1,216 @@
+# Copyright (C) 2016-2018 Lanx Capital Investimentos LTDA.
+#
+# This file is part of Time Series I/O (tsio).
+#
+# Time Series I/O (tsio) is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# Time Series I/O (tsio) is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Time Series I/O (tsio). If not, see <https://www.gnu.org/licenses/>.
+"""
+Watcher class - pushes the time series that change in a DBIO collection to callbacks and asyncio queues.
+"""
+import datetime
+import threading
+import warnings
+from tsio.constants import TS_NAME, LAST_VALUE_UPDATE, LAST_ATTRIBUTE_UPDATE
+from tsio.timeseries import TimeSeries
+from tsio.timeseriescollection import TimeSeriesCollection
+from tsio.io.mongo_operators import IN, MATCH, PROJECT, AND, OR, EXISTS
+
+
+def prefix_fields(query, prefix):
+    """ Prefix the field names of a query, e.g. to match the documents of change stream events.
+
+    Parameters
+    ----------
+    query: dict
+        Query whose logical operators ('$and', '$or', ...) hold lists of queries.
+    prefix: str
+
+    Returns
+    -------
+    dict
+    """
+    return {key if key.startswith('$') else prefix + key:
+            [prefix_fields(clause, prefix) for clause in value] if key.startswith('$') else value
+            for key, value in query.items()}
+
+
+class Watcher:
+    """ Background watcher of time series changes.
+
+    Each tick, the names of the changed time series are collected and only those time series are read, with their
+    attributes and the delta of their values (without components): the first delivery of a time series has its full
+    history, later deliveries only the values at or after the last date delivered before. The resulting
+    :py:class:`TimeSeriesCollection` is passed to each callback and put in each queue. Ticks without changes deliver
+    nothing.
+
+    Changes are collected from a MongoDB change stream, if the server supports them (replica sets and sharded
+    clusters), and otherwise by polling: one query per tick on the indexed update stamps (see
+    :py:meth:`DBIO.changed_since`).
+
+    Parameters
+    ----------
+    dbio: :py:class:`DBIO`
+        Instance used to query and read the time series.
+    names_list: list(str), optional
+        Names of the watched time series. Default is all the time series matching `query`.
+    query: dict, optional
+        MongoDB query of the watched time series (e.g.: built by ``DBIO._select_query``), used if `names_list` is
+        None. Default is all the time series.
+    interval: float, optional
+        Seconds between ticks. Default is 1.
+    change_stream: bool, optional
+        Whether to try a change stream before polling. Default is True.
+
+    Note
+    ----
+    * Use :py:meth:`DBIO.watch` to build and start a watcher.
+    * Values written before the last delivered date of a time series (back-fills) are not part of its deltas. Use
+      :py:meth:`DBIO.sync` to re-read whole time series.
+    """
+    def __init__(self, dbio, names_list=None, query=None, interval=1.0, change_stream=True):
+        self.dbio = dbio
+        self.names_list = names_list
+        self.query = query or dict()
+        self.interval = interval
+        self.change_stream = change_stream
+        self.callbacks = list()
+        self.queues = list()
+        self.mode = None
+        self.watermark = None
+        self.last_dates = dict()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add_callback(self, callback):
+        """ Register a callable receiving the :py:class:`TimeSeriesCollection` of changed time series of each tick.
+
+        Callbacks run on the watcher thread.
+        """
+        self.callbacks.append(callback)
+
+    def add_queue(self, queue, loop):
+        """ Register an ``asyncio.Queue`` receiving the :py:class:`TimeSeriesCollection` of each tick.
+
+        Parameters
+        ----------
+        queue: asyncio.Queue
+        loop: asyncio.AbstractEventLoop
+            Event loop of the queue (e.g.: ``asyncio.get_running_loop()``).
+        """
+        self.queues.append((queue, loop))
+
+    def start(self):
+        """ Start watching on a background thread.
+
+        Returns
+        -------
+        :py:class:`Watcher`
+        """
+        if self._thread is None:
+            self.watermark = datetime.datetime.utcnow()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='tsio-watch', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """ Stop watching, waiting for the current tick to finish.
+        """
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def _run(self):
+        if self.change_stream:
+            try:
+                self._watch_stream()
+            except Exception as exception:
+                # e.g.: a standalone server, which has no change streams, or a client without change stream support.
+                warnings.warn('Change stream unavailable, polling instead: {!r}'.format(exception))
+        if not self._stop.is_set():
+            self._poll()
+
+    def _stream_pipeline(self):
+        # Updates count only if they set an update stamp: LAST_USE updates (e.g.: by the reads of this watcher) don't.
+        changes = {OR: [{'operationType': {IN: ['insert', 'replace']}},
+                        {'updateDescription.updatedFields.' + LAST_VALUE_UPDATE: {EXISTS: True}},
+                        {'updateDescription.updatedFields.' + LAST_ATTRIBUTE_UPDATE: {EXISTS: True}}]}
+        if self.names_list is not None:
+            watched = {'fullDocument.' + TS_NAME: {IN: list(self.names_list)}}
+        else:
+            watched = prefix_fields(self.query, 'fullDocument.')
+        return [{MATCH: {AND: [changes, watched]}}, {PROJECT: {'fullDocument.' + TS_NAME: 1}}]
+
+    def _watch_stream(self):
+        self.mode = 'change_stream'
+        with self.dbio.db.watch(self._stream_pipeline(), full_document='updateLookup',
+                                max_await_time_ms=int(self.interval * 1000)) as stream:
+            while not self._stop.is_set():
+                tick_start = datetime.datetime.utcnow()
+                changed = set()
+                while True:
+                    event = stream.try_next()
+                    if event is None:
+                        break
+                    document = event.get('fullDocument') or dict()
+                    if TS_NAME in document:
+                        changed.add(document[TS_NAME])
+                self.watermark = tick_start
+                self._deliver(sorted(changed))
+
+    def _poll(self):
+        self.mode = 'polling'
+        while not self._stop.wait(self.interval):
+            try:
+                documents = self.dbio._changed_documents(self.watermark, self.query, self.names_list, strict=True)
+            except Exception as exception:
+                warnings.warn('Failed to query changed time series: {}'.format(exception))
+                continue
+            stamps = [stamp for document in documents for stamp in document.values() if isinstance(stamp,
+                                                                                                   datetime.datetime)]
+            if stamps:
+                self.watermark = max(self.watermark, max(stamps))
+            self._deliver(sorted({document[TS_NAME] for document in documents}))
+
+    def _deliver(self, names_list):
+        if not names_list:
+            return
+        changed = TimeSeriesCollection([TimeSeries(ts_name) for ts_name in names_list])
+        starts = [self.last_dates.get(ts_name) for ts_name in names_list]
+        # One read for the whole tick, from the earliest last delivered date (None reads the full history).
+        start = None if any(date is None for date in starts) else min(starts)
+        try:
+            self.dbio.read(changed, depth=1, start=start)
+        except Exception as exception:
+            # e.g.: a network or decoding error. The watcher keeps running, the series are read again when they change.
+            warnings.warn('Failed to read {} changed time series: {}'.format(len(names_list), exception))
+            return
+        for ts, ts_start in zip(changed, starts):
+            if ts_start is not None and not ts.ts_values.empty:
+                ts.ts_values = ts.ts_values[ts.ts_values.index >= ts_start]
+            if not ts.ts_values.empty:
+                self.last_dates[ts.ts_name] = ts.ts_values.index.max()
+        for callback in self.callbacks:
+            try:
+                callback(changed)
+            except Exception as exception:
+                warnings.warn('Watch callback {} failed: {}'.format(callback, exception))
+        for queue, loop in self.queues:
+            loop.call_soon_threadsafe(queue.put_nowait, changed)
@@ -130,6 +130,25 @@ def to_list(arg):
         return [arg]
 
 
+def chunks(arg, size):
+    """Split a list into consecutive chunks.
+
+    Parameters
+    ----------
+    arg: list
+    size: int, None
+        Maximum length of each chunk. If None, `arg` is returned as a single chunk.
+
+    Returns
+    -------
+    list of lists
+
+    """
+    if not size or len(arg) <= size:
+        return [arg]
+    return [arg[i:i + size] for i in range(0, len(arg), size)]
+
+
 def to_upper_list(arg):
     """Convert a string or list of strings in upper-case list of strings.
 